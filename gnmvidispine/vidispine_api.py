@@ -9,11 +9,20 @@ from pprint import pprint
 import json
 import re
 import logging
-from time import sleep
+from time import sleep, monotonic
 import io
 import os
 from socket import error as socket_error
 from itertools import chain
+from contextlib import contextmanager
+import threading
+from .vs_connection_pool import get_pool
+from .vs_resilience import get_host_health
+from .vs_rate_limit import get_rate_limiter
+from .vs_interceptor import VSRequest, intercept
+from .vs_compression import DecompressingResponse, content_encoding, accept_encoding
+from . import vs_json
+from . import vs_xml
 
 logger = logging.getLogger(__name__)
 
@@ -22,13 +31,15 @@ class HTTPError(Exception):
     """
     Class to represent a generic HTTP error returned from Vidispine
     """
-    def __init__(self,code,method,url,status,reason,body):
+    def __init__(self,code,method,url,status,reason,body,headers=None):
         self.code = code
         self.method = method
         self.url = url
         self.status = status
         self.reason = reason
         self.body = body
+        #headers of the error response, if we have them
+        self.headers = headers if headers is not None else {}
 
     def __str__(self):
         return "Request was: %s to %s\n\nServer returned %d (%s)\n%s" % (self.method,self.url,self.status, self.reason, self.body)
@@ -55,6 +66,19 @@ class HTTPError(Exception):
             return self
 
 
+class VSCircuitOpenError(HTTPError):
+    """
+    Raised instead of sending a request when the circuit breaker for the host is open, because it has been failing.
+    This looks like a 503 error, so it is retried by request() in the same way.
+    """
+    def __init__(self,method,url,retry_after):
+        super(VSCircuitOpenError,self).__init__(503,method,url,503,"Circuit breaker open, not sending request","")
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return "Request was: %s to %s\n\nNot sent because the circuit breaker for the host is open. Retry in %.1fs" % (self.method,self.url,self.retry_after)
+
+
 class VSException(Exception):
     xmlns = '{http://xml.vidispine.com/schema/vidispine}'
     
@@ -154,7 +178,11 @@ class VSApi(object):
     """
     Base class that all other api subclasses depend on. This provides fundamental send/reply functions.
     """
-    dataContent=None
+    _dataContent=None
+    _rawXml=None
+    jsonContent=None
+    _jsonRootTag=None
+    use_json=False
     user=""
     passwd=""
     host=""
@@ -163,10 +191,24 @@ class VSApi(object):
 
     retry_attempts = 100
     retry_delay = 10
+    stream_chunk_size = 65536
+    chunk_retry_attempts = 5
+    chunk_retry_delay = 2
+    #set this to a VSMetrics object to record timings and counters for every request, see vs_metrics
+    metrics = None
+    #VSInterceptor objects to run every request through, see vs_interceptor and add_interceptor()
+    interceptors = ()
+    #set this to True to ask the server to gzip or deflate response documents. They are decompressed as they are read.
+    compress_responses = False
+    #set this to a VSSingleFlight object to collapse identical GET requests made at the same time, see vs_single_flight
+    single_flight = None
+    #set this to a VSHttpCache object to revalidate repeated GET requests with ETag/Last-Modified, see vs_http_cache
+    http_cache = None
 
     xmlns = "{http://xml.vidispine.com/schema/vidispine}"
 
-    def __init__(self,host="localhost",port=8080,user="",passwd="",url=None,run_as=None, conn=None, logger=None, https=False):
+    def __init__(self,host="localhost",port=8080,user="",passwd="",url=None,run_as=None, conn=None, logger=None, https=False, pool=None,
+                 use_json=False):
         """
         Initialise a new Vidispine connection.
         :param host: Hostname to connect to Vidispine on
@@ -176,18 +218,21 @@ class VSApi(object):
         :param url: URL to the Vidispine server as {proto}://{server}; for Portal compatibility
         :param run_as: Tell Vidispine to assume the credentials of this user for the purposes of this request. This only works if you
         authenticate with administrator credentials.  Allows a program to have admin credentials but run requests on behalf of users.
-        :param conn: Use this httplib connection object rather than initiating a new one. Only for testing.
+        :param conn: Use this httplib connection object rather than borrowing from a connection pool. Only for testing.
         :param logger: Use this logger object rather than initiating a new one. Only for testing.
         :param https: Set this to True to use https
+        :param pool: Borrow connections from this VSConnectionPool rather than the shared one for these connection settings
+        :param use_json: Set this to True to request and parse JSON rather than XML where it is supported (VSItem, VSShape,
+        VSJob, search results and storage file listings). This is much cheaper for high-volume reads.
         """
         from urllib.parse import urlparse
         self.user=user
         self.passwd=passwd
         self.host=host
         self.run_as=run_as
-        self._delay=0
-        self._delayedcounter = 0
-        self._undelayedcounter = 0
+        self.https=https
+        self.use_json=use_json
+        self._local = threading.local()
         self.name = None
         self.logger = logger if logger is not None else logging.getLogger(__name__)
         if port:
@@ -200,13 +245,9 @@ class VSApi(object):
             else:
                 self.host = bits.netloc
 
-        if conn is not None:
-            self._conn = conn
-        else:
-            if https:
-                self._conn = http.client.HTTPSConnection(self.host, self.port)
-            else:
-                self._conn = http.client.HTTPConnection(self.host, self.port)
+        #if we are given a connection then it is used for every request; otherwise connections are borrowed from a pool
+        self._conn = conn
+        self._pool = pool if pool is not None else get_pool(self.host, self.port, self.user, self.passwd, https=https)
         
     class NotPopulatedError(Exception):
         """
@@ -215,6 +256,55 @@ class VSApi(object):
         """
         pass
 
+    @property
+    def dataContent(self):
+        """
+        The parsed XML document that this object was populated from.  If it was populated from JSON, or from XML
+        without keeping the tree, then the tree is built the first time that this is accessed.
+        """
+        if self._dataContent is None:
+            if self.jsonContent is not None:
+                self._dataContent = vs_json.json_to_element(self.jsonContent, self._jsonRootTag)
+            elif self._rawXml is not None:
+                self._dataContent = vs_xml.fromstring(self._rawXml)
+                self._rawXml = None
+        return self._dataContent
+
+    @dataContent.setter
+    def dataContent(self, value):
+        self._dataContent = value
+        self._rawXml = None
+        self.jsonContent = None
+
+    def _set_json_content(self, document, root_tag):
+        """
+        Internal method, records a decoded JSON document as the content of this object
+        :param document: decoded JSON document
+        :param root_tag: tag of the root element of the equivalent XML document, for dataContent
+        :return: None
+        """
+        self._dataContent = None
+        self._rawXml = None
+        self.jsonContent = document
+        self._jsonRootTag = root_tag
+
+    def _set_raw_xml(self, data):
+        """
+        Internal method, records an unparsed XML document as the content of this object, to be parsed into dataContent
+        only if something asks for it
+        :param data: XML as bytes or string
+        :return: None
+        """
+        self._dataContent = None
+        self._rawXml = data
+        self.jsonContent = None
+
+    def _has_content(self):
+        """
+        Returns True if this object has been populated, without building dataContent from JSON or raw XML
+        """
+        return self._dataContent is not None or self.jsonContent is not None or self._rawXml is not None
+
     def _nodeContentOrNone(self,nodeName):
         if self.dataContent is None:
             raise self.NotPopulatedError
@@ -225,17 +315,111 @@ class VSApi(object):
         except:
             return None
 
-    def reset_http(self):
+    def _new_connection(self):
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port)
+        else:
+            return http.client.HTTPConnection(self.host, self.port)
+
+    def _current_connection(self):
+        """
+        Returns the connection that this object is using on the current thread, or None if there is not one
+        :return: connection object
+        """
+        if self._conn is not None:
+            return self._conn
+        return getattr(self._local, 'conn', None)
+
+    def _checkout_connection(self):
+        """
+        Internal method. Borrows a connection from the pool for the current thread, if we are not using a fixed
+        connection.  If a previous connection is still checked out (because its response was handed to the caller
+        rather than read by raw_request) then it goes back to the pool if the caller has finished reading the response,
+        otherwise it is detached from the pool and left to the response, which closes it.
+        :return: connection object
+        """
+        if self._conn is not None:
+            return self._conn
+        previous = getattr(self._local, 'conn', None)
+        if previous is not None:
+            response = getattr(self._local, 'response', None)
+            self._local.response = None
+            if response is not None and response.isclosed():
+                self._pool.release(previous)
+            else:
+                self._pool.discard(previous, close=False)
+        self._local.conn = self._pool.acquire()
+        return self._local.conn
+
+    def _checkin_connection(self):
+        """
+        Internal method. Returns the current thread's connection to the pool once its response has been read.
+        :return: None
+        """
+        if self._conn is not None:
+            return
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            self._local.response = None
+            self._pool.release(conn)
+
+    def _discard_connection(self):
+        """
+        Internal method. Drops the current thread's connection without returning it to the pool, e.g. because it
+        errored part-way through a request.
+        :return: None
+        """
+        if self._conn is not None:
+            return
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            self._local.response = None
+            self._pool.discard(conn)
+
+    def _detach_connection(self):
+        """
+        Internal method. Takes the current thread's connection away from this object, so that other requests can be
+        made while its response is still being read.  Pass the connection to _return_connection when done.
+        :return: connection object, or None if we are using a fixed connection
+        """
+        if self._conn is not None:
+            return None
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        self._local.response = None
+        return conn
+
+    def _return_connection(self, conn, reusable):
+        """
+        Internal method. Hands a connection from _detach_connection back to the pool
+        :param conn: connection object, or None
+        :param reusable: True if the response was completely read, so that the connection can be re-used
+        :return: None
+        """
+        if conn is None:
+            return
+        if reusable:
+            self._pool.release(conn)
+        else:
+            self._pool.discard(conn)
+
+    def reset_http(self, fresh=False):
         """
         creates a new http connection
+        :param fresh: if True, open a new connection rather than taking an idle one from the pool
         :return:
         """
+        if self._conn is None:
+            self._discard_connection()
+            self._local.conn = self._pool.acquire(fresh=fresh)
+            return
         try:
-            if self._conn is not None:
-                self._conn.close()
+            self._conn.close()
         except:
             pass
-        self._conn = http.client.HTTPConnection(self.host,self.port)
+        self._conn = self._new_connection()
 
     def __eq__(self, other):
         if not isinstance(self,VSApi) or not isinstance(other,VSApi):
@@ -248,6 +432,90 @@ class VSApi(object):
     def __ne__(self, other):
         return not self.__eq__(other)
     
+    def _host_health(self):
+        """
+        Returns the shared backoff and circuit breaker state for the host that this object talks to
+        :return: VSHostHealth
+        """
+        return get_host_health(self.host, self.port)
+
+    def _rate_limiter(self):
+        """
+        Returns the shared client-side rate limiter for the host that this object talks to
+        :return: VSRateLimiter
+        """
+        return get_rate_limiter(self.host, self.port)
+
+    @contextmanager
+    def _request_slot(self, method, path):
+        """
+        Internal method. Context manager that holds a slot from the rate limiter for a request, see vs_rate_limit.
+        While it is held, _backoff() gives the slot up for as long as it sleeps between attempts.
+        """
+        limiter = self._rate_limiter()
+        self._local.slot = (method, path, limiter.acquire(method, path))
+        try:
+            yield
+        finally:
+            method, path, held = self._local.slot
+            self._local.slot = None
+            limiter.release(held)
+
+    def _backoff(self, delay):
+        """
+        Internal method. Sleeps before retrying a request, releasing the current thread's rate limiter slot (if any)
+        while it does so, so that waiting does not count against the in-flight caps
+        :param delay: number of seconds to sleep
+        :return: None
+        """
+        import time
+        slot = getattr(self._local, 'slot', None)
+        if slot is None:
+            time.sleep(delay)
+            return
+        method, path, held = slot
+        limiter = self._rate_limiter()
+        limiter.release(held)
+        self._local.slot = (method, path, None)
+        time.sleep(delay)
+        self._local.slot = (method, path, limiter.acquire(method, path))
+
+    @staticmethod
+    def _body_length(body):
+        if body is None:
+            return 0
+        if isinstance(body,memoryview):
+            return body.nbytes
+        return len(body)
+
+    def _record_retry(self, method, path, reason, backoff=0):
+        """
+        Internal method, records a retry in the metrics if they are being collected
+        """
+        if self.metrics is not None:
+            self.metrics.record_retry(method, path, reason, backoff)
+
+    def _authorization_headers(self):
+        """
+        Internal method, returns a dictionary of the authentication headers to send with each request
+        :return: dictionary
+        """
+        str_for_user = '%s:%s' % (self.user, self.passwd)
+        auth = base64.encodebytes(str_for_user.encode("UTF-8")).decode().replace('\n', '')
+
+        rtn = {'Authorization': "Basic %s" % auth}
+        if self.run_as is not None:
+            rtn['RunAs'] = self.run_as
+        return rtn
+
+    def add_interceptor(self, interceptor):
+        """
+        Run this object's requests through an interceptor, after any set on the class
+        :param interceptor: VSInterceptor
+        :return: None
+        """
+        self.interceptors = tuple(self.interceptors) + (interceptor,)
+
     def sendAuthorized(self,method,url,body,headers,rawData=False):
         """
         Internal method to sign requests. Callers should use request() instead
@@ -257,19 +525,27 @@ class VSApi(object):
         :param headers:
         :return:
         """
-        import time
-        attempt = 0
-        str_for_user = '%s:%s' % (self.user, self.passwd)
-        auth = base64.encodebytes(str_for_user.encode("UTF-8")).decode().replace('\n', '')
+        headers.update(self._authorization_headers())
+        if len(self.interceptors)==0:
+            return self._send_authorized(method,url,body,headers,rawData)
 
-        headers['Authorization']="Basic %s" % auth
-        if self.run_as is not None:
-            headers['RunAs'] = self.run_as
+        request = VSRequest(self,method,url,body,headers,rawData)
+        return intercept(self.interceptors,request,
+                         lambda r: self._send_authorized(r.method,r.url,r.body,r.headers,r.rawData))
+
+    def _send_authorized(self,method,url,body,headers,rawData=False):
+        """
+        Internal method that actually sends a request, retrying on 504 and connection errors
+        :return: response object, with the connection still checked out
+        """
+        attempt = 0
 
         response = None
-        conn = self._conn
+        conn = self._checkout_connection()
 
-        if rawData == False and body is not None:
+        if isinstance(body,(memoryview,bytearray)):
+            body_to_send = body     #already binary, send as-is rather than copying it
+        elif rawData == False and body is not None:
             try:
                 body_to_send = body.decode('utf-8', "backslashreplace").encode('utf-8', "backslashreplace")
             except AttributeError: #if body is a string as opposed to bytes, we get this error
@@ -277,8 +553,16 @@ class VSApi(object):
         else:
             body_to_send = body
 
+        health = self._host_health()
+        retried_stale = False
         while True:
+            if not health.allow_request():
+                self._checkin_connection()
+                raise VSCircuitOpenError(method,url,health.retry_after())
             self.logger.debug("sending {0} request to {1} with headers {2}".format(method,url,headers))
+            #a keep-alive connection that has already been used may have been closed by the server while it was idle.
+            #That is not a problem with the host, so it is retried once on a new connection without counting a failure.
+            reused = getattr(conn, 'sock', None) is not None
             try:
                 conn.request(
                     method,
@@ -289,65 +573,105 @@ class VSApi(object):
             except http.client.CannotSendRequest:
                 attempt+=1
                 logger.warning("HTTP connection re-use issue detected, resetting connection")
+                self._record_retry(method, url, "connection_reuse", 1)
                 self.reset_http()
-                time.sleep(1)
+                conn = self._current_connection()
+                self._backoff(1)
                 if attempt>10:
                     raise
                 continue
             except socket_error as e:
+                if reused and not retried_stale and isinstance(e, ConnectionError):
+                    retried_stale = True
+                    conn = self._retry_stale_connection(method, url, e)
+                    continue
                 attempt +=1
-                logger.warning("Socket error: {0}, resetting conection".format(e))
+                health.record_failure()
+                delay = health.backoff_delay()
+                logger.warning("Socket error: {0}, resetting conection. Waiting {1:.1f} seconds before trying again.".format(e,delay))
+                self._record_retry(method, url, "socket_error", delay)
                 self.reset_http()
-                time.sleep(1)
+                conn = self._current_connection()
+                self._backoff(delay)
                 if attempt>10:
                     raise
                 continue
 
-            response = conn.getresponse()
+            try:
+                response = conn.getresponse()
+            except (ConnectionError, http.client.RemoteDisconnected) as e:
+                if not reused or retried_stale:
+                    health.record_failure()
+                    self._discard_connection()
+                    raise
+                retried_stale = True
+                conn = self._retry_stale_connection(method, url, e)
+                continue
+            except Exception:
+                health.record_failure()
+                self._discard_connection()
+                raise
+            #so that _checkout_connection can tell whether the connection is free again
+            self._local.response = response
             if response.status == 303:
                 url = response.msg.dict['location']
                 logger.debug("Response was a redirect to {0}".format(url))
-                conn = http.client.HTTPConnection(self.host,self.port)
+                response.read()     #drain the redirect so that the connection can be re-used
             elif response.status == 504:    #gateway timeout
-                #if we're getting timeouts, apply an exponential backoff
-                if self._delay==0:
-                    self._delay = 1
-                else:
-                    self._delay *= 2
-                self._delayedcounter+=1
-                self._undelayedcounter=0
-
-                if self._delay > 8192:
-                    self._delay = 1
-
-                logger.warning("Gateway timeout error communicating with {0}. Waiting {1} seconds before trying again.".format(url,self._delay))
-                time.sleep(self._delay)
+                response.read()
+                #if we're getting timeouts, back off. The backoff is shared by everything talking to this host.
+                health.record_failure()
+                delay = health.backoff_delay()
+                logger.warning("Gateway timeout error communicating with {0}. Waiting {1:.1f} seconds before trying again.".format(url,delay))
+                self._record_retry(method, url, "504", delay)
+                self._backoff(delay)
             else:
-                self._undelayedcounter+=1
-                if self._delay>0 and self._undelayedcounter>10*self._delayedcounter:
-                    logger.warning("{0} attempts have now suceeded with no delay, so removing the delay.".format(self._undelayedcounter))
-                    self._delay=0
-                    self._delayedcounter=0
+                if response.status == 503:
+                    health.record_failure()
+                else:
+                    health.record_success()
                 break
 
         return response
 
+    def _retry_stale_connection(self, method, url, error):
+        """
+        Internal method. Replaces the current thread's connection with a new one (not another idle one from the pool),
+        after the old one turned out to have been closed by the server
+        :return: the new connection
+        """
+        logger.debug("Re-used connection failed with {0}, retrying {1} {2} on a new connection".format(error, method, url))
+        self._record_retry(method, url, "connection_reuse")
+        self.reset_http(fresh=True)
+        return self._current_connection()
+
     def chunked_upload_request(self,upload_io,total_size,chunk_size,
                                path,transferPriority=500,throttle=True,method="GET",matrix=None,query=None,
                                filename=None,
-                               accept="application/xml",content_type='application/octet-stream',extra_headers={}):
+                               accept="application/xml",content_type='application/octet-stream',extra_headers={},
+                               concurrency=1,journal=None):
         """
         Performs a chunked upload
         :param upload_io: io base class to get data from
         :param total_size: total size of the object being uploaded, in bytes
         :param chunk_size: size of each chunk, in bytes
+        :param concurrency: number of chunks to upload at once. Each chunk that fails is retried on its own, up to
+        chunk_retry_attempts times, without restarting the transfer.  If this object was given a fixed connection then
+        chunks are always sent one at a time.
+        :param journal: optional VSTransferJournal to record acknowledged chunks in. If the journal describes an
+        interrupted upload of the same file, unmodified, to the same path, the upload is resumed with the same transfer id and only
+        the missing chunks are sent.  The journal is removed once the upload completes.
         :param args: other args to request()
         :param kwargs:  other kwargs to request()
         :return:
         """
         from uuid import uuid4
         
-        transfer_id = uuid4().get_hex()
+        if journal is not None:
+            transfer_id = journal.open(path, total_size, chunk_size, lambda: uuid4().hex,
+                                       source=journal.source_identity(upload_io, chunk_size))
+        else:
+            transfer_id = uuid4().hex
         
         query_params={
             'transferId': transfer_id,
@@ -373,22 +697,124 @@ class VSApi(object):
         else:
             raw_data = False
 
-        total_uploaded = 0
         self.logger.debug("Commencing upload from {0} in chunks of {1}".format(upload_io,chunk_size))
         self.logger.debug("uploading to {0} with account {1}".format(self.host,self.user))
 
-        for startbyte in range(0,total_size,chunk_size):
-            headers = {
-                'size': total_size,
-                'index': startbyte
-            }
-            upload_io.seek(startbyte,my_seek_set)
-            body_buffer = upload_io.read(chunk_size)
-            self.raw_request(path,method=method,matrix=matrix,query=query_params,body=body_buffer,
-                             content_type=content_type,rawData=raw_data,extra_headers=headers)
-            self.logger.debug("Uploaded a total of {0} bytes".format(startbyte+chunk_size))
+        io_lock = threading.Lock()
+        #if the source is a real file, chunks are sent as slices of a memory map of it rather than being copied out
+        source_map = self._map_source(upload_io)
+        source_view = memoryview(source_map) if source_map is not None else None
+
+        def upload_chunk(startbyte):
+            if source_view is not None:
+                body_buffer = source_view[startbyte:startbyte+chunk_size]
+            else:
+                #the source is shared between threads, so the seek and read must happen together
+                with io_lock:
+                    upload_io.seek(startbyte,my_seek_set)
+                    body_buffer = upload_io.read(chunk_size)
+            self._upload_chunk(path,method,matrix,query_params,body_buffer,startbyte,total_size,content_type,raw_data)
+            if journal is not None:
+                journal.acknowledge(startbyte)
+            return startbyte
+
+        if concurrency>1 and self._conn is not None:
+            self.logger.debug("Using a fixed connection, so uploading chunks one at a time")
+            concurrency = 1
+
+        if journal is not None:
+            chunks = [startbyte for startbyte in range(0,total_size,chunk_size) if not journal.is_acknowledged(startbyte)]
+        else:
+            chunks = range(0,total_size,chunk_size)
+
+        try:
+            self._upload_chunks(upload_chunk,chunks,concurrency,chunk_size)
+        except BaseException:
+            if journal is not None:
+                journal.close()
+            raise
+        finally:
+            if source_map is not None:
+                try:
+                    source_view.release()
+                    source_map.close()
+                except BufferError:
+                    #something still holds a slice of the map; it is unmapped once that is released
+                    pass
+        if journal is not None:
+            journal.finish()
+
+    @staticmethod
+    def _map_source(upload_io):
+        """
+        Internal method, returns a read-only memory map of the file behind upload_io, or None if it is not a real file
+        :param upload_io: file-like object
+        :return: mmap object or None
+        """
+        import mmap
+        try:
+            upload_io.flush()   #make sure anything buffered in the file object is visible through the map
+        except (AttributeError, ValueError, OSError):
+            pass
+        try:
+            return mmap.mmap(upload_io.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, ValueError, OSError) as e:
+            logger.debug("Could not memory-map upload source {0} ({1}), reading it instead".format(upload_io, e))
+            return None
+
+    def _upload_chunks(self,upload_chunk,chunks,concurrency,chunk_size):
+        """
+        Internal method, calls upload_chunk for every start byte in chunks, on concurrency threads if more than one
+        :return: None
+        """
+        if concurrency<=1:
+            for startbyte in chunks:
+                upload_chunk(startbyte)
+                self.logger.debug("Uploaded a total of {0} bytes".format(startbyte+chunk_size))
+            return
+
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = set()
+            try:
+                for startbyte in chunks:
+                    #only queue a few chunks ahead of the workers, so that huge files don't create huge queues
+                    if len(pending)>=concurrency*2:
+                        done, pending = wait(pending,return_when=FIRST_COMPLETED)
+                        for f in done:
+                            self.logger.debug("Uploaded chunk at {0}".format(f.result()))
+                    pending.add(executor.submit(upload_chunk,startbyte))
+                done, pending = wait(pending)
+                for f in done:
+                    self.logger.debug("Uploaded chunk at {0}".format(f.result()))
+            finally:
+                for f in pending:
+                    f.cancel()
+
+    def _upload_chunk(self,path,method,matrix,query_params,body_buffer,startbyte,total_size,content_type,raw_data):
+        """
+        Internal method to upload a single chunk of a chunked upload, retrying it if it fails
+        :return: None. Raises if the chunk could not be uploaded after chunk_retry_attempts retries.
+        """
+        headers = {
+            'size': total_size,
+            'index': startbyte
+        }
+        attempt = 0
+        while True:
+            try:
+                self.raw_request(path,method=method,matrix=matrix,query=query_params,body=body_buffer,
+                                 content_type=content_type,rawData=raw_data,extra_headers=headers)
+                return
+            except (HTTPError, http.client.HTTPException, socket_error) as e:
+                attempt+=1
+                if attempt>self.chunk_retry_attempts:
+                    self.logger.error("Chunk at {0} failed {1} times, giving up".format(startbyte,attempt))
+                    raise
+                self.logger.warning("Chunk at {0} failed: {1}. Retrying in {2}s".format(startbyte,e,self.chunk_retry_delay))
+                sleep(self.chunk_retry_delay)
             
-    def request(self,path,method="GET",matrix=None,query=None,body=None, accept='application/xml'):
+    def request(self,path,method="GET",matrix=None,query=None,body=None, accept='application/xml', parse=True):
         """
         Send a request to Vidispine, returning a parsed XML element tree if XML content is returned or raising VSExceptions
         if not successful.  Automatically retries at 10s intervals if a 503 Server Unavailable is returned.
@@ -400,10 +826,20 @@ class VSApi(object):
         parameters for each call
         :param body: String representing the raw request body to send. Normally this will be representation of an XML or JSON document.
         :param accept: String representing the MIME type of data to accept in return. Default is application/xml.
+        :param parse: Set this to False to get the response body as it was received, for callers that parse it themselves
         :return: A parsed XML element tree if data is returned or the string "Success" if there is no data. Raises VSException
         subclasses if an error occurs.
         """
-        from xml.parsers.expat import ExpatError
+        if self.single_flight is not None and method=="GET" and body is None:
+            key = (self.host, self.port, self.https, self.user, self.run_as,
+                   self._build_url(path.replace(' ', '%20'), matrix, query), accept, parse)
+            return self.single_flight.do(key, lambda: self._request(path,method,matrix,query,body,accept,parse))
+        return self._request(path,method,matrix,query,body,accept,parse)
+
+    def _request(self,path,method,matrix,query,body,accept,parse=True):
+        """
+        Internal method that does the work of request()
+        """
         n=0
         raw_body=""
         while True:
@@ -413,8 +849,10 @@ class VSApi(object):
                 break
             except HTTPError as e:
                 if e.code==503: #server unavailable
-                    self.logger.warning("Server not available error when contacting Vidispine. Waiting {0}s before retry.".format(self.retry_delay))
-                    sleep(self.retry_delay)
+                    delay = self._retry_delay_for(e)
+                    self.logger.warning("Server not available error when contacting Vidispine. Waiting {0:.1f}s before retry.".format(delay))
+                    self._record_retry(method, path, "503", delay)
+                    sleep(delay)
                     if n>self.retry_attempts:
                         self.logger.error("Did not work after %d retries, giving up" % self.retry_attempts)
                         raise e
@@ -422,18 +860,145 @@ class VSApi(object):
                     raise e
             except http.client.BadStatusLine as e: #retry if we got a bad status line
                 logging.warning("Bad status line: {0}".format(e))
-                sleep(self.retry_delay)
+                delay = self._host_health().backoff_delay(self.retry_delay)
+                self._record_retry(method, path, "bad_status_line", delay)
+                sleep(delay)
                 if n>self.retry_attempts:
                     self.logger.error("Did not work after %d tries, giving up" % self.retry_attempts)
                     raise e
 
+        if not parse:
+            return raw_body
+        return self._parse_body(raw_body, accept)
+
+    def request_json(self,path,method="GET",matrix=None,query=None,body=None):
+        """
+        Send a request to Vidispine asking for JSON, in the same way as request()
+        :param path: URL path to send the request to, not including /API
+        :param method: GET, PUT, POST, DELETE, etc. - the HTTP method to request
+        :param matrix: A dictionary of "matrix parameters" for the API call
+        :param query: A dictionary of "query parameters" for the API call
+        :param body: String representing the raw request body to send
+        :return: the decoded JSON document, or an empty dictionary if there is no data. Raises VSException subclasses
+        if an error occurs.
+        """
+        return vs_json.decode(self.request(path,method=method,matrix=matrix,query=query,body=body,accept='application/json'))
+
+    def _retry_delay_for(self, error):
+        """
+        Internal method, returns how long to wait before retrying after a 503 error. This grows exponentially (with
+        jitter) from retry_delay while the host keeps failing, and covers the time until the circuit breaker will let
+        a request through if it is open.
+        :param error: HTTPError that was raised
+        :return: number of seconds
+        """
+        delay = self._host_health().backoff_delay(self.retry_delay)
+        if isinstance(error, VSCircuitOpenError):
+            delay = max(delay, error.retry_after)
+        return delay
+
+    def stream_request(self,path,tags=None,method="GET",matrix=None,query=None,body=None,accept='application/xml',clear=True):
+        """
+        Send a request to Vidispine and parse the XML response incrementally as it arrives, rather than reading it all
+        into memory first.  This is a generator yielding each direct child of the root element of the response that has
+        one of the given tags, e.g. each <file> of a FileListDocument.  Each element is detached from the document once
+        it has been yielded, so memory use does not grow with the size of the response.
+        Retries if a 503 Server Unavailable or a bad status line is returned, in the same way as request().
+        :param path: URL path to send the request to, not including /API
+        :param tags: list of fully qualified tag names to yield, e.g. ['{http://xml.vidispine.com/schema/vidispine}file'].
+        If None, every child of the root element is yielded.
+        :param method: GET, PUT, POST, DELETE, etc. - the HTTP method to request
+        :param matrix: A dictionary of "matrix parameters" for the API call
+        :param query: A dictionary of "query parameters" for the API call
+        :param body: String representing the raw request body to send
+        :param accept: MIME type of data to accept in return. This must be XML.
+        :param clear: if True (the default) each element is cleared once the caller has finished with it. Set this to
+        False if you keep hold of the elements that are yielded.
+        :return: yields ElementTree elements. Raises VSException subclasses if an error occurs.
+        """
+        n=0
+        started = monotonic()
+        while True:
+            try:
+                n+=1
+                #the caller may make other requests while iterating, so only count this one as in flight until
+                #the response starts arriving
+                with self._request_slot(method, path):
+                    response = self._send_request(path.replace(' ', '%20'),method=method,matrix=matrix,query=query,body=body,accept=accept)
+                break
+            except HTTPError as e:
+                if e.code==503: #server unavailable
+                    delay = self._retry_delay_for(e)
+                    self.logger.warning("Server not available error when contacting Vidispine. Waiting {0:.1f}s before retry.".format(delay))
+                    self._record_retry(method, path, "503", delay)
+                    sleep(delay)
+                    if n>self.retry_attempts:
+                        self.logger.error("Did not work after %d retries, giving up" % self.retry_attempts)
+                        raise e
+                else:
+                    raise e
+            except http.client.BadStatusLine as e: #retry if we got a bad status line; nothing has been yielded yet
+                self.logger.warning("Bad status line: {0}".format(e))
+                delay = self._host_health().backoff_delay(self.retry_delay)
+                self._record_retry(method, path, "bad_status_line", delay)
+                sleep(delay)
+                if n>self.retry_attempts:
+                    self.logger.error("Did not work after %d tries, giving up" % self.retry_attempts)
+                    raise e
+
+        #the response may be read over many iterations, so don't tie up this object's connection in the meantime
+        conn = self._detach_connection()
+        complete = False
+        received = 0
+        try:
+            parser = vs_xml.pull_parser(events=("start","end"))
+            root = None
+            depth = 0
+            got_data = False
+            while True:
+                data = response.read(self.stream_chunk_size)
+                if not data:
+                    break
+                got_data = True
+                received += len(data)
+                parser.feed(data)
+                for event, elem in parser.read_events():
+                    if event=="start":
+                        depth+=1
+                        if root is None:
+                            root = elem
+                        continue
+                    depth-=1
+                    if depth==1:
+                        root.remove(elem)
+                        if tags is None or elem.tag in tags:
+                            yield elem
+                        if clear:
+                            elem.clear()
+            if got_data:
+                parser.close()
+            complete = True
+        finally:
+            self._return_connection(conn, complete)
+            if complete and self.metrics is not None:
+                #this includes the time that the caller spent processing the elements that were yielded
+                self.metrics.observe(method, path, response.status, monotonic()-started, self._body_length(body), received)
+
+    @staticmethod
+    def _parse_body(raw_body, accept):
+        """
+        Internal method to turn a response body into the return value of request()
+        :param raw_body: body returned from the server
+        :param accept: MIME type that was requested
+        :return: A parsed XML element tree if XML was requested, the raw body if not, or "Success" if there is no data.
+        """
         if raw_body.__len__() > 0:
             try:
                 if accept=='application/xml':
-                    return ET.fromstring(raw_body)
+                    return vs_xml.fromstring(raw_body)
                 else:
                     return raw_body
-            except ExpatError:
+            except vs_xml.parse_errors:
                 logging.error("XML that caused the error: ")
                 logging.error(raw_body)
                 raise
@@ -460,10 +1025,36 @@ class VSApi(object):
 
         return ["{0}={1}".format(key, VSApi._escape_for_query(item)) for item in toprocess]
 
+    @staticmethod
+    def _build_url(path, matrix=None, query=None):
+        """
+        Internal method to build the URL to request from a path and dictionaries of matrix and query parameters
+        :param path: URL path, not including /API
+        :param matrix: dictionary of matrix parameters, or None
+        :param query: dictionary of query parameters, or None
+        :return: string
+        """
+        if matrix:
+            matrixpart = ";"+ ";".join(flatmap(lambda k_v: VSApi._get_param_list(k_v[0],k_v[1]), list(matrix.items())))
+        else:
+            matrixpart=""
+
+        if query:
+            querypart = "&".join(flatmap(lambda k_v1: VSApi._get_param_list(k_v1[0],k_v1[1]), list(query.items())))
+        else:
+            querypart = ""
+
+        url="/API"+path+matrixpart
+        if(len(querypart)> 0):
+            url+='?'+querypart
+        return url
+
     def raw_request(self,path,method="GET",matrix=None,query=None,body=None,accept="application/xml",
                     content_type='application/xml',rawData=False,extra_headers={}):
         """
         Internal method to build request parameters.  Callers should use request() instead.
+        Waits for any client-side rate or concurrency limit for the endpoint first, see vs_rate_limit.
+        If http_cache is set, GET responses are served from or revalidated against it.
         :param path:
         :param method:
         :param matrix:
@@ -471,42 +1062,97 @@ class VSApi(object):
         :param body:
         :return:
         """
+        cache = self.http_cache if method=="GET" and body is None and not rawData else None
+        entry = None
+        if cache is not None:
+            key = self._http_cache_key(path, matrix, query, accept)
+            entry = cache.lookup(key)
+            if entry is not None:
+                if entry.is_fresh():
+                    return entry.body
+                extra_headers = dict(extra_headers)
+                extra_headers.update(entry.validators())
+
+        with self._request_slot(method, path):
+            started = monotonic()
+            response = self._send_request(path,method=method,matrix=matrix,query=query,body=body,accept=accept,
+                                          content_type=content_type,rawData=rawData,extra_headers=extra_headers)
+            try:
+                response_body = response.read()
+            finally:
+                self._checkin_connection()
+        if self.metrics is not None:
+            self.metrics.observe(method, path, response.status, monotonic()-started, self._body_length(body), len(response_body))
+
+        if cache is not None:
+            if response.status==304 and entry is not None:
+                return cache.not_modified(key, entry, response)
+            cache.store(key, response_body, response)
+        elif self.http_cache is not None and method!="GET":
+            self.http_cache.invalidate(self._entity_path(path))
+        return response_body
+
+    def _http_cache_key(self, path, matrix, query, accept):
+        """
+        Internal method, returns the key that a GET request is cached under. The URL must be the second-last element,
+        see VSHttpCache.invalidate.
+        """
+        return (self.host, self.port, self.https, self.user, self.run_as, self._build_url(path, matrix=matrix, query=query), accept)
+
+    @staticmethod
+    def _entity_path(path):
+        """
+        Internal method, returns the URL path of the entity that a request is about, e.g. /API/item/VX-1234 for
+        /item/VX-1234/metadata;field=title
+        """
+        segments = path.split('?', 1)[0].split(';', 1)[0].split('/')
+        return "/API" + "/".join(segments[0:3])
+
+    def _send_request(self,path,method="GET",matrix=None,query=None,body=None,accept="application/xml",
+                      content_type='application/xml',rawData=False,extra_headers={}):
+        """
+        Internal method to send a request and check the response status, without reading a successful response. The
+        connection remains checked out until the caller has read the response and called _checkin_connection.
+        :return: response object. Raises HTTPError or VSException subclasses if the server returned an error.
+        """
         base_headers={ 'Accept': accept, }
         if body is not None:
             base_headers['Content-Type'] = content_type
+        if self.compress_responses:
+            base_headers['Accept-Encoding'] = accept_encoding
 
         base_headers.update(extra_headers)
 
-        if matrix:
-            matrixpart = ";"+ ";".join(flatmap(lambda k_v: self._get_param_list(k_v[0],k_v[1]), list(matrix.items())))
-        else:
-            matrixpart=""
-
-        if query:
-            querypart = "&".join(flatmap(lambda k_v1: self._get_param_list(k_v1[0],k_v1[1]), list(query.items())))
-        else:
-            querypart = ""
-
-        url="/API"+path+matrixpart
-        if(len(querypart)> 0):
-            url+='?'+querypart
+        url = self._build_url(path, matrix=matrix, query=query)
 
         if method == "POST" and body is None:
             body = ""
 
+        started = monotonic()
         response=self.sendAuthorized(method,url,body,base_headers,rawData=rawData)
+        encoding = content_encoding(response)
+        if encoding is not None:
+            response = DecompressingResponse(response, encoding)
 
-        if response.status<200 or response.status>299:
-            raise HTTPError(response.status,method,url,response.status,response.reason,response.read()).to_VSException(method=method,url=url,body=body)
+        not_modified = response.status==304 and ('If-None-Match' in base_headers or 'If-Modified-Since' in base_headers)
+        if (response.status<200 or response.status>299) and not not_modified:
+            try:
+                response_body = response.read()
+            finally:
+                self._checkin_connection()
+            if self.metrics is not None:
+                self.metrics.observe(method, path, response.status, monotonic()-started, self._body_length(body), len(response_body))
+            raise HTTPError(response.status,method,url,response.status,response.reason,response_body,
+                            headers=getattr(response,'msg',None)).to_VSException(method=method,url=url,body=body)
 
-        return response.read()
+        return response
 
     def xml_content(self):
         """
         Returns a string representing the XML of the VSApi object
         :return: a String
         """
-        return ET.tostring(self.dataContent,encoding='utf8')
+        return vs_xml.tostring(self.dataContent,encoding='utf8')
 
     def set_metadata(self,path,md,mode="default"):
         """
@@ -559,14 +1205,14 @@ class VSApi(object):
         return rtn
 
     def dump_xml(self):
-        return ET.tostring(self.dataContent)
+        return vs_xml.tostring(self.dataContent)
 
     def as_xml(self):
         """
         Return a string representing the XML document that is encapsulated by this object
         :return: String representing XML
         """
-        return ET.tostring(self.dataContent)
+        return vs_xml.tostring(self.dataContent)
 
     def findPortalDataNode(self,node,should_create=False):
         foundKey = False
@@ -581,9 +1227,9 @@ class VSApi(object):
                 return child
 
         if should_create:
-            keynode =  ET.SubElement(node,"{0}key".format(self.xmlns))
+            keynode =  vs_xml.SubElement(node,"{0}key".format(self.xmlns))
             keynode.text = "extradata"
-            valnode = ET.SubElement(node,"{0}value".format(self.xmlns))
+            valnode = vs_xml.SubElement(node,"{0}value".format(self.xmlns))
             return valnode
         return None
 
@@ -0,0 +1,420 @@
+import asyncio
+import logging
+import http.client
+from time import monotonic
+from .vidispine_api import VSApi, HTTPError, VSCircuitOpenError
+from .vs_resilience import get_host_health
+from .vs_rate_limit import get_rate_limiter
+from .vs_interceptor import VSRequest, intercept_async
+from .vs_compression import content_encoding, decompress_body, accept_encoding
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncResponse(object):
+    """
+    Represents a completed response from Vidispine, as returned by AsyncVSApi.send_authorized
+    """
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self):
+        return self.body
+
+
+class _AsyncConnection(object):
+    """
+    Internal class representing a single keep-alive HTTP/1.1 connection over asyncio streams
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    def close(self):
+        self.reusable = False
+        try:
+            self.writer.close()
+        except Exception as e:
+            logger.debug("error closing connection: {0}".format(e))
+
+    async def roundtrip(self, host, method, url, body, headers):
+        """
+        Sends a request and reads the complete response
+        :return: AsyncResponse
+        """
+        lines = ["{0} {1} HTTP/1.1".format(method, url), "Host: {0}".format(host)]
+        for k, v in headers.items():
+            lines.append("{0}: {1}".format(k, v))
+        if body is not None:
+            lines.append("Content-Length: {0}".format(VSApi._body_length(body)))
+        elif method in ("POST", "PUT"):
+            lines.append("Content-Length: 0")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+        self.writer.write(head)
+        if body is not None:
+            self.writer.write(body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Server closed the connection before sending a response")
+        parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        try:
+            status = int(parts[1])
+        except (IndexError, ValueError):
+            self.reusable = False
+            raise http.client.BadStatusLine(status_line.decode("latin-1"))
+        reason = parts[2] if len(parts) > 2 else ""
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            response_body = b""
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            response_body = await self._read_chunked()
+        elif "content-length" in response_headers:
+            response_body = await self.reader.readexactly(int(response_headers["content-length"]))
+        else:
+            response_body = await self.reader.read()
+            self.reusable = False
+
+        if response_headers.get("connection", "").lower() == "close":
+            self.reusable = False
+        return AsyncResponse(status, reason, response_headers, response_body)
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size_line = await self.reader.readline()
+            size = int(size_line.split(b";")[0].strip(), 16)
+            if size == 0:
+                #consume any trailers up to the terminating blank line
+                while True:
+                    line = await self.reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                break
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+        return b"".join(chunks)
+
+
+class AsyncVSApi(object):
+    """
+    asyncio counterpart to VSApi. This builds requests in exactly the same way as VSApi.request/raw_request (same matrix
+    and query encoding, same exceptions, same 503/504 retry behaviour and interceptors) but sends them over non-blocking connections,
+    so that one process can keep many requests in flight at once.
+
+    Keep-alive connections are pooled within each AsyncVSApi, and at most max_connections requests are sent at once.
+    Backoff and circuit breaker state is shared with VSApi objects talking to the same host, and requests are recorded
+    in VSApi.metrics if it is set.
+    An AsyncVSApi must only be used from the event loop that it was first used on.
+
+    client = AsyncVSApi(host, port, user, password)
+    item = VSItem(host, port, user, password)
+    await item.populate_async(client, "VX-1234")
+    results = await asyncio.gather(*[VSJob(host, port, user, password).populate_async(client, jobid) for jobid in joblist])
+    await client.close()
+    """
+    retry_attempts = VSApi.retry_attempts
+    retry_delay = VSApi.retry_delay
+
+    def __init__(self, host="localhost", port=8080, user="", passwd="", run_as=None, https=False, max_connections=100,
+                 logger=None):
+        """
+        Initialise a new asyncio Vidispine client
+        :param host: Hostname to connect to Vidispine on
+        :param port: Port number to connect to Vidispine on
+        :param user: Username to connect to Vidispine
+        :param passwd: Password for the given user
+        :param run_as: Tell Vidispine to assume the credentials of this user. See VSApi.
+        :param https: Set this to True to use https
+        :param max_connections: maximum number of requests to have in flight at any one time
+        :param logger: Use this logger object rather than initiating a new one. Only for testing.
+        """
+        self.host = host
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.run_as = run_as
+        self.https = https
+        self.max_connections = max_connections
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self._idle = []
+        self._semaphore = None
+
+    @classmethod
+    def from_api(cls, api, **kwargs):
+        """
+        Create an AsyncVSApi with the same connection settings as an existing VSApi (or subclass) object
+        :param api: VSApi object to copy settings from
+        :param kwargs: other keyword arguments for the constructor
+        :return: new AsyncVSApi
+        """
+        return cls(host=api.host, port=api.port, user=api.user, passwd=api.passwd, run_as=api.run_as,
+                   https=getattr(api, 'https', False), **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Close all idle connections
+        :return: None
+        """
+        idle = self._idle
+        self._idle = []
+        for conn in idle:
+            conn.close()
+
+    def _authorization_headers(self):
+        return VSApi._authorization_headers(self)
+
+    def _host_health(self):
+        return get_host_health(self.host, self.port)
+
+    def _rate_limiter(self):
+        return get_rate_limiter(self.host, self.port)
+
+    @property
+    def interceptors(self):
+        return VSApi.interceptors
+
+    @property
+    def compress_responses(self):
+        return VSApi.compress_responses
+
+    def _retry_delay_for(self, error):
+        return VSApi._retry_delay_for(self, error)
+
+    @property
+    def metrics(self):
+        return VSApi.metrics
+
+    def _record_retry(self, method, path, reason, backoff=0):
+        return VSApi._record_retry(self, method, path, reason, backoff)
+
+    async def _open_connection(self):
+        if self.https:
+            import ssl
+            reader, writer = await asyncio.open_connection(self.host, int(self.port), ssl=ssl.create_default_context())
+        else:
+            reader, writer = await asyncio.open_connection(self.host, int(self.port))
+        return _AsyncConnection(reader, writer)
+
+    async def _roundtrip(self, method, url, body, headers):
+        """
+        Internal method. Sends a single request over a pooled connection.  If an idle connection from the pool turns
+        out to have been closed by the server, the request is sent once more on a new connection; that is not a failure
+        of the server, so it is not counted by the circuit breaker.  Errors on a new connection are raised.
+        :return: AsyncResponse
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+
+        async with self._semaphore:
+            if len(self._idle) > 0:
+                conn = self._idle.pop()
+                try:
+                    return await self._roundtrip_on(conn, method, url, body, headers)
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    self.logger.debug("Pooled connection failed: {0}, retrying on a new connection".format(e))
+                    self._record_retry(method, url, "connection_reuse")
+            conn = await self._open_connection()
+            return await self._roundtrip_on(conn, method, url, body, headers)
+
+    async def _roundtrip_on(self, conn, method, url, body, headers):
+        """
+        Internal method. Sends a request over the given connection, and returns the connection to the pool afterwards
+        if it can be used again
+        :return: AsyncResponse
+        """
+        try:
+            response = await conn.roundtrip("{0}:{1}".format(self.host, self.port), method, url, body, headers)
+        except Exception:
+            conn.close()
+            raise
+        if conn.reusable:
+            self._idle.append(conn)
+        else:
+            conn.close()
+        return response
+
+    async def send_authorized(self, method, url, body, headers, rawData=False):
+        """
+        Internal method to sign and send requests, counterpart to VSApi.sendAuthorized. Callers should use request() instead
+        :return: AsyncResponse
+        """
+        headers = dict(headers)
+        headers.update(self._authorization_headers())
+        if len(self.interceptors) == 0:
+            return await self._send_authorized(method, url, body, headers, rawData)
+
+        request = VSRequest(self, method, url, body, headers, rawData)
+        return await intercept_async(self.interceptors, request,
+                                     lambda r: self._send_authorized(r.method, r.url, r.body, r.headers, r.rawData))
+
+    async def _limited_roundtrip(self, method, url, body, headers):
+        """
+        Internal method. Sends a single request within the rate and in-flight limits for its endpoint, see
+        vs_rate_limit.  These are shared with VSApi.  The limiter can block, so waiting for it is done on a thread.
+        :return: AsyncResponse
+        """
+        limiter = self._rate_limiter()
+        path = url[4:] if url.startswith("/API") else url
+        if not limiter.limits(method, path):
+            return await self._roundtrip(method, url, body, headers)
+        held = await asyncio.get_event_loop().run_in_executor(None, limiter.acquire, method, path)
+        try:
+            return await self._roundtrip(method, url, body, headers)
+        finally:
+            limiter.release(held)
+
+    async def _send_authorized(self, method, url, body, headers, rawData=False):
+        """
+        Internal method that actually sends a request, retrying on 504 and connection errors and following 303 redirects
+        in the same way as VSApi.  Each attempt takes its own rate limiter slot, so it is not held while backing off.
+        :return: AsyncResponse
+        """
+        attempt = 0
+
+        if isinstance(body, (memoryview, bytearray)):
+            body_to_send = body     #already binary, send as-is rather than copying it
+        elif rawData == False and body is not None:
+            try:
+                body_to_send = body.decode('utf-8', "backslashreplace").encode('utf-8', "backslashreplace")
+            except AttributeError:
+                body_to_send = body.encode('utf-8', "backslashreplace")
+        elif isinstance(body, str):
+            #raw data still has to go over the wire as bytes
+            body_to_send = body.encode('utf-8')
+        else:
+            body_to_send = body
+
+        health = self._host_health()
+        while True:
+            if not health.allow_request():
+                raise VSCircuitOpenError(method, url, health.retry_after())
+            self.logger.debug("sending {0} request to {1} with headers {2}".format(method, url, headers))
+            try:
+                response = await self._limited_roundtrip(method, url, body_to_send if body else None, headers)
+            except http.client.BadStatusLine:
+                health.record_failure()
+                raise
+            except (OSError, asyncio.IncompleteReadError) as e:
+                attempt += 1
+                health.record_failure()
+                delay = health.backoff_delay()
+                self.logger.warning("Connection error: {0}, retrying on a new connection in {1:.1f}s".format(e, delay))
+                self._record_retry(method, url, "socket_error", delay)
+                await asyncio.sleep(delay)
+                if attempt > 10:
+                    raise
+                continue
+
+            if response.status == 303:
+                url = response.getheader('location')
+                self.logger.debug("Response was a redirect to {0}".format(url))
+            elif response.status == 504:
+                health.record_failure()
+                delay = health.backoff_delay()
+                self.logger.warning("Gateway timeout error communicating with {0}. Waiting {1:.1f} seconds before trying again.".format(url, delay))
+                self._record_retry(method, url, "504", delay)
+                await asyncio.sleep(delay)
+            else:
+                if response.status == 503:
+                    health.record_failure()
+                else:
+                    health.record_success()
+                return response
+
+    async def raw_request(self, path, method="GET", matrix=None, query=None, body=None, accept="application/xml",
+                          content_type='application/xml', rawData=False, extra_headers={}):
+        """
+        Internal method to build request parameters, counterpart to VSApi.raw_request.  Callers should use request() instead.
+        :return: response body as bytes
+        """
+        base_headers = {'Accept': accept, }
+        if body is not None:
+            base_headers['Content-Type'] = content_type
+        if self.compress_responses:
+            base_headers['Accept-Encoding'] = accept_encoding
+        base_headers.update(extra_headers)
+
+        url = VSApi._build_url(path, matrix=matrix, query=query)
+
+        if method == "POST" and body is None:
+            body = ""
+
+        started = monotonic()
+        response = await self.send_authorized(method, url, body, base_headers, rawData=rawData)
+        encoding = content_encoding(response)
+        if encoding is not None:
+            response.body = decompress_body(response.body, encoding)
+        if self.metrics is not None:
+            self.metrics.observe(method, path, response.status, monotonic() - started, VSApi._body_length(body),
+                                 len(response.body))
+
+        if response.status < 200 or response.status > 299:
+            raise HTTPError(response.status, method, url, response.status, response.reason, response.body).to_VSException(method=method, url=url, body=body)
+
+        return response.body
+
+    async def request(self, path, method="GET", matrix=None, query=None, body=None, accept='application/xml'):
+        """
+        Send a request to Vidispine, counterpart to VSApi.request. Retries if a 503 Server Unavailable or a bad status
+        line is returned.
+        :param path: URL path to send the request to, not including /API
+        :param method: GET, PUT, POST, DELETE, etc. - the HTTP method to request
+        :param matrix: A dictionary of "matrix parameters" for the API call
+        :param query: A dictionary of "query parameters" for the API call
+        :param body: String representing the raw request body to send
+        :param accept: String representing the MIME type of data to accept in return. Default is application/xml.
+        :return: A parsed XML element tree if data is returned or the string "Success" if there is no data. Raises VSException
+        subclasses if an error occurs.
+        """
+        n = 0
+        while True:
+            try:
+                n += 1
+                raw_body = await self.raw_request(path.replace(' ', '%20'), method=method, matrix=matrix, query=query,
+                                                  body=body, accept=accept)
+                break
+            except HTTPError as e:
+                if e.code == 503:
+                    delay = self._retry_delay_for(e)
+                    self.logger.warning("Server not available error when contacting Vidispine. Waiting {0:.1f}s before retry.".format(delay))
+                    self._record_retry(method, path, "503", delay)
+                    await asyncio.sleep(delay)
+                    if n > self.retry_attempts:
+                        self.logger.error("Did not work after %d retries, giving up" % self.retry_attempts)
+                        raise e
+                else:
+                    raise e
+            except http.client.BadStatusLine as e: #retry if we got a bad status line
+                self.logger.warning("Bad status line: {0}".format(e))
+                delay = self._host_health().backoff_delay(self.retry_delay)
+                self._record_retry(method, path, "bad_status_line", delay)
+                await asyncio.sleep(delay)
+                if n > self.retry_attempts:
+                    self.logger.error("Did not work after %d tries, giving up" % self.retry_attempts)
+                    raise e
+
+        return VSApi._parse_body(raw_body, accept)
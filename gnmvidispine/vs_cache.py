@@ -0,0 +1,147 @@
+import threading
+import logging
+from collections import OrderedDict
+from copy import deepcopy
+from time import time
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(type, entity_id, fields=None):
+    """
+    Returns the cache key for a metadata document
+    :param type: "item" or "collection"
+    :param entity_id: Vidispine ID of the entity
+    :param fields: list or tuple of the fields that were requested, or None for all fields
+    :return: tuple
+    """
+    if fields is not None:
+        fields = tuple(fields)
+    return (type, entity_id, fields)
+
+
+class VSMetadataCache(object):
+    """
+    Thread-safe, in-process cache of parsed metadata documents, with a bounded size, least-recently-used eviction and a
+    time-to-live on each entry.
+
+    Entries are keyed by (type, id, field list) - see cache_key() - so the same item requested with different field
+    lists is cached separately.  invalidate() drops every entry for an entity, whatever fields it was requested with.
+    Documents are copied on the way in and on the way out, so callers can't change what is held in the cache.
+
+    To have every VSItem consult a cache when it is populated:
+    VSItem.metadata_cache = VSMetadataCache(maxsize=5000, ttl=30)
+    """
+    default_maxsize = 1000
+    default_ttl = 60
+
+    def __init__(self, maxsize=None, ttl=None):
+        """
+        Initialise a new cache
+        :param maxsize: maximum number of entries to hold. When the cache is full the least recently used entry is dropped.
+        :param ttl: number of seconds that an entry is valid for
+        """
+        self.maxsize = maxsize if maxsize is not None else self.default_maxsize
+        self.ttl = ttl if ttl is not None else self.default_ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   #key -> (document, expiry time), least recently used first
+        self._keys_by_id = {}           #(type, id) -> set of keys, for invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _remove(self, key):
+        """
+        Internal method, removes an entry. Call with the lock held.
+        """
+        del self._entries[key]
+        keys = self._keys_by_id.get(key[0:2])
+        if keys is not None:
+            keys.discard(key)
+            if len(keys) == 0:
+                del self._keys_by_id[key[0:2]]
+
+    def get(self, key):
+        """
+        Look up a document in the cache
+        :param key: key from cache_key()
+        :return: a copy of the cached document, or None if it is not cached or has expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            document, expires_at = entry
+            if time() >= expires_at:
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return deepcopy(document)
+
+    def put(self, key, document):
+        """
+        Add a document to the cache, replacing any existing entry for the key
+        :param key: key from cache_key()
+        :param document: parsed XML document
+        :return: None
+        """
+        document = deepcopy(document)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (document, time() + self.ttl)
+            self._keys_by_id.setdefault(key[0:2], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, type, entity_id):
+        """
+        Drop every cached document for the given entity
+        :param type: "item" or "collection"
+        :param entity_id: Vidispine ID of the entity
+        :return: None
+        """
+        with self._lock:
+            keys = self._keys_by_id.get((type, entity_id))
+            if keys is None:
+                return
+            for key in list(keys):
+                self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        """
+        Drop everything in the cache
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_id.clear()
+
+    def stats(self):
+        """
+        Returns a dictionary of counters for this cache
+        :return: dictionary with size, hits, misses, evictions, expired and invalidations counts
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'invalidations': self.invalidations,
+            }
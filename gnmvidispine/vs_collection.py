@@ -36,15 +36,27 @@ class VSCollection(VSItem):
     def __unicode__(self):
         return 'Vidispine collection with ID {0}'.format(self.name)
 
-    def populate(self, id, type="collection", specificFields=None):
+    def populate(self, id, type="collection", specificFields=None, workload=None):
         """
         Populates this object with data from the Vidispine system
         :param id: Vidispine ID of the collection to read
+        :param workload: name to learn the fields for this populate under, see VSItem.populate()
         :return:
         """
-        super(VSCollection,self).populate(id,type="collection",specificFields=specificFields)
+        super(VSCollection,self).populate(id,type="collection",specificFields=specificFields,workload=workload)
         response = self.request("/collection/{0}".format(self.name))
         self.itemCount = sum(1 for node in response.findall("{0}content".format(self.xmlns)))
+
+    async def populate_async(self, client, id=None, type="collection", specificFields=None):
+        """
+        asyncio version of populate()
+        :param client: AsyncVSApi object to make the requests with
+        :param id: Vidispine ID of the collection to read, or None to use the ID in collection.name
+        :return:
+        """
+        await super(VSCollection,self).populate_async(client,id,type="collection",specificFields=specificFields)
+        response = await client.request("/collection/{0}".format(self.name))
+        self.itemCount = sum(1 for node in response.findall("{0}content".format(self.xmlns)))
         
 
     def addToCollection(self, item, type="item"):
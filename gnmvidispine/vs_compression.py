@@ -0,0 +1,110 @@
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+accept_encoding = "gzip, deflate"
+supported_encodings = ("gzip", "x-gzip", "deflate")
+
+
+def _new_decompressor(encoding, raw=False):
+    if raw:
+        return zlib.decompressobj(-zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj(zlib.MAX_WBITS)
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def content_encoding(response):
+    """
+    Returns the Content-Encoding of a response in lower case, or None if there is not one that we can decode
+    :param response: response object
+    :return: string or None
+    """
+    try:
+        encoding = response.getheader('Content-Encoding')
+    except AttributeError:
+        return None
+    if encoding is None or not isinstance(encoding, str):
+        return None
+    encoding = encoding.strip().lower()
+    return encoding if encoding in supported_encodings else None
+
+
+def decompress_body(data, encoding):
+    """
+    Decompresses a complete response body
+    :param data: compressed body as bytes
+    :param encoding: value of the Content-Encoding header
+    :return: bytes
+    """
+    try:
+        d = _new_decompressor(encoding)
+        return d.decompress(data) + d.flush()
+    except zlib.error:
+        if encoding != "deflate":
+            raise
+        #some servers send raw deflate data without the zlib header
+        d = _new_decompressor(encoding, raw=True)
+        return d.decompress(data) + d.flush()
+
+
+class DecompressingResponse(object):
+    """
+    Wraps an http.client response with a gzip or deflate Content-Encoding, so that reading it returns the decompressed
+    data.  Data is decompressed as it is read, so read(amt) never holds more than about amt bytes of decompressed
+    data at once and the response can be fed straight into an incremental parser.  Everything else is passed
+    through to the wrapped response.
+    """
+    chunk_size = 65536
+
+    def __init__(self, response, encoding):
+        """
+        :param response: response object to wrap
+        :param encoding: value of its Content-Encoding header, as returned by content_encoding()
+        """
+        self._response = response
+        self.encoding = encoding
+        self._decompressor = _new_decompressor(encoding)
+        self._started = False
+        self._eof = False
+        self._buffer = bytearray()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def _decompress(self, data, max_length=0):
+        try:
+            rtn = self._decompressor.decompress(data, max_length)
+        except zlib.error:
+            if self._started or self.encoding != "deflate":
+                raise
+            #some servers send raw deflate data without the zlib header
+            self._decompressor = _new_decompressor(self.encoding, raw=True)
+            rtn = self._decompressor.decompress(data, max_length)
+        self._started = True
+        return rtn
+
+    def read(self, amt=None):
+        if amt is None:
+            if not self._eof:
+                self._buffer += self._decompress(self._decompressor.unconsumed_tail + self._response.read())
+                self._buffer += self._decompressor.flush()
+                self._eof = True
+            rtn = bytes(self._buffer)
+            self._buffer = bytearray()
+            return rtn
+
+        while len(self._buffer) < amt and not self._eof:
+            if len(self._decompressor.unconsumed_tail) > 0:
+                self._buffer += self._decompress(self._decompressor.unconsumed_tail, amt)
+                continue
+            data = self._response.read(self.chunk_size)
+            if not data:
+                self._buffer += self._decompressor.flush()
+                self._eof = True
+            else:
+                self._buffer += self._decompress(data, amt)
+        rtn = bytes(self._buffer[0:amt])
+        del self._buffer[0:amt]
+        return rtn
@@ -0,0 +1,211 @@
+import http.client
+import threading
+import logging
+from time import time
+
+logger = logging.getLogger(__name__)
+
+
+class VSConnectionPool(object):
+    """
+    Thread-safe pool of keep-alive http connections to a single Vidispine server.
+
+    VSApi objects borrow a connection for the duration of a request and hand it back once the response has been read,
+    so that many objects (and many threads) can share a small number of TCP connections rather than each opening
+    their own.  You don't normally need to create one of these yourself; get_pool() returns a shared pool for a given
+    set of connection settings.
+
+    pool = VSConnectionPool("vidispine.local", 8080, maxsize=20, idle_timeout=30)
+    conn = pool.acquire()
+    ...
+    pool.release(conn)
+    pprint(pool.stats())
+    """
+    default_maxsize = 10
+    default_idle_timeout = 60
+
+    def __init__(self, host, port, https=False, maxsize=None, idle_timeout=None, connection_factory=None):
+        """
+        Initialise a new connection pool
+        :param host: host to connect to
+        :param port: port to connect to
+        :param https: if True, make HTTPSConnections rather than HTTPConnections
+        :param maxsize: maximum number of idle connections to keep hold of. Connections released when the pool is full are closed.
+        :param idle_timeout: connections that have been idle for longer than this many seconds are closed rather than re-used
+        :param connection_factory: optional callable taking (host, port) and returning a new connection object. Use this
+        to plug in a different connection class.
+        """
+        self.host = host
+        self.port = port
+        self.https = https
+        self.maxsize = maxsize if maxsize is not None else self.default_maxsize
+        self.idle_timeout = idle_timeout if idle_timeout is not None else self.default_idle_timeout
+        if connection_factory is not None:
+            self._factory = connection_factory
+        elif https:
+            self._factory = http.client.HTTPSConnection
+        else:
+            self._factory = http.client.HTTPConnection
+
+        self._lock = threading.Lock()
+        self._idle = []     #list of (connection, time_released) tuples, most recently released last
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.reaped = 0
+        self.in_use = 0
+
+    def __repr__(self):
+        return "VSConnectionPool({0}:{1}, maxsize={2})".format(self.host, self.port, self.maxsize)
+
+    def _reap(self, now):
+        """
+        Internal method, closes any idle connections that have passed idle_timeout. Call with the lock held.
+        :param now: current time
+        :return: None
+        """
+        while len(self._idle) > 0 and now - self._idle[0][1] > self.idle_timeout:
+            conn, released_at = self._idle.pop(0)
+            self.reaped += 1
+            self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception as e:
+            logger.debug("error closing pooled connection: {0}".format(e))
+
+    def acquire(self, fresh=False):
+        """
+        Borrow a connection from the pool, creating a new one if there are none idle.
+        :param fresh: if True, always create a new connection rather than re-using an idle one, e.g. because an idle one
+        has just turned out to have been closed by the server
+        :return: connection object. Pass this back to release() or discard() when you are done with it.
+        """
+        with self._lock:
+            self._reap(time())
+            self.in_use += 1
+            if len(self._idle) > 0 and not fresh:
+                self.hits += 1
+                return self._idle.pop()[0]
+            self.misses += 1
+        return self._factory(self.host, self.port)
+
+    def release(self, conn):
+        """
+        Return a connection to the pool so that it can be re-used. The response from the last request made on it must
+        have been completely read.
+        :param conn: connection previously returned by acquire()
+        :return: None
+        """
+        with self._lock:
+            self.in_use -= 1
+            if len(self._idle) < self.maxsize:
+                self._idle.append((conn, time()))
+                return
+            self.discarded += 1
+        self._close(conn)
+
+    @staticmethod
+    def _drop_socket(conn):
+        """
+        Internal method, closes the connection's own reference to its socket. A response that is still being read holds
+        its own reference, so the socket stays open until that response is closed and is not left for the garbage
+        collector.
+        """
+        sock = getattr(conn, 'sock', None)
+        if sock is None:
+            return
+        conn.sock = None
+        try:
+            sock.close()
+        except Exception as e:
+            logger.debug("error closing pooled connection socket: {0}".format(e))
+
+    def discard(self, conn, close=True):
+        """
+        Tell the pool that a connection should not be re-used, e.g. because it errored
+        :param conn: connection previously returned by acquire()
+        :param close: if True (the default) close the connection. Set to False if something else (like an
+        unread response) still depends on it; the socket is then closed once the response has finished with it.
+        :return: None
+        """
+        with self._lock:
+            self.in_use -= 1
+            self.discarded += 1
+        if close:
+            self._close(conn)
+        else:
+            self._drop_socket(conn)
+
+    def clear(self):
+        """
+        Close all idle connections
+        :return: None
+        """
+        with self._lock:
+            to_close = self._idle
+            self._idle = []
+        for conn, released_at in to_close:
+            self._close(conn)
+
+    def stats(self):
+        """
+        Returns a dictionary of counters for this pool
+        :return: dictionary with hits, misses, idle, in_use, discarded and reaped counts
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'discarded': self.discarded,
+                'reaped': self.reaped,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host, port, user="", passwd="", https=False):
+    """
+    Returns the shared VSConnectionPool for the given connection settings, creating it if necessary.  Every VSApi
+    object built from the same settings will borrow from the same pool.
+    :param host: Vidispine host
+    :param port: Vidispine port
+    :param user: username that requests will be authenticated as
+    :param passwd: password for user
+    :param https: True if the connection is over https
+    :return: VSConnectionPool
+    """
+    key = (host, int(port), "https" if https else "http", user, passwd)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = VSConnectionPool(host, port, https=https)
+            _pools[key] = pool
+        return pool
+
+
+def all_pools():
+    """
+    Returns a list of all of the shared pools that have been created so far, e.g. to dump their stats
+    :return: list of VSConnectionPool
+    """
+    with _pools_lock:
+        return list(_pools.values())
+
+
+def clear_pools():
+    """
+    Closes all idle connections in every shared pool and forgets the pools
+    :return: None
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.clear()
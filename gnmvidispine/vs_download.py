@@ -0,0 +1,193 @@
+import os
+import re
+import logging
+from hashlib import sha1
+from time import monotonic
+from .vidispine_api import HTTPError
+
+logger = logging.getLogger(__name__)
+
+default_block_size = 1024*1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+class HashMismatchError(DownloadError):
+    pass
+
+
+def _open_range(api, path, start=0, end=None):
+    """
+    Internal function, sends a request for the file data, optionally for a byte range.  This goes through the same
+    rate limiter as VSApi.request, but like stream_request only counts as in flight until the response starts arriving.
+    :param api: VSApi object to send the request with
+    :param path: URL path of the file data, not including /API
+    :param start: first byte to request
+    :param end: last byte to request (inclusive), or None for the rest of the file
+    :return: HTTPResponse with a 2xx status. Raises HTTPError or VSException subclasses if the server returned an error.
+    """
+    extra_headers = {}
+    if start > 0 or end is not None:
+        extra_headers['Range'] = "bytes={0}-{1}".format(start, end if end is not None else "")
+    if api.compress_responses:
+        #byte ranges have to refer to the file itself, not a compressed version of it
+        extra_headers['Accept-Encoding'] = 'identity'
+
+    with api._request_slot('GET', path):
+        return api._send_request(path, accept='*', extra_headers=extra_headers)
+
+
+def _range_total(headers):
+    """
+    Internal function, returns the total size of the file from the Content-Range header of a response, or None
+    """
+    try:
+        content_range = headers.get('Content-Range')
+    except AttributeError:
+        return None
+    if not isinstance(content_range, str):
+        return None
+    match = re.match(r'^bytes (?:\d+-\d+|\*)/(\d+)$', content_range.strip())
+    return int(match.group(1)) if match else None
+
+
+def _copy_response(api, path, response, fileobj, block_size, hasher=None):
+    """
+    Internal function, copies the body of a response into a file in blocks of block_size
+    :return: number of bytes copied
+    """
+    started = monotonic()
+    copied = 0
+    try:
+        while True:
+            block = response.read(block_size)
+            if not block:
+                break
+            fileobj.write(block)
+            if hasher is not None:
+                hasher.update(block)
+            copied += len(block)
+    except Exception:
+        api._discard_connection()
+        raise
+    api._checkin_connection()
+    if api.metrics is not None:
+        api.metrics.observe('GET', path, response.status, monotonic() - started, 0, copied)
+    return copied
+
+
+def _file_sha1(path, block_size):
+    hasher = sha1()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _download_segments(api, url, path, size, segments, block_size):
+    """
+    Internal function, downloads a file as several byte ranges in parallel, each on its own connection
+    :return: None
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+    segment_size = -(-size // segments)   #round up, so that the segments cover the whole file
+
+    def fetch_segment(start):
+        end = min(start + segment_size, size) - 1
+        response = _open_range(api, url, start, end)
+        if response.status != 206:
+            api._discard_connection()
+            raise DownloadError("Server did not honour a range request for {0}, so it can't be downloaded in segments".format(url))
+        with open(path, "r+b") as f:
+            f.seek(start)
+            copied = _copy_response(api, url, response, f, block_size)
+        if copied != end - start + 1:
+            raise DownloadError("Segment {0}-{1} of {2} was incomplete".format(start, end, url))
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        for result in executor.map(fetch_segment, range(0, size, segment_size)):
+            pass
+
+
+def download_file_to(api, file_id, destination, size=None, file_hash=None, block_size=None, segments=1, resume=True):
+    """
+    Streams the data of a Vidispine file to disk in blocks, rather than holding it in memory.
+
+    If destination is a path and a partial download is already there, only the rest of the file is requested with an
+    HTTP Range request; if it turns out to be the whole file already, the server's 416 response is not an error.  If
+    the size is known, segments > 1 splits the file into that many byte ranges which are downloaded in parallel.  If
+    file_hash is given, the result is checked against it (Vidispine file hashes are SHA-1) and HashMismatchError is
+    raised, and the file removed, if it does not match.
+    :param api: VSApi object to make the requests with
+    :param file_id: Vidispine ID of the file
+    :param destination: path to download to, or an open file object to write to
+    :param size: size of the file in bytes, if known
+    :param file_hash: SHA-1 hash of the file as a hex string, if known
+    :param block_size: size of the blocks to read and write, in bytes
+    :param segments: number of byte ranges to download in parallel. Only used when downloading a whole file of known
+    size to a path, over pooled connections.
+    :param resume: if True (the default) continue a partial download at destination rather than starting again
+    :return: destination
+    """
+    url = '/storage/file/{0}/data'.format(file_id)
+    block_size = block_size if block_size is not None else default_block_size
+    size = int(size) if size is not None else None
+
+    if not isinstance(destination, str):
+        hasher = sha1() if file_hash is not None else None
+        _copy_response(api, url, _open_range(api, url), destination, block_size, hasher)
+        if hasher is not None and hasher.hexdigest().lower() != file_hash.lower():
+            raise HashMismatchError("Downloaded data for {0} has hash {1}, expected {2}".format(file_id, hasher.hexdigest(), file_hash))
+        return destination
+
+    existing = os.path.getsize(destination) if resume and os.path.exists(destination) else 0
+    if size is not None and existing > size:
+        existing = 0
+
+    hasher = None
+    if size is not None and existing == size:
+        logger.debug("{0} is already completely downloaded".format(destination))
+    elif existing == 0 and segments > 1 and size is not None and size > block_size and api._conn is None:
+        #download to a temporary name, so that an interrupted download is not mistaken for a complete one
+        partial_path = destination + ".part"
+        _download_segments(api, url, partial_path, size, segments, block_size)
+        os.replace(partial_path, destination)
+    else:
+        try:
+            response = _open_range(api, url, existing)
+        except HTTPError as e:
+            #416 means that there is nothing after the bytes we already have, which is fine if they are the whole file
+            if e.code != 416 or existing == 0 or (size if size is not None else _range_total(e.headers)) != existing:
+                raise
+            logger.debug("{0} is already completely downloaded".format(destination))
+            response = None
+        if response is not None:
+            if existing > 0 and response.status != 206:
+                logger.warning("Server did not honour the range request for {0}, downloading the whole file again".format(url))
+                existing = 0
+            elif existing > 0:
+                logger.info("Resuming download of {0} from byte {1}".format(file_id, existing))
+            if existing == 0 and file_hash is not None:
+                hasher = sha1()
+            with open(destination, "ab" if existing > 0 else "wb") as f:
+                _copy_response(api, url, response, f, block_size, hasher)
+
+    final_size = os.path.getsize(destination)
+    if size is not None and final_size != size:
+        raise DownloadError("Download of {0} is incomplete, got {1} of {2} bytes".format(file_id, final_size, size))
+
+    if file_hash is not None:
+        digest = hasher.hexdigest() if hasher is not None else _file_sha1(destination, block_size)
+        if digest.lower() != file_hash.lower():
+            os.unlink(destination)
+            raise HashMismatchError("Downloaded file {0} has hash {1}, expected {2}".format(destination, digest, file_hash))
+    return destination
@@ -2,6 +2,7 @@ __author__ = 'andy.gallagher@theguardian.com'
 
 from .vidispine_api import *
 import xml.etree.ElementTree as ET
+from . import vs_xml
 import logging
 
 
@@ -108,8 +109,8 @@ class VSField(VSApi):
 
         #SubElement(self.dataContent,'data')
 
-        self.dataContent = ET.fromstring(ET.tostring(self.dataContent))
-        self._logger.debug(ET.tostring(self.dataContent))
+        self.dataContent = vs_xml.fromstring(ET.tostring(self.dataContent))
+        self._logger.debug(vs_xml.tostring(self.dataContent))
         if commit:
             self.commitXML()
         return self
@@ -117,7 +118,7 @@ class VSField(VSApi):
     def _node_find_or_create(self,parent,xp):
         node = parent.find(xp.format(self.xmlns))
         if node is None:
-            node = ET.SubElement(parent,xp.format(self.xmlns))
+            node = vs_xml.SubElement(parent,xp.format(self.xmlns))
         return node
 
     def set_string_restriction(self,min,max):
@@ -157,7 +158,7 @@ class VSField(VSApi):
 
         parent_node = self.dataContent.find('{0}data'.format(self.xmlns))
         if parent_node is None:
-            parent_node = ET.SubElement(self.dataContent,"{0}data".format(self.xmlns))
+            parent_node = vs_xml.SubElement(self.dataContent,"{0}data".format(self.xmlns))
 
         node = self.findPortalDataNode(parent_node, should_create=True)
         node.text = json.dumps(self.portalData)
@@ -187,7 +188,7 @@ class VSField(VSApi):
         Saves changes made to the object back to Vidispine.  Raises a VSException if this fails.
         :return: None
         """
-        response=self.request("/metadata-field/%s" % self.name, method="PUT",body=ET.tostring(self.dataContent))
+        response=self.request("/metadata-field/%s" % self.name, method="PUT",body=vs_xml.tostring(self.dataContent))
         self._logger.debug("VSField::commitXML: got %s" % response)
 
     def delete(self):
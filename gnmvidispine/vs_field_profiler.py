@@ -0,0 +1,161 @@
+import threading
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+#frames from modules in this package are not call sites, see VSFieldProfiler.call_site()
+_package_prefix = __name__.rpartition('.')[0] + '.'
+
+
+class _Workload(object):
+    """
+    Internal class, what has been learnt about one workload
+    """
+    def __init__(self):
+        self.fields = set()
+        self.populates = 0
+        self.projected = 0
+        self.misses = 0
+        self.needs_all = False
+
+
+class VSFieldProfiler(object):
+    """
+    Learns which metadata fields each workload actually reads, so that populate() can ask Vidispine for just those
+    fields rather than the whole document.
+
+    VSItem uses this if a VSFieldProfiler object is set on it:
+    VSItem.field_profiler = VSFieldProfiler(warmup=3)
+
+    A workload is either the name passed to populate(workload="...") or, by default, the line of code outside this
+    package that called populate().  The first few populates for a workload (the warmup) fetch everything, and every
+    field that is read from the item with get() is recorded against the workload.  After that, populates for the
+    workload only request the fields recorded so far.  If an item is asked for a field that it was not populated with,
+    that is a miss: the field is added to the workload and the item falls back to fetching the whole document.  Reading
+    contentDict directly can touch any field, so it marks the workload as needing every field from then on.  Methods
+    of the item that need the whole document, like metadata_document() and to_cache(), fetch it without doing that.
+    """
+    def __init__(self, warmup=3):
+        """
+        :param warmup: number of full populates to learn from before a workload's fields are used
+        """
+        self.warmup = warmup
+        self._lock = threading.Lock()
+        self._workloads = {}
+
+    @staticmethod
+    def call_site():
+        """
+        Returns a name for the code that called into this package, as "filename:line"
+        :return: string
+        """
+        frame = sys._getframe(1)
+        #checking the module name is much cheaper than working out which directory each frame's file is in
+        while frame is not None and frame.f_globals.get('__name__', '').startswith(_package_prefix):
+            frame = frame.f_back
+        if frame is None:
+            return "unknown"
+        return "{0}:{1}".format(frame.f_code.co_filename, frame.f_lineno)
+
+    def _workload(self, workload):
+        """
+        Internal method, returns the record for a workload, creating it if necessary. Call with the lock held.
+        """
+        try:
+            return self._workloads[workload]
+        except KeyError:
+            record = _Workload()
+            self._workloads[workload] = record
+            return record
+
+    def fields_for(self, workload):
+        """
+        Called for each populate, returns the fields to request for the workload
+        :param workload: workload name
+        :return: sorted list of field names, or None to fetch the whole document
+        """
+        with self._lock:
+            record = self._workload(workload)
+            record.populates += 1
+            if record.needs_all or record.populates <= self.warmup or len(record.fields) == 0:
+                return None
+            record.projected += 1
+            return sorted(record.fields)
+
+    def record(self, workload, fieldname):
+        """
+        Records that a field was read by a workload
+        :param workload: workload name
+        :param fieldname: field name
+        :return: None
+        """
+        if fieldname is None:
+            return
+        with self._lock:
+            self._workload(workload).fields.add(fieldname)
+
+    def record_all(self, workload):
+        """
+        Records that a workload read the whole of contentDict, so it must always fetch every field
+        :param workload: workload name
+        :return: None
+        """
+        with self._lock:
+            record = self._workload(workload)
+            if not record.needs_all:
+                logger.debug("Workload {0} reads all fields, no longer projecting".format(workload))
+            record.needs_all = True
+
+    def miss(self, workload, fieldname):
+        """
+        Records that a workload read a field that it had not asked Vidispine for
+        :param workload: workload name
+        :param fieldname: field name
+        :return: None
+        """
+        logger.debug("Workload {0} missed field {1}, fetching the whole document".format(workload, fieldname))
+        with self._lock:
+            record = self._workload(workload)
+            record.fields.add(fieldname)
+            record.misses += 1
+
+    def reset(self, workload=None):
+        """
+        Forget what has been learnt, about one workload or all of them
+        :param workload: workload name, or None for all workloads
+        :return: None
+        """
+        with self._lock:
+            if workload is None:
+                self._workloads = {}
+            else:
+                self._workloads.pop(workload, None)
+
+    def profile(self, workload):
+        """
+        Returns what has been learnt about a workload
+        :param workload: workload name
+        :return: dictionary with the sorted list of fields, whether it needs all fields, and populates, projected and
+        misses counts; or None if nothing is known about the workload
+        """
+        with self._lock:
+            record = self._workloads.get(workload)
+            if record is None:
+                return None
+            return {
+                'fields': sorted(record.fields),
+                'needs_all': record.needs_all,
+                'populates': record.populates,
+                'projected': record.projected,
+                'misses': record.misses,
+            }
+
+    def stats(self):
+        """
+        Returns a dictionary of workload name -> profile() for every workload seen
+        :return: dictionary
+        """
+        with self._lock:
+            workloads = list(self._workloads.keys())
+        return dict((workload, self.profile(workload)) for workload in workloads)
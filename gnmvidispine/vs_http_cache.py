@@ -0,0 +1,223 @@
+import threading
+import logging
+from collections import OrderedDict
+from email.utils import parsedate_tz, mktime_tz
+from time import time
+
+logger = logging.getLogger(__name__)
+
+
+def _header(response, name):
+    """
+    Returns a header of a response, or None if it does not have one (or the response object can't tell us)
+    """
+    try:
+        value = response.getheader(name)
+    except AttributeError:
+        return None
+    return value if isinstance(value, str) else None
+
+
+def freshness(response, default_ttl=0):
+    """
+    Works out from the Cache-Control and Expires headers of a response whether it may be cached and for how long
+    :param response: response object
+    :param default_ttl: number of seconds to treat a response as fresh if it does not say
+    :return: tuple of (storable, ttl in seconds). A ttl of 0 means that it must be revalidated every time it is used.
+    """
+    cache_control = _header(response, 'Cache-Control')
+    if cache_control is not None:
+        directives = {}
+        for part in cache_control.lower().split(','):
+            name, _, value = part.strip().partition('=')
+            directives[name] = value.strip('"')
+        if 'no-store' in directives:
+            return False, 0
+        if 'no-cache' in directives:
+            return True, 0
+        if 'max-age' in directives:
+            try:
+                return True, max(0, int(directives['max-age']))
+            except ValueError:
+                return True, 0
+
+    expires = _header(response, 'Expires')
+    if expires is not None:
+        parsed = parsedate_tz(expires)
+        if parsed is None:
+            return True, 0     #an invalid Expires means already expired
+        return True, max(0, mktime_tz(parsed) - time())
+    return True, default_ttl
+
+
+class VSHttpCacheEntry(object):
+    """
+    A cached response body with the validators needed to revalidate it
+    """
+    def __init__(self, body, etag, last_modified, expires_at):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    def is_fresh(self):
+        return time() < self.expires_at
+
+    def validators(self):
+        """
+        Returns the headers to send to ask the server whether this entry is still current
+        :return: dictionary
+        """
+        rtn = {}
+        if self.etag is not None:
+            rtn['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            rtn['If-Modified-Since'] = self.last_modified
+        return rtn
+
+
+class VSHttpCache(object):
+    """
+    Thread-safe, in-process HTTP cache of GET response bodies, bounded by total size and number of entries with
+    least-recently-used eviction.
+
+    Responses that carry an ETag or Last-Modified header are kept, and the next request for the same URL is sent with
+    If-None-Match/If-Modified-Since so that an unchanged document costs a 304 with no body rather than a full
+    download.  While a response is fresh according to its Cache-Control max-age (or Expires) header it is returned
+    without contacting the server at all; no-cache responses are always revalidated and no-store responses are never
+    kept.  A PUT, POST or DELETE made through the same cache drops everything cached for that entity.
+
+    The cache works on raw response bodies, before parsing, and is only used if it is set on VSApi:
+    VSApi.http_cache = VSHttpCache(max_bytes=32*1024*1024)
+    """
+    default_max_bytes = 64*1024*1024
+    default_max_entries = 10000
+
+    def __init__(self, max_bytes=None, max_entries=None, default_ttl=0):
+        """
+        Initialise a new cache
+        :param max_bytes: maximum total size of the bodies to hold
+        :param max_entries: maximum number of responses to hold
+        :param default_ttl: number of seconds to treat a response as fresh if it has no Cache-Control or Expires
+        header. The default of 0 revalidates on every request.
+        """
+        self.max_bytes = max_bytes if max_bytes is not None else self.default_max_bytes
+        self.max_entries = max_entries if max_entries is not None else self.default_max_entries
+        self.default_ttl = default_ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   #key -> VSHttpCacheEntry, least recently used first
+        self._size = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _remove(self, key):
+        """
+        Internal method, removes an entry. Call with the lock held.
+        """
+        entry = self._entries.pop(key)
+        self._size -= len(entry.body)
+
+    def lookup(self, key):
+        """
+        Look up a cached response
+        :param key: key identifying the request, see VSApi._http_cache_key
+        :return: VSHttpCacheEntry, or None if nothing is cached. The entry may need revalidating; check is_fresh().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.is_fresh():
+                self.hits += 1
+            return entry
+
+    def store(self, key, body, response):
+        """
+        Cache a response body, if its headers allow it
+        :param key: key identifying the request
+        :param body: response body
+        :param response: response object, for its headers
+        :return: None
+        """
+        storable, ttl = freshness(response, self.default_ttl)
+        etag = _header(response, 'ETag')
+        last_modified = _header(response, 'Last-Modified')
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if not storable or (ttl == 0 and etag is None and last_modified is None) or len(body) > self.max_bytes:
+                return
+            self._entries[key] = VSHttpCacheEntry(body, etag, last_modified, time() + ttl)
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def not_modified(self, key, entry, response):
+        """
+        Record that the server confirmed a cached response is still current, updating its expiry and validators from
+        the 304 response
+        :param key: key identifying the request
+        :param entry: VSHttpCacheEntry that was revalidated
+        :param response: the 304 response
+        :return: the cached body
+        """
+        storable, ttl = freshness(response, self.default_ttl)
+        with self._lock:
+            self.revalidated += 1
+            entry.expires_at = time() + ttl
+            entry.etag = _header(response, 'ETag') or entry.etag
+            entry.last_modified = _header(response, 'Last-Modified') or entry.last_modified
+            if not storable and key in self._entries:
+                self._remove(key)
+        return entry.body
+
+    def invalidate(self, path_prefix):
+        """
+        Drop every cached response for a URL path starting with the given prefix
+        :param path_prefix: URL path prefix including /API, e.g. /API/item/VX-1234
+        :return: None
+        """
+        with self._lock:
+            for key in [k for k in self._entries if _path_of(k[-2]) == path_prefix or _path_of(k[-2]).startswith(path_prefix + "/")]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        Drop everything in the cache
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """
+        Returns a dictionary of counters for this cache
+        :return: dictionary with size, bytes, hits, revalidated, misses, evictions and invalidations counts
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'bytes': self._size,
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def _path_of(url):
+    return url.split('?', 1)[0].split(';', 1)[0]
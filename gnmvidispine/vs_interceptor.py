@@ -0,0 +1,157 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VSRequest(object):
+    """
+    Describes a request that is about to be sent to Vidispine, as passed to interceptors.  Interceptors can change
+    the method, url, body and headers before it is sent, and keep their own state for the request in context.
+    """
+    def __init__(self, api, method, url, body, headers, rawData=False):
+        self.api = api
+        self.method = method
+        self.url = url
+        self.body = body
+        self.headers = headers
+        self.rawData = rawData
+        self.context = {}
+
+    def __repr__(self):
+        return "VSRequest({0} {1})".format(self.method, self.url)
+
+
+class VSResponse(object):
+    """
+    A response that did not come from the server, for interceptors to return from before_send or on_error, e.g. a
+    cached document or an injected fault.  It can be read in the same way as an http.client response.
+    """
+    def __init__(self, status, body=b"", reason="", headers=None):
+        self.status = status
+        self.reason = reason
+        self.body = body
+        self.headers = dict((k.lower(), v) for k, v in headers.items()) if headers is not None else {}
+        self._position = 0
+
+    def __repr__(self):
+        return "VSResponse({0} {1})".format(self.status, self.reason)
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self, amt=None):
+        if amt is None:
+            data = self.body[self._position:]
+        else:
+            data = self.body[self._position:self._position+amt]
+        self._position += len(data)
+        return data
+
+
+class VSInterceptor(object):
+    """
+    Base class for request interceptors. Subclass this and override whichever hooks you need, then add an instance to
+    VSApi.interceptors (for every object) or to a single object with add_interceptor().
+
+    Interceptors wrap sendAuthorized like layers of an onion: before_send is called on each in order, then the request
+    is sent, then after_response is called on each in reverse order.  Retries of 503 errors by request() go through
+    the chain again; 504s and connection errors retried inside sendAuthorized do not.
+
+    class SignRequests(VSInterceptor):
+        def before_send(self, request):
+            request.headers['X-Signature'] = sign(request.method, request.url)
+
+    VSApi.interceptors = (SignRequests(), )
+    """
+    def before_send(self, request):
+        """
+        Called before a request is sent
+        :param request: VSRequest, which can be changed
+        :return: None to carry on and send the request, or a response object to use instead of sending it. In that
+        case later interceptors are skipped.
+        """
+        return None
+
+    def after_response(self, request, response):
+        """
+        Called once a response has been received. The body has not been read yet.
+        :param request: VSRequest that was sent
+        :param response: response object
+        :return: the response to pass on, normally the one given
+        """
+        return response
+
+    def on_error(self, request, error):
+        """
+        Called if sending the request raised an exception, or a later interceptor did in before_send
+        :param request: VSRequest that was being sent
+        :param error: the exception
+        :return: None to let the exception propagate, or a response object to use instead
+        """
+        return None
+
+
+def _handle_error(interceptors, request, error):
+    """
+    Internal function, offers an exception to each interceptor in reverse order
+    :return: tuple of (number of interceptors outside the one that handled it, response). Re-raises the exception if
+    none of them did.
+    """
+    for n in range(len(interceptors)-1, -1, -1):
+        response = interceptors[n].on_error(request, error)
+        if response is not None:
+            logger.debug("{0} handled {1} for {2}".format(interceptors[n], error.__class__.__name__, request))
+            return n, response
+    raise error
+
+
+def intercept(interceptors, request, send):
+    """
+    Runs a request through a chain of interceptors
+    :param interceptors: sequence of VSInterceptor
+    :param request: VSRequest
+    :param send: function taking the VSRequest, which actually sends it and returns the response
+    :return: response object
+    """
+    ran = 0
+    response = None
+    try:
+        for interceptor in interceptors:
+            ran += 1
+            response = interceptor.before_send(request)
+            if response is not None:
+                break
+        if response is None:
+            response = send(request)
+    except Exception as e:
+        ran, response = _handle_error(interceptors[0:ran], request, e)
+
+    for n in range(ran-1, -1, -1):
+        response = interceptors[n].after_response(request, response)
+    return response
+
+
+async def intercept_async(interceptors, request, send):
+    """
+    Runs a request through a chain of interceptors, for asyncio. The hooks themselves are called synchronously.
+    :param interceptors: sequence of VSInterceptor
+    :param request: VSRequest
+    :param send: coroutine function taking the VSRequest, which actually sends it and returns the response
+    :return: response object
+    """
+    ran = 0
+    response = None
+    try:
+        for interceptor in interceptors:
+            ran += 1
+            response = interceptor.before_send(request)
+            if response is not None:
+                break
+        if response is None:
+            response = await send(request)
+    except Exception as e:
+        ran, response = _handle_error(interceptors[0:ran], request, e)
+
+    for n in range(ran-1, -1, -1):
+        response = interceptors[n].after_response(request, response)
+    return response
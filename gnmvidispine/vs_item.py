@@ -1,5 +1,5 @@
 from __future__ import print_function
-import xml.etree.cElementTree as ET
+import xml.etree.ElementTree as ET
 from .vidispine_api import InvalidData, VSBadRequest
 from .vs_job import VSJob, VSJobFailed
 from .vs_shape import VSShape
@@ -13,8 +13,22 @@ import re
 
 from .vidispine_api import HTTPError, VSApi, VSException, VSNotFound, always_string
 from .vs_storage_rule import VSStorageRule
+from .vs_cache import VSMetadataCache, cache_key
+from .vs_field_profiler import VSFieldProfiler
+from .vs_transfer_journal import VSTransferJournal
+from . import vs_json
+from . import vs_xml
+from .vs_metadata_parser import MetadataParser
 import io
 
+_item_node = vs_xml.Path('{0}item')
+_item_timespans = vs_xml.Path('{0}item/{0}metadata/{0}timespan')
+_itemdocument_timespans = vs_xml.Path('{0}metadata/{0}timespan')
+_timespans = vs_xml.Path('{0}timespan')
+_field_nodes = vs_xml.Path('{0}field')
+_name_node = vs_xml.Path('{0}name')
+_value_nodes = vs_xml.Path('{0}value')
+
 
 class VSTranscodeError(VSException):
     def __init__(self, failedJob):
@@ -61,15 +75,136 @@ class VSItem(VSApi):
     rule = i.storageRule('shape_tag') #convenience method to get the storage rule for a specific shape
 
     builder = i.get_metadata_builder() #Return a VSMetadataBuilder object to help construct complex metadata sets
+
+    #cache populate() results and shape lists for all items in this process, see VSMetadataCache
+    VSItem.metadata_cache = VSMetadataCache(maxsize=5000, ttl=30)
+    #or share one cache between every process on the host, see VSSqliteCache
+    VSItem.metadata_cache = VSSqliteCache("/var/cache/gnmvidispine/metadata.db", ttl=300)
+
+    #request metadata as JSON, which is much cheaper to parse. get() and contentDict work in exactly the same way.
+    i = VSItem(host,port,user,password,use_json=True)
+
+    #populate items only when their metadata is first needed, e.g. items from search results, parent_collections() or
+    #VSFile.memberOfItem.  get() fetches just the fields asked for so far; contentDict fetches everything.
+    VSItem.lazy_populate = True
+    i = VSItem(host,port,user,password)
+    i.name = "VX-1234"
+    i.get("title")      #requests /item/VX-1234/metadata;field=title
+    i.get("gnm_type")   #requests /item/VX-1234/metadata;field=gnm_type,title
+
+    #learn which fields each piece of code reads, and only request those. See VSFieldProfiler
+    VSItem.field_profiler = VSFieldProfiler(warmup=3)
+    i.populate("VX-1234", workload="thumbnailer")
     """
+    metadata_cache = None
+    lazy_populate = False
+    _contentDict = None
+    #fields loaded by populate(), or None if the whole document has been loaded. See _lazy_load()
+    _loadedFields = None
+    field_profiler = None
+    #(workload, fields requested) if populate() used field_profiler. See _profile_field()
+    _fieldProfile = None
+    #index of field name -> field nodes in dataContent, built when first needed. See _field_index()
+    _fieldIndex = None
+    _fieldIndexSource = None
+
     def __init__(self, *args, **kwargs):
         super(VSItem, self).__init__(*args, **kwargs)
         self.dataContent = None
         self.name = "INVALIDNAME"
         self.type="item"
         self.contentDict = {}
+        self._loadedFields = set()
         self._shapeListContent = None
 
+    @property
+    def contentDict(self):
+        """
+        Dictionary of field name -> value, or list of values, for the metadata of this item.  If lazy_populate is set,
+        the whole metadata document is loaded from Vidispine the first time this is needed.
+        """
+        if self._fieldProfile is not None:
+            self._profile_field(None)
+        if self.lazy_populate:
+            self._lazy_load(None)
+        return self._contentDict
+
+    @contentDict.setter
+    def contentDict(self, value):
+        self._contentDict = value
+
+    def _lazy_load(self, fieldnames):
+        """
+        Internal method, populates an item with lazy_populate set when its metadata is needed.  Only the fields asked for
+        so far are requested, so asking for a new field fetches it along with the ones that are already loaded; fields
+        that the item does not have are not asked for again.
+        :param fieldnames: list or tuple of the fields that are needed, or None if all of them are
+        :return: None
+        """
+        loaded = self._loadedFields
+        if loaded is None or self.name is None or self.name == "INVALIDNAME":
+            return
+        if fieldnames is None:
+            fields = None
+        else:
+            missing = [f for f in fieldnames if f not in loaded]
+            if len(missing) == 0 and self._has_content():
+                return
+            fields = sorted(loaded.union(missing))
+            if len(fields) == 0:
+                fields = None
+        self._contentDict = {}
+        self._load_metadata(self.name, self.type, fields)
+
+    def _profile_field(self, fieldname):
+        """
+        Internal method, tells field_profiler that a field has been read from an item that populate() profiled.  If the
+        item was not populated with that field, the whole document is fetched.
+        :param fieldname: field that was read, or None if the whole of contentDict was
+        :return: None
+        """
+        workload, fields = self._fieldProfile
+        if fieldname is None:
+            self.field_profiler.record_all(workload)
+        else:
+            self.field_profiler.record(workload, fieldname)
+        if fields is not None and (fieldname is None or fieldname not in fields):
+            if fieldname is not None:
+                self.field_profiler.miss(workload, fieldname)
+            self._load_unprojected()
+
+    def _load_unprojected(self):
+        """
+        Internal method, fetches the whole metadata document for an item that populate() only asked for some fields of
+        because of field_profiler
+        """
+        workload, fields = self._fieldProfile
+        self._contentDict = {}
+        self._load_metadata(self.name, self.type, None)
+        self._fieldProfile = (workload, None)
+
+    def _content(self):
+        """
+        Internal method, returns contentDict for code in this package that needs all of the item's metadata.  The
+        whole document is loaded if it has not been, but unlike reading contentDict this does not tell field_profiler
+        that the caller's workload needs every field.
+        :return: dictionary
+        """
+        if self._fieldProfile is not None and self._fieldProfile[1] is not None:
+            self._load_unprojected()
+        if self.lazy_populate:
+            self._lazy_load(None)
+        return self._contentDict
+
+    def _set_loaded_fields(self, specificFields):
+        """
+        Internal method, records which fields populate() loaded
+        """
+        if isinstance(specificFields,list) or isinstance(specificFields,tuple):
+            self._loadedFields = set(specificFields)
+        else:
+            self._loadedFields = None
+
     def path(self):
         """
         Returns the base URL path to the item in Vidispine, e.g. /item/{id}
@@ -83,8 +218,20 @@ class VSItem(VSApi):
         :return:
         """
         self.contentDict = {}
+        self._reset_field_index()
+        self._invalidate_cache()
         self.populate(self.name)
 
+    def _invalidate_cache(self, type=None):
+        """
+        Internal method, drops anything held in metadata_cache for this item. Called whenever we change the item.
+        :param type: entity type to invalidate, if not self.type
+        :return: None
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(type if type is not None else self.type, self.name)
+            self.metadata_cache.invalidate("shapes", self.name)
+
     def createPlaceholder(self,metadata=None,group=None):
         """
         Creates a new placeholder item and associates it with this object.  Can raise InvalidData if the content is not
@@ -129,18 +276,26 @@ class VSItem(VSApi):
         Returns a reconstructed XML document for the metadata of this item.
         :return: XML string
         """
-        return ET.tostring(self.dataContent,encoding)
+        return vs_xml.tostring(self.dataContent,encoding)
 
-    def fromXML(self, xmldata=None, objectClass="item"):
+    def fromXML(self, xmldata=None, objectClass="item", keepTree=False):
         """
         populate this item from the given XML document rather than directly from Vidispine.
         raises InvalidSourceError if the XML does not contain what we need.
-        :param xmlstring: XML to parse
+        An XML string is read in a single pass straight into contentDict, and only parsed into a tree (dataContent) if
+        something asks for it later.
+        :param xmlstring: XML to parse, as a string or bytes, or an already parsed element tree
         :param objectClass: is this an item or collection
+        :param keepTree: set this to True to parse an XML string into dataContent straight away
         :return: self
         """
-        if isinstance(xmldata,str):
-            self.dataContent = ET.fromstring(xmldata)
+        self._reset_field_index()
+        self._loadedFields = None
+        self._fieldProfile = None
+        if isinstance(xmldata,(str,bytes)):
+            if not keepTree:
+                return self._fromXMLString(xmldata, objectClass)
+            self.dataContent = vs_xml.fromstring(xmldata)
         else:
             self.dataContent = xmldata
 
@@ -148,7 +303,7 @@ class VSItem(VSApi):
 
         namespace = "{http://xml.vidispine.com/schema/vidispine}"
         if self.type == "item":
-            node = self.dataContent.find('{0}item'.format(namespace))
+            node = _item_node.find(self.dataContent)
             if node is None:
                 if self.dataContent.tag == '{0}ItemDocument'.format(namespace):
                     self.name = self.dataContent.attrib['id']
@@ -159,14 +314,14 @@ class VSItem(VSApi):
                 self.name = node.attrib['id']
 
         if self.type == "item":
-            for x in self.dataContent.findall('{0}item/{0}metadata/{0}timespan'.format(namespace)):
+            for x in _item_timespans.findall(self.dataContent):
                 self.makeContentDict(x)
         elif self.type == "itemdocument":
             self.type = "item"
-            for x in self.dataContent.findall('{0}metadata/{0}timespan'.format(namespace)):
+            for x in _itemdocument_timespans.findall(self.dataContent):
                 self.makeContentDict(x)
         elif self.type == "collection":
-            for x in self.dataContent.findall('{0}timespan'.format(namespace)):
+            for x in _timespans.findall(self.dataContent):
                 self.makeContentDict(x)
             try:
                 self.name = self.contentDict['collectionId']
@@ -176,7 +331,80 @@ class VSItem(VSApi):
             raise TypeError("item populate() called on something not identifying an item or collection")
         return self
 
-    def populate(self, entity_id=None, type="item", specificFields=None):
+    def _fromXMLString(self, xmldata, objectClass):
+        """
+        Internal method, the single-pass version of fromXML() that does not build a tree
+        """
+        if objectClass not in ("item", "collection"):
+            raise TypeError("item populate() called on something not identifying an item or collection")
+        parser = MetadataParser(objectClass, self._add_content_value).parse(xmldata)
+        self._set_raw_xml(xmldata)
+        self.type = objectClass
+        if objectClass == "item":
+            if parser.name is None:
+                raise InvalidSourceError("VSItem::fromXML - declared as item but source document does not have an <item> or <ItemDocument> node")
+            self.name = parser.name
+        else:
+            self.name = self.contentDict.get('collectionId', "INVALIDNAME")
+        return self
+
+    def fromJSON(self, document, objectClass="item"):
+        """
+        populate this item from a decoded JSON metadata document rather than XML.  contentDict is built straight from the
+        JSON; dataContent is only built if something asks for it.
+        raises InvalidSourceError if the document does not contain what we need.
+        :param document: decoded JSON document, or a string to decode
+        :param objectClass: is this an item or collection
+        :return: self
+        """
+        if not isinstance(document, dict):
+            document = vs_json.decode(document)
+        self._reset_field_index()
+        self._loadedFields = None
+        self._fieldProfile = None
+
+        self.type=objectClass
+        if self.type == "item":
+            items = vs_json.as_list(document.get('item'))
+            if len(items) > 0:
+                self._set_json_content(document, "MetadataListDocument")
+                self.name = items[0]['id']
+                metadata = items[0].get('metadata', {})
+            elif 'id' in document and 'metadata' in document:
+                self._set_json_content(document, "ItemDocument")
+                self.name = document['id']
+                metadata = document['metadata']
+            else:
+                raise InvalidSourceError("VSItem::fromJSON - declared as item but source document does not have an item")
+            for timespan in vs_json.as_list(metadata.get('timespan')):
+                self._content_dict_from_json(timespan)
+        elif self.type == "collection":
+            self._set_json_content(document, "MetadataDocument")
+            for timespan in vs_json.as_list(document.get('timespan')):
+                self._content_dict_from_json(timespan)
+            try:
+                self.name = self.contentDict['collectionId']
+            except KeyError:
+                self.name = "INVALIDNAME"
+        else:
+            raise TypeError("item populate() called on something not identifying an item or collection")
+        return self
+
+    def _content_dict_from_json(self, node):
+        """
+        Internal method, JSON counterpart to makeContentDict
+        :param node: decoded JSON timespan or group
+        :return: None
+        """
+        for field in vs_json.as_list(node.get('field')):
+            key = field.get('name', "")
+            for value in vs_json.as_list(field.get('value')):
+                self._add_content_value(key, vs_json.text_of(value))
+        for group in vs_json.as_list(node.get('group')):
+            if isinstance(group, dict):
+                self._content_dict_from_json(group)
+
+    def populate(self, entity_id=None, type="item", specificFields=None, workload=None):
         """
         Loads metadata about the item from Vidispine.
         :param id: VS ID (or external ID) of the item to load. You only need to specify this if you're loading an item from a specific ID;
@@ -185,18 +413,79 @@ class VSItem(VSApi):
         :param type: either "item" (default) or "collection"
         :param specificFields: list or tuple of specific field names to load. If this is None (default), then load everything.
         Only loading the fields you need can significantly speed up your program
+        :param workload: if field_profiler is set and specificFields is not, the name to learn the fields for this
+        populate under. Defaults to the line of code that called populate().
+        :return: self
+        """
+        profile = None
+        if self.field_profiler is not None and specificFields is None:
+            if workload is None:
+                workload = self.field_profiler.call_site()
+            specificFields = self.field_profiler.fields_for(workload)
+            profile = (workload, specificFields)
+        self._load_metadata(entity_id, type, specificFields)
+        self._fieldProfile = profile
+        return self
+
+    def _load_metadata(self, entity_id, type, specificFields):
+        """
+        Internal method, fetches the metadata document (or the given fields of it) for populate() and loads it
+        :return: None
+        """
+        path = self._populate_path(entity_id, type, specificFields)
+        if self.use_json:
+            fetch = self.request_json
+        else:
+            #we parse the document ourselves in fromXML(), see MetadataParser
+            fetch = lambda path, method: self.request(path, method=method, parse=False)
+        cache = self.metadata_cache
+        if cache is None:
+            content = fetch(path, method="GET")
+        else:
+            key = cache_key(type, entity_id if entity_id is not None else self.name, specificFields)
+            content = cache.get(key)
+            if content is None:
+                content = fetch(path, method="GET")
+                cache.put(key, content)
+
+        #the cache may hold either format, whichever was requested first
+        if isinstance(content, dict):
+            self.fromJSON(content,objectClass=type)
+        else:
+            self.fromXML(content,objectClass=type)
+        self._set_loaded_fields(specificFields)
+
+    async def populate_async(self, client, entity_id=None, type="item", specificFields=None):
+        """
+        asyncio version of populate(). Loads metadata about the item from Vidispine.
+        :param client: AsyncVSApi object to make the request with
+        :param entity_id: VS ID of the item to load, or None to use the ID in item.name. See populate().
+        :param type: either "item" (default) or "collection"
+        :param specificFields: list or tuple of specific field names to load. If this is None (default), then load everything.
         :return: self
         """
+        path = self._populate_path(entity_id, type, specificFields)
+        if self.use_json:
+            content = await client.request(path, method="GET", accept='application/json')
+            self.fromJSON(vs_json.decode(content),objectClass=type)
+        else:
+            content = await client.request(path, method="GET")
+            self.fromXML(content,objectClass=type)
+        self._set_loaded_fields(specificFields)
+        return self
+
+    def _populate_path(self, entity_id, type, specificFields):
+        """
+        Internal method, returns the path to request for populate()
+        """
         if entity_id is None:
             entity_id = self.name
 
         if isinstance(specificFields,list) or isinstance(specificFields,tuple):
             fields=",".join(specificFields)
-            content = self.request("/{t}/{i}/metadata;field={f}".format(t=type,i=entity_id,f=fields, method="GET"))
+            return "/{t}/{i}/metadata;field={f}".format(t=type,i=entity_id,f=fields)
         else:
-            content = self.request("/%s/%s/metadata" % (type, entity_id), method="GET")
-
-        return self.fromXML(content,objectClass=type)
+            return "/%s/%s/metadata" % (type, entity_id)
 
     def importSidecar(self, filepath):
         """
@@ -216,6 +505,8 @@ class VSItem(VSApi):
         Return the name of the master group associated with the item, if any
         :return: string
         """
+        if self.lazy_populate:
+            self._lazy_load(())
         try:
             group_node = self.dataContent.find('{0}item/{0}metadata/{0}group'.format(self.xmlns))
             if group_node is not None:
@@ -231,49 +522,67 @@ class VSItem(VSApi):
         :param ns:
         :return:
         """
-
-        if parent_key is not None:
-            logging.debug("makeContentDict: parent key {0}".format(parent_key))
-        logging.debug("makeContentDict: on {0}".format(node.tag))
+        #formatting the debug messages costs more than the rest of this loop, so don't unless they will be logged
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        if debug:
+            if parent_key is not None:
+                logging.debug("makeContentDict: parent key {0}".format(parent_key))
+            logging.debug("makeContentDict: on {0}".format(node.tag))
+        if ns == vs_xml.xmlns:
+            name_node = _name_node
+            value_nodes = _value_nodes
+        else:
+            name_node = vs_xml.Path('{0}name', ns)
+            value_nodes = vs_xml.Path('{0}value', ns)
         for child in node:
             # print "%s" % child.tag
 
             if child.tag.endswith("field"):
                 try:
-                    key = child.find('{0}name'.format(ns)).text
+                    key = name_node.find(child).text
                 except AttributeError:
                     key = ""
-                try:
-                    logging.debug("key is {0}".format(key))
-                except UnicodeEncodeError:
-                    logging.debug(u"key is {0}".format(key))
-                for valNode in child.findall('{0}value'.format(ns)):
+                if debug:
+                    try:
+                        logging.debug("key is {0}".format(key))
+                    except UnicodeEncodeError:
+                        logging.debug(u"key is {0}".format(key))
+                for valNode in value_nodes.findall(child):
                     try:
                         val = valNode.text
                     except AttributeError:
                         val = ""
-                    try:
-                        logging.debug("got {0} for {1}".format(val, key))
-                    except UnicodeEncodeError:
-                        logging.debug(u"got {0} for {1}".format(val, key))
-                    if key in self.contentDict:
-                        #raise Exception("contentDict already has a value %s for %s, trying to insert new value %s\n" % (self.contentDict[key],key,val))
-                        if isinstance(self.contentDict[key],list):
-                            self.contentDict[key].append(val)
-                        else:
-                            self.contentDict[key] = [ self.contentDict[key], val ]
-
-                        #self.contentDict[key] = "%s|%s" % (self.contentDict[key], val)
-                    else:
-                        self.contentDict[key] = val
-                        #print "debug: item::makeContentDict: key=%s val=%s\n" % (key,val)
+                    if debug:
+                        try:
+                            logging.debug("got {0} for {1}".format(val, key))
+                        except UnicodeEncodeError:
+                            logging.debug(u"got {0} for {1}".format(val, key))
+                    self._add_content_value(key, val)
             elif child.tag.endswith("group"):
-                key = child.find('{0}name'.format(ns)).text
-                logging.debug("makeContentDict: recursing into {0}".format(key))
+                key = name_node.find(child).text
+                if debug:
+                    logging.debug("makeContentDict: recursing into {0}".format(key))
                 #print "group: %s" % key
                 self.makeContentDict(child, parent_key=key)
         return
 
+    def _add_content_value(self, key, val):
+        """
+        Internal method, adds a value to contentDict. A field with more than one value becomes a list.
+        """
+        content = self._contentDict
+        if key in content:
+            #raise Exception("contentDict already has a value %s for %s, trying to insert new value %s\n" % (content[key],key,val))
+            if isinstance(content[key],list):
+                content[key].append(val)
+            else:
+                content[key] = [ content[key], val ]
+
+            #content[key] = "%s|%s" % (content[key], val)
+        else:
+            content[key] = val
+            #print "debug: item::makeContentDict: key=%s val=%s\n" % (key,val)
+
     def dump_text(self, *fields):
         """
         Debugging method to output text information about the item to stdout
@@ -295,7 +604,7 @@ class VSItem(VSApi):
             try:
                 for n in range(0,level):
                     print("\t", end=' ')
-                print("%s: %s" % (f, self.contentDict[f]))
+                print("%s: %s" % (f, self._content()[f]))
             except:
                 pass
 
@@ -304,7 +613,7 @@ class VSItem(VSApi):
         Returns an XML of the item's MetadataDocument as a string
         :return: string of xml
         """
-        print(ET.tostring(self.dataContent))
+        print(vs_xml.tostring(self.dataContent))
 
     def delete(self, keepShapeTagMedia=None, keepShapeTagStorage=None):
         """
@@ -339,42 +648,54 @@ class VSItem(VSApi):
         if self.type!='collection' and self.type!='item':
             raise ValueError("A VSItem must either be of type collection or of type item. Not deleting.")
 
-        response = self.request("/%s/%s" % (self.type,self.name), method="DELETE", query=qp)
+        try:
+            response = self.request("/%s/%s" % (self.type,self.name), method="DELETE", query=qp)
+        finally:
+            self._invalidate_cache()
 
     def get(self, fieldname, allowArray=False):
         """
         Get the value of a metadata field
         :param fieldname: field name to look up
         :param allowArray: if there are multiple values, then set allowArray=True to return a list. Otherwise, a string
-        will be returned with the values delimited by a |
+        will be returned with the values delimited by a |.
+        If lazy_populate is set, the field is loaded from Vidispine if it has not been already.
         :return: list or string
         """
-        if fieldname in self.contentDict:
-            if isinstance(self.contentDict[fieldname],list):
+        if self._fieldProfile is not None:
+            self._profile_field(fieldname)
+        if self.lazy_populate:
+            self._lazy_load((fieldname,))
+        content = self._contentDict
+        if fieldname in content:
+            if isinstance(content[fieldname],list):
                 if allowArray==True:
-                    return self.contentDict[fieldname]
-                elif self.contentDict[fieldname] is not None:
+                    return content[fieldname]
+                elif content[fieldname] is not None:
                     try:
-                        return '|'.join(self.contentDict[fieldname]) #default, old behaviour
+                        return '|'.join(content[fieldname]) #default, old behaviour
                     except TypeError:
                         #if join fails cos of bad data, then do it the crap way but catching excaptions as we go
                         str=""
-                        for x in self.contentDict[fieldname]:
+                        for x in content[fieldname]:
                             try:
                                 str += str(x) + '|'
                             except Exception:
                                 pass
                         return str[0:-2]
-            return self.contentDict[fieldname]
+            return content[fieldname]
 
         return None
 
     def _get_timespans(self):
         if self.type == "item":
-            for ts in self.dataContent.findall('{0}item/{0}metadata/{0}timespan'.format(self.xmlns)):
+            if self.dataContent.tag == '{0}ItemDocument'.format(self.xmlns):
+                for ts in _itemdocument_timespans.findall(self.dataContent):
+                    yield ts
+            for ts in _item_timespans.findall(self.dataContent):
                 yield ts
         elif self.type == "collection":
-            for ts in self.dataContent.findall('{0}timespan'.format(self.xmlns)):
+            for ts in _timespans.findall(self.dataContent):
                 yield ts
         else:
             raise ValueError("looking for field node on something not an item or collection?")
@@ -382,14 +703,57 @@ class VSItem(VSApi):
     def _find_field_nodes(self, timespan, fieldname):
         def get_field_name(fieldnode):
             try:
-                namenode = fieldnode.find('{0}name'.format(self.xmlns))
+                namenode = _name_node.find(fieldnode)
                 if namenode is not None:
                     return namenode.text
                 else:
                     return None
             except AttributeError:
                 return None
-        return [fieldnode for fieldnode in timespan.findall('{0}field'.format(self.xmlns)) if get_field_name(fieldnode)==fieldname]
+        return [fieldnode for fieldnode in _field_nodes.findall(timespan) if get_field_name(fieldnode)==fieldname]
+
+    def _reset_field_index(self):
+        """
+        Internal method, forgets the field index so that it is rebuilt from dataContent when next needed
+        """
+        self._fieldIndex = None
+        self._fieldIndexSource = None
+
+    def _field_index(self):
+        """
+        Internal method, returns a dictionary of field name -> list of field nodes, in document order, for every field in
+        every timespan including those inside groups, i.e. the fields that contentDict was built from.  It is built
+        the first time it is needed, and again if dataContent is replaced.
+        """
+        data = self.dataContent
+        if self._fieldIndex is None or self._fieldIndexSource is not data:
+            index = {}
+            if data is not None:
+                for ts in self._get_timespans():
+                    self._index_fields(ts, index)
+            self._fieldIndex = index
+            self._fieldIndexSource = data
+        return self._fieldIndex
+
+    def _index_fields(self, node, index):
+        """
+        Internal method, adds the fields under node to index, recursing into groups in the same way as makeContentDict
+        """
+        for child in node:
+            if child.tag.endswith("field"):
+                namenode = _name_node.find(child)
+                key = namenode.text if namenode is not None else ""
+                index.setdefault(key, []).append(child)
+            elif child.tag.endswith("group"):
+                self._index_fields(child, index)
+
+    def get_field_nodes(self, fieldname):
+        """
+        Returns the <field> nodes for the given field name, from every timespan and group
+        :param fieldname: field name to look for
+        :return: list of XML nodes, empty if there are none
+        """
+        return list(self._field_index().get(fieldname, []))
 
     def get_metadata_attributes(self, fieldname):
         """
@@ -407,13 +771,14 @@ class VSItem(VSApi):
         """
         Generator to get the full attributes of the metadata
         :param fieldname: field name to look for
-        :return: yields a VSMetadataAttribute object for each occurrence of the field fieldname in each timespan
+        :return: yields a VSMetadataAttribute object for each occurrence of the field fieldname in each timespan,
+        including inside groups
         """
         from .vs_metadata import VSMetadataValue, VSMetadataAttribute
 
-        for ts in self._get_timespans():
-            for fieldnode in self._find_field_nodes(ts, fieldname):
-                yield VSMetadataAttribute(fieldnode)
+        #new objects each time, as callers are free to modify the ones they get
+        for fieldnode in self._field_index().get(fieldname, []):
+            yield VSMetadataAttribute(fieldnode)
 
     def copyToPlaceholder(self,host='localhost',port=8080,user='admin',passwd=None):
         """
@@ -444,7 +809,7 @@ class VSItem(VSApi):
         tsNode = ET.SubElement(root,"timespan",{'start': '-INF', 'end': '+INF'})
 
         ignored_field = re.compile(r'^_')
-        for fieldname,value in list(self.contentDict.items()):
+        for fieldname,value in list(self._content().items()):
             if ignored_field.match(fieldname): continue
             if fieldname == "itemId" or fieldname == "collectionId": continue
             #logging.debug('took field {0}'.format(fieldname))
@@ -536,7 +901,10 @@ class VSItem(VSApi):
         else:
             metadoc = self._make_metadata_document(md,group)
 
-        return self.request(path, method="PUT", body=metadoc)
+        try:
+            return self.request(path, method="PUT", body=metadoc)
+        finally:
+            self._invalidate_cache("item" if entitytype == "item" else None)
 
     def add_mdgroup(self,groupname,meta,mode="add",root_group=None):
         """
@@ -562,6 +930,7 @@ class VSItem(VSApi):
             fieldname.text = key
             fieldvalue = ET.SubElement(fieldnode,"value")
             fieldvalue.text = value
+        self._invalidate_cache()
 
     def get_shape(self, shapetag):
         """
@@ -570,10 +939,9 @@ class VSItem(VSApi):
         :return: populated VSShape object
         """
         ns = "{http://xml.vidispine.com/schema/vidispine}"
-        path = "/item/%s/shape" % self.name
 
         if self._shapeListContent is None:
-            self._shapeListContent = self.request(path)
+            self._shapeListContent = self._shape_list()
 
         #print ET.tostring(shapeListContent)
 
@@ -591,16 +959,31 @@ class VSItem(VSApi):
 
         raise VSNotFound("No shape matching %s could be found" % shapetag)
 
+    def _shape_list(self):
+        """
+        Internal method, fetches the list of shape URIs for the item, through metadata_cache if there is one
+        :return: parsed XML document
+        """
+        path = "/item/%s/shape" % self.name
+        cache = self.metadata_cache
+        if cache is None:
+            return self.request(path)
+
+        key = cache_key("shapes", self.name)
+        content = cache.get(key)
+        if content is None:
+            content = self.request(path)
+            cache.put(key, content)
+        return content
+
     def shapes(self):
         """
         Generator to iterate over all shapes attached to item.
 
         :return: Yields VSShape objects
         """
-        path = "/item/%s/shape" % self.name
-
         if self._shapeListContent is None:
-            self._shapeListContent = self.request(path)
+            self._shapeListContent = self._shape_list()
 
         for node in self._shapeListContent.findall('{0}uri'.format(self.xmlns)):
             if self.debug:
@@ -696,8 +1079,9 @@ class VSItem(VSApi):
 
         path = "/item/%s/export" % self.name
 
-        if use_media_filename is True and 'originalFilename' in self.contentDict:
-            (outputFileName, originalExtension) = os.path.splitext(self.contentDict['originalFilename'])
+        originalFilename = self.get('originalFilename') if use_media_filename is True else None
+        if originalFilename is not None:
+            (outputFileName, originalExtension) = os.path.splitext(originalFilename)
             output_path = os.path.join(os.path.dirname(output_path), outputFileName)
 
         output_path = output_path.replace(' ', '%20')
@@ -846,10 +1230,15 @@ class VSItem(VSApi):
         rtn.update(extra_args)
         return rtn
         
-    def streaming_import_to_shape(self, filename, transferPriority=500, throttle=True, rename=None, **kwargs):
+    def streaming_import_to_shape(self, filename, transferPriority=500, throttle=True, rename=None, chunk_size=1024*1024,
+                                  concurrency=1, journal_path=None, **kwargs):
         """
         Attempts a streaming import from an open local stream to Vidispine
         :param input_io: Open file object
+        :param chunk_size: size of each chunk to upload, in bytes. Defaults to 1MiB.
+        :param concurrency: number of chunks to upload at once. Defaults to 1.
+        :param journal_path: optional path of a local file to record the progress of the upload in. If an earlier
+        upload of the same file was interrupted, calling this again with the same journal_path resumes it.
         :param shape_tag: shape tag to assign to the file, Specify an array to assign multiple tags.
         :param priority: job priority
         :param essence: is this an essence version import? True or false
@@ -860,10 +1249,13 @@ class VSItem(VSApi):
         
         url = "/item/{0}/shape/raw"
         if rename is None: rename=os.path.basename(filename)
+        journal = VSTransferJournal(journal_path) if journal_path is not None else None
         
-        self.chunked_upload_request(io.FileIO(filename),os.path.getsize(filename),chunk_size=1024*1024,
-                                    path=url.format(self.name).format(self.name),filename=rename,
-                                    transferPriority=transferPriority,throttle=throttle,query=args,method="POST")
+        with io.FileIO(filename) as upload_io:
+            self.chunked_upload_request(upload_io,os.path.getsize(filename),chunk_size=chunk_size,
+                                        path=url.format(self.name).format(self.name),filename=rename,
+                                        transferPriority=transferPriority,throttle=throttle,query=args,method="POST",
+                                        concurrency=concurrency,journal=journal)
 
     def add_placeholder_shape(self, shape_tag='original'):
         """
@@ -932,7 +1324,7 @@ class VSItem(VSApi):
         Returns the number of colletions that this item belongs to, excluding ancestors
         :return: integer
         """
-        return int(self.contentDict['__collection_size'])
+        return int(self.get('__collection_size'))
 
     def parent_collections(self, shouldPopulate=False):
         """
@@ -961,7 +1353,7 @@ class VSItem(VSApi):
 
         dictionary_to_return = {}
         dictionary_to_return['data'] = deepcopy(self.dataContent)
-        dictionary_to_return['content'] = deepcopy(self.contentDict)
+        dictionary_to_return['content'] = deepcopy(self._content())
         dictionary_to_return['_vidispine_id'] = deepcopy(self.name)
 
         return dictionary_to_return
@@ -976,6 +1368,8 @@ class VSItem(VSApi):
         self.dataContent = deepcopy(input_dictionary['data'])
         self.contentDict = deepcopy(input_dictionary['content'])
         self.name = deepcopy(input_dictionary['_vidispine_id'])
+        self._loadedFields = None
+        self._fieldProfile = None
 
         return self
 
@@ -1,6 +1,8 @@
 __author__ = 'Andy Gallagher <andy.gallagher@theguardian.com>'
 
 from .vidispine_api import VSApi,VSException
+from . import vs_json
+from . import vs_xml
 import re
 import datetime
 import xml.etree.ElementTree as ET
@@ -8,6 +10,12 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+_job_values = [(key, vs_xml.Path("{0}" + key)) for key in ['jobId','user','status','type','priority']]
+_job_data = vs_xml.Path("{0}data")
+_data_key = vs_xml.Path("{0}key")
+_data_value = vs_xml.Path("{0}value")
+_job_started = vs_xml.Path("{0}started")
+
 
 class VSJobFailed(VSException):
     def __init__(self,failedJob,**kwargs):
@@ -65,26 +73,31 @@ def VSFindJobs(status=None,jobtype=None,connection=None,sort=None,metadata=False
     logger.debug("URL is {0}".format(urlstring))
     n = 0
     hits = 100
+    ns = "{http://xml.vidispine.com/schema/vidispine}"
+    hits_tag = '{0}hits'.format(ns)
     while n<hits:
         request = urlstring + ";first={0}".format(n)
-        response = connection.request(request, method="GET")
-        ns = "{http://xml.vidispine.com/schema/vidispine}"
-        hits = int(response.find('{0}hits'.format(ns)).text)
-        logger.debug("Got {0} hits".format(hits))
-
-        for jobnode in response.findall('{0}job'.format(ns)):
+        start_n = n
+        for jobnode in connection.stream_request(request, [hits_tag, '{0}job'.format(ns)], method="GET"):
+            if jobnode.tag == hits_tag:
+                hits = int(jobnode.text)
+                logger.debug("Got {0} hits".format(hits))
+                continue
             #pprint(jobnode.__dict__)
             idnode = jobnode.find('{0}jobId'.format(ns))
             if idnode is not None:
                 #pprint(idnode.__dict__)
                 #print "VSFindJobs: got job ID %s" % idnode.text
                 logger.debug("got job ID {0}".format(idnode.text))
-                jobinfo = VSJob(host=connection.host,port=connection.port,user=connection.user,passwd=connection.passwd)
+                jobinfo = VSJob(host=connection.host,port=connection.port,user=connection.user,passwd=connection.passwd,
+                                use_json=connection.use_json)
                 jobinfo.populate(idnode.text,metadata=metadata)
                 yield jobinfo
             else:
                 logger.error("Did not get a <jobId> node")
             n += 1
+        if n == start_n:    #no jobs returned => we got to the end
+            break
 
 
 class VSJob(VSApi):
@@ -103,9 +116,37 @@ class VSJob(VSApi):
 
         self._populateInternal()
 
+    def _load(self, path):
+        """
+        Internal method, fetches the job document as XML or JSON and fills in contentDict from it
+        """
+        if self.use_json:
+            self._set_json_content(self.request_json(path), "JobDocument")
+            self._populateInternalJson()
+        else:
+            self.dataContent = self.request(path)
+            self._populateInternal()
+
     def update(self,noraise=True):
-        self.dataContent = self.request("/job/%s" % self.name)
-        self._populateInternal()
+        self._load("/job/%s" % self.name)
+
+        if not noraise:
+            if self.didFail():
+                raise VSJobFailed(self)
+
+    async def update_async(self,client,noraise=True):
+        """
+        asyncio version of update(). Refreshes the job information from the server.
+        :param client: AsyncVSApi object to make the request with
+        :param noraise: if False, raise VSJobFailed if the job has failed
+        :return: None
+        """
+        if self.use_json:
+            self._set_json_content(vs_json.decode(await client.request("/job/%s" % self.name, accept='application/json')), "JobDocument")
+            self._populateInternalJson()
+        else:
+            self.dataContent = await client.request("/job/%s" % self.name)
+            self._populateInternal()
 
         if not noraise:
             if self.didFail():
@@ -128,52 +169,70 @@ class VSJob(VSApi):
     def populate(self,id,metadata=False):
         self.name = id
         if metadata:
-            self.dataContent = self.request("/job/%s?metadata=true" % id)
-
+            self._load("/job/%s?metadata=true" % id)
         else:
-            self.dataContent = self.request("/job/%s" % id)
-
-        self._populateInternal()
+            self._load("/job/%s" % id)
 
     def _populateInternal(self):
-        ns = "{http://xml.vidispine.com/schema/vidispine}"
         #ET.dump(self.dataContent)
 
-        for key in ['jobId','user','status','type','priority']:
-            nodename = "{0}%s" % key
+        for key, lookup in _job_values:
             try:
-                self.contentDict[key] = self.dataContent.find(nodename.format(ns)).text
+                self.contentDict[key] = lookup.find(self.dataContent).text
             except:
                 pass
 
-        for node in self.dataContent.findall("{0}data".format(ns)):
+        for node in _job_data.findall(self.dataContent):
             try:
-                key = node.find("{0}key".format(ns)).text
-                value = node.find("{0}value".format(ns)).text
-                if isinstance(value,datetime.datetime):
-                    self.contentDict[key] = value
-
-                try:
-                    self.contentDict[key] = int(value)
-                except:
-                    try:
-                        self.contentDict[key] = float(value)
-                    except:
-                        self.contentDict[key] = value
-
+                key = _data_key.find(node).text
+                value = _data_value.find(node).text
+                self._set_data_value(key, value)
             except:
                 pass
 
-        startTimeNode = self.dataContent.find("{0}started".format(ns))
+        startTimeNode = _job_started.find(self.dataContent)
         if startTimeNode is not None:
+            self._set_started(startTimeNode.text)
+
+    def _populateInternalJson(self):
+        """
+        Internal method, JSON counterpart to _populateInternal
+        """
+        document = self.jsonContent
+        for key in ['jobId','user','status','type','priority']:
+            if key in document:
+                self.contentDict[key] = vs_json.text_of(document[key])
+
+        for entry in vs_json.as_list(document.get('data')):
             try:
-                #remove microseconds from the time string. Ugly but it should work.
-                timeString=re.sub('\.\d+','',startTimeNode.text)
-                self.contentDict['started'] = datetime.datetime.strptime(timeString,"%Y-%m-%dT%H:%M:%SZ")
-            except ValueError as e: #if the date doesn't parse
-                logger.error("ERROR: %s" % e)
+                self._set_data_value(entry['key'], vs_json.text_of(entry.get('value')))
+            except (KeyError, TypeError):
                 pass
 
+        if document.get('started') is not None:
+            self._set_started(vs_json.text_of(document['started']))
+
+    def _set_data_value(self, key, value):
+        """
+        Internal method, stores a job data value in contentDict as a number if it looks like one
+        """
+        try:
+            self.contentDict[key] = int(value)
+        except:
+            try:
+                self.contentDict[key] = float(value)
+            except:
+                self.contentDict[key] = value
+
+    def _set_started(self, text):
+        try:
+            #remove microseconds from the time string. Ugly but it should work.
+            timeString=re.sub('\.\d+','',text)
+            self.contentDict['started'] = datetime.datetime.strptime(timeString,"%Y-%m-%dT%H:%M:%SZ")
+        except ValueError as e: #if the date doesn't parse
+            logger.error("ERROR: %s" % e)
+            pass
+
     @property
     def errorMessage(self):
         ns = "{http://xml.vidispine.com/schema/vidispine}"
@@ -274,26 +333,34 @@ class VSJob(VSApi):
 
 
 class XMLPropMixin(object):
+    """
+    Base class for the small objects read out of a job document.  The text of each of the properties named in _props is
+    copied out of the XML fragment when the object is created, into a slot, so the fragment is not kept.
+    """
+    __slots__ = ('_initialised',)
     ns = "{http://xml.vidispine.com/schema/vidispine}"
+    _props = ()
 
-    def __init__(self):
-        self.dataContent = None
+    def __init__(self, xml_frag=None):
+        self._initialised = xml_frag is not None
+        for propname in self._props:
+            node = xml_frag.find('{0}{1}'.format(self.ns, propname)) if xml_frag is not None else None
+            setattr(self, '_' + propname, node.text if node is not None else None)
 
     def _find_prop(self, propname):
 
-        if self.dataContent is None:
+        if not self._initialised:
             raise ValueError("Job object not initialised yet")
 
-        try:
-            return self.dataContent.find('{0}{1}'.format(self.ns, propname)).text
-        except AttributeError:
-            return None
+        return getattr(self, '_' + propname)
 
 
 class VSJobStep(XMLPropMixin):
+    __slots__ = ('_description', '_number', '_timestamp', '_status')
+    _props = ('description', 'number', 'timestamp', 'status')
+
     def __init__(self, xml_frag):
-        super(VSJobStep,self).__init__()
-        self.dataContent = xml_frag
+        super(VSJobStep,self).__init__(xml_frag)
 
     @property
     def description(self):
@@ -327,17 +394,25 @@ class VSJobStep(XMLPropMixin):
 
 
 class VSJobTask(XMLPropMixin):
+    __slots__ = ('_id', '_step', '_attempts', '_status', '_timestamp', '_description', '_sub_steps')
+    _props = ('step', 'attempts', 'status', 'timestamp', 'description')
+
     def __init__(self, xml_frag):
-        super(VSJobTask,self).__init__()
-        self.dataContent = xml_frag
+        super(VSJobTask,self).__init__(xml_frag)
+        if xml_frag is not None:
+            self._id = xml_frag.attrib.get('id')
+            self._sub_steps = [VSJobStep(node) for node in xml_frag.findall('{0}subStep'.format(self.ns))]
+        else:
+            self._id = None
+            self._sub_steps = []
 
     @property
     def task_id(self):
         try:
-            return int(self.dataContent.attrib['id'])
+            return int(self._id)
         except ValueError: #it's not an integer
             return None
-        except KeyError: #the key did not exist
+        except TypeError: #the key did not exist
             return None
 
     @property
@@ -373,8 +448,8 @@ class VSJobTask(XMLPropMixin):
 
     @property
     def sub_steps(self):
-        for node in self.dataContent.findall('{0}subStep'.format(self.ns)):
-            yield VSJobStep(node)
+        for step in self._sub_steps:
+            yield step
 
     def __unicode__(self):
         return "Task {id}: {desc} {status} attempt {att} at {time}".format(
@@ -0,0 +1,102 @@
+import json
+import xml.etree.ElementTree as ET
+
+xmlns = "{http://xml.vidispine.com/schema/vidispine}"
+
+#Vidispine's JSON puts XML attributes and child elements side by side as keys of the same object, so we need to know
+#which keys were attributes to turn a JSON document back into the equivalent XML
+_attributes = {
+    'item': ('id', 'start', 'end'),
+    'collection': ('id', 'start', 'end'),
+    'entry': ('id', 'type', 'start', 'end'),
+    'ItemDocument': ('id',),
+    'timespan': ('start', 'end'),
+    'field': ('uuid', 'user', 'timestamp', 'change'),
+    'group': ('uuid', 'user', 'timestamp', 'change'),
+    'value': ('uuid', 'user', 'timestamp', 'change', 'lang', 'mode'),
+    'count': ('fieldValue', 'start', 'end'),
+}
+
+#elements that have attributes and also text content, which Vidispine puts under a "value" key
+_text_elements = ('value', 'count')
+
+
+def decode(raw_body):
+    """
+    Decodes a JSON response body from Vidispine
+    :param raw_body: body as returned by VSApi.request(), bytes or string
+    :return: dictionary. An empty response gives an empty dictionary.
+    """
+    if raw_body == "Success" or len(raw_body) == 0:
+        return {}
+    if isinstance(raw_body, bytes):
+        raw_body = raw_body.decode('utf-8')
+    return json.loads(raw_body)
+
+
+def as_list(value):
+    """
+    Vidispine sends a list for elements that can repeat, but be tolerant of a single object or a missing key
+    :param value: value from a JSON document
+    :return: list
+    """
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def text_of(value):
+    """
+    Returns the value of a JSON node as the string that the XML element would have held, so that contentDict comes
+    out the same whichever format was requested
+    :param value: value from a JSON document
+    :return: string or None
+    """
+    if isinstance(value, list):
+        value = value[0] if len(value) > 0 else None
+    if isinstance(value, dict):
+        value = value.get('value')
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _append(parent, tag, value, ns):
+    if isinstance(value, list):
+        for entry in value:
+            _append(parent, tag, entry, ns)
+        return
+    elem = ET.SubElement(parent, ns + tag)
+    _fill(elem, tag, value, ns)
+
+
+def _fill(elem, tag, value, ns):
+    if not isinstance(value, dict):
+        elem.text = text_of(value)
+        return
+    attributes = _attributes.get(tag, ())
+    for k, v in value.items():
+        if k in attributes and not isinstance(v, (dict, list)):
+            elem.attrib[k] = text_of(v)
+        elif k == 'value' and tag in _text_elements and not isinstance(v, (dict, list)):
+            elem.text = text_of(v)
+        else:
+            _append(elem, k, v, ns)
+
+
+def json_to_element(document, root_tag, ns=xmlns):
+    """
+    Builds the ElementTree that the XML form of a Vidispine JSON document would have parsed to, for code that needs
+    dataContent when an object was populated from JSON
+    :param document: decoded JSON document
+    :param root_tag: tag of the root element, without the namespace, e.g. "MetadataListDocument"
+    :param ns: namespace to put the elements in
+    :return: ElementTree element
+    """
+    root = ET.Element(ns + root_tag)
+    _fill(root, root_tag, document, ns)
+    return root
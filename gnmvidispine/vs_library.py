@@ -2,6 +2,7 @@ import http.client
 import base64
 import string
 import xml.etree.ElementTree as ET
+from . import vs_xml
 from pprint import pprint
 import logging
 import traceback
@@ -96,7 +97,7 @@ class VSLibrary(VSApi, list):
         namespace = "{http://xml.vidispine.com/schema/vidispine}"
         if self.settings is None:
             response=self.request("/library/{0}/settings".format(self.name))
-            self.settings=ET.dump(response)
+            self.settings=vs_xml.tostring(response)
         return self.settings
 
     def storageRule(self):
@@ -1,5 +1,5 @@
 from .vidispine_api import VSApi
-import xml.etree.cElementTree as ET
+import xml.etree.ElementTree as ET
 import dateutil.parser
 
 
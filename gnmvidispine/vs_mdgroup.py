@@ -1,6 +1,7 @@
 from .vidispine_api import VSApi,VSException,VSNotFound
 from .vs_field import VSField
 import xml.etree.ElementTree as ET
+from . import vs_xml
 
 
 class VSMDGroup(VSApi):
@@ -145,7 +146,7 @@ class VSMDGroup(VSApi):
             #except Exception as e:
 
     def commitXML(self):
-        self.request("/metadata-field/field-group/%s" % self.name,method="PUT",body=ET.tostring(self.dataContent))
+        self.request("/metadata-field/field-group/%s" % self.name,method="PUT",body=vs_xml.tostring(self.dataContent))
 
     def dump_text(self, *fields):
         print("Metadata Group:")
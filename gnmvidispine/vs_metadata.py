@@ -64,6 +64,8 @@ class VSMetadata:
 
 
 class VSMetadataMixin(object):
+    #the metadata value classes hold only what they read out of the XML, in slots, as there can be a great many of them
+    __slots__ = ()
     _xmlns = "{http://xml.vidispine.com/schema/vidispine}"
 
     @staticmethod
@@ -86,6 +88,8 @@ class VSMetadataMixin(object):
 
 
 class VSMetadataValue(VSMetadataMixin):
+    __slots__ = ('user', 'uuid', 'timestamp', 'change', 'value')
+
     def __init__(self, valuenode=None, uuid=None):
         self.user = None
         self.uuid = None
@@ -113,20 +117,21 @@ class VSMetadataValue(VSMetadataMixin):
 
 
 class VSMetadataReference(VSMetadataMixin):
+    __slots__ = ('uuid', 'id', 'type')
+
     def __init__(self, refnode=None, uuid=None):
         """
         Initialises, either to an empty reference, to an existing uuid or to an xml fragment
         :param uuid: string representing the uuid of something to reference
         :param refnode: pointer to an elementtree node of <referenced> in a MetadataDocument
         """
+        self.uuid = uuid
+        self.id = None
+        self.type = None
         if refnode is not None:
             self.uuid = self._safe_get_attrib(refnode,"uuid",None)
             self.id = self._safe_get_attrib(refnode,"id",None)
             self.type = self._safe_get_attrib(refnode,"type",None)
-        if refnode is None and uuid is not None:
-            self.uuid=uuid
-            self.id = None
-            self.type = None
 
     def __repr__(self):
         return "VSMetadataReference {0} to {1} {2}".format(self.uuid,self.type,self.id)
@@ -139,6 +144,8 @@ class VSMetadataAttribute(VSMetadataMixin):
     """
     this class represents the full metadata present in an xml <field> entry
     """
+    __slots__ = ('uuid', 'user', 'timestamp', 'change', 'name', 'values', 'references')
+
     def __init__(self, fieldnode=None):
         if fieldnode is not None:
             self.uuid = self._safe_get_attrib(fieldnode,"uuid", None)
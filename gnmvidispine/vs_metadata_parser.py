@@ -0,0 +1,125 @@
+from xml.parsers import expat
+
+#expat gives us namespaced names as "uri}local" when created with "}" as the separator
+_ns = "http://xml.vidispine.com/schema/vidispine}"
+_item = _ns + "item"
+_item_document = _ns + "ItemDocument"
+_metadata = _ns + "metadata"
+_timespan = _ns + "timespan"
+_name = _ns + "name"
+_value = _ns + "value"
+
+#kinds of element that we are inside
+_ROOT, _ITEM, _METADATA, _CONTAINER, _FIELD, _TEXT = range(0, 6)
+
+
+class _Field(object):
+    __slots__ = ('key', 'named', 'values')
+
+    def __init__(self):
+        self.key = ""
+        self.named = False
+        self.values = []
+
+
+class MetadataParser(object):
+    """
+    Builds the contentDict of a VSItem straight from the bytes of a metadata document in a single pass, without
+    building an element tree.  It reads exactly what VSItem.makeContentDict would from the tree: for each timespan of
+    the item (or collection), the values of every field, recursing into groups, in document order.
+
+    parser = MetadataParser("item", item._add_content_value)
+    parser.parse(response_body)
+    item.name = parser.name
+    """
+    def __init__(self, objectClass, add_value):
+        """
+        :param objectClass: "item" or "collection"
+        :param add_value: function taking a field name and a value, called for each value in the document
+        """
+        self.objectClass = objectClass
+        self.add_value = add_value
+        self.name = None
+        self.type = objectClass
+        self._stack = []
+        self._ignored = 0
+        self._text = None       #text of the name or value element that we are in, while it is still being read
+
+    def parse(self, data):
+        """
+        Parses a whole document
+        :param data: XML as bytes or string
+        :return: self. Raises ExpatError if the document is not well-formed.
+        """
+        parser = expat.ParserCreate(namespace_separator="}")
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._data
+        parser.Parse(data, True)
+        return self
+
+    def _start(self, tag, attrib):
+        if self._ignored > 0:
+            self._ignored += 1
+            return
+        if len(self._stack) == 0:
+            if self.objectClass == "item" and tag == _item_document:
+                self.type = "itemdocument"
+                self.name = attrib.get('id')
+            self._stack.append((_ROOT, None))
+            return
+
+        kind, frame = self._stack[-1]
+        if kind == _CONTAINER:
+            if tag.endswith("field"):
+                self._stack.append((_FIELD, _Field()))
+            elif tag.endswith("group"):
+                self._stack.append((_CONTAINER, None))
+            else:
+                self._ignored = 1
+        elif kind == _FIELD:
+            if tag == _value or (tag == _name and not frame.named):
+                if tag == _name:
+                    frame.named = True
+                text = []
+                self._text = text
+                self._stack.append((_TEXT, (tag, text)))
+            else:
+                self._ignored = 1
+        elif kind == _TEXT:
+            #like ElementTree's .text, the text of a name or value stops at its first child element
+            self._text = None
+            self._ignored = 1
+        elif kind == _ROOT and self.type == "item" and tag == _item:
+            if self.name is None:
+                self.name = attrib.get('id')
+            self._stack.append((_ITEM, None))
+        elif (kind == _ITEM or (kind == _ROOT and self.type == "itemdocument")) and tag == _metadata:
+            self._stack.append((_METADATA, None))
+        elif (kind == _METADATA or (kind == _ROOT and self.type == "collection")) and tag == _timespan:
+            self._stack.append((_CONTAINER, None))
+        else:
+            self._ignored = 1
+
+    def _data(self, data):
+        if self._text is not None and self._ignored == 0:
+            self._text.append(data)
+
+    def _end(self, tag):
+        if self._ignored > 0:
+            self._ignored -= 1
+            return
+        kind, frame = self._stack.pop()
+        if kind == _TEXT:
+            tag, text = frame
+            self._text = None
+            text = "".join(text) if len(text) > 0 else None
+            field = self._stack[-1][1]
+            if tag == _name:
+                field.key = text
+            else:
+                field.values.append(text)
+        elif kind == _FIELD:
+            for value in frame.values:
+                self.add_value(frame.key, value)
@@ -0,0 +1,220 @@
+import threading
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+#Vidispine entity IDs (VX-1234), plain numbers, UUIDs and long hex strings (e.g. hashes and transfer ids)
+_id_segment = re.compile(r'^([A-Za-z]{2,}-\d+|\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[0-9a-fA-F]{16,})$')
+
+
+def normalise_path(path):
+    """
+    Turns a request path or URL into a template for grouping metrics, by removing /API, matrix and query parameters
+    and replacing anything that looks like an ID with {id}.
+    normalise_path("/API/item/VX-1234/metadata;field=title?p=1") => "/item/{id}/metadata"
+    :param path: URL path, with or without /API
+    :return: string
+    """
+    path = path.split('?', 1)[0]
+    if path.startswith("/API/") or path == "/API":
+        path = path[4:]
+    segments = []
+    for segment in path.split('/'):
+        segment = segment.split(';', 1)[0]
+        segments.append("{id}" if _id_segment.match(segment) else segment)
+    return "/".join(segments)
+
+
+class _Histogram(object):
+    """
+    Internal class, a cumulative histogram in the style of a Prometheus histogram
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[n] += 1
+
+
+def _labels(**kwargs):
+    return "{" + ",".join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                          for k, v in kwargs.items()) + "}"
+
+
+class VSMetrics(object):
+    """
+    Thread-safe collection of request metrics: latency histograms, response status counts, retries, time spent backing
+    off and bytes sent and received.  Everything is keyed by HTTP method and path template (see normalise_path), so
+    that requests for different items are counted together.
+
+    Metrics are only collected if a VSMetrics object is set on VSApi:
+    VSApi.metrics = VSMetrics()
+    ...
+    print(VSApi.metrics.prometheus_text())
+
+    To forward every request to another monitoring system instead, add a listener; it is called with a dictionary
+    for each completed request.
+    VSApi.metrics.add_listener(lambda event: statsd.timing(event['path'], event['duration']))
+    """
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    prefix = "vidispine"
+
+    def __init__(self, buckets=None):
+        """
+        Initialise a new metrics collection
+        :param buckets: upper bounds of the latency histogram buckets, in seconds
+        """
+        self.buckets = tuple(sorted(buckets)) if buckets is not None else self.default_buckets
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything recorded so far
+        :return: None
+        """
+        with self._lock:
+            self._latency = {}      #(method, path) -> _Histogram
+            self._responses = {}    #(method, path, status) -> count
+            self._retries = {}      #(method, path, reason) -> count
+            self._backoff = {}      #(method, path) -> seconds
+            self._sent = {}         #(method, path) -> bytes
+            self._received = {}     #(method, path) -> bytes
+
+    def add_listener(self, callback):
+        """
+        Register a function to be called after each request with a dictionary of method, path, status, duration, sent
+        and received. Exceptions raised by the callback are logged and otherwise ignored.
+        :param callback: function taking one argument
+        :return: None
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            self._listeners.remove(callback)
+
+    def observe(self, method, path, status, duration, sent=0, received=0):
+        """
+        Record a completed request
+        :param method: HTTP method
+        :param path: URL path of the request
+        :param status: HTTP status code of the response
+        :param duration: time taken to send the request and read the response, in seconds
+        :param sent: number of bytes in the request body
+        :param received: number of bytes in the response body
+        :return: None
+        """
+        key = (method, normalise_path(path))
+        with self._lock:
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = _Histogram(self.buckets)
+                self._latency[key] = histogram
+            histogram.observe(duration)
+            status_key = key + (int(status),)
+            self._responses[status_key] = self._responses.get(status_key, 0) + 1
+            self._sent[key] = self._sent.get(key, 0) + sent
+            self._received[key] = self._received.get(key, 0) + received
+            listeners = list(self._listeners)
+
+        if len(listeners) > 0:
+            event = {'method': method, 'path': key[1], 'status': status, 'duration': duration, 'sent': sent,
+                     'received': received}
+            for callback in listeners:
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.warning("Metrics listener {0} failed: {1}".format(callback, e))
+
+    def record_retry(self, method, path, reason, backoff=0):
+        """
+        Record that a request had to be retried
+        :param method: HTTP method
+        :param path: URL path of the request
+        :param reason: short description of why, e.g. "503" or "socket_error"
+        :param backoff: number of seconds waited before retrying
+        :return: None
+        """
+        key = (method, normalise_path(path))
+        with self._lock:
+            retry_key = key + (reason,)
+            self._retries[retry_key] = self._retries.get(retry_key, 0) + 1
+            self._backoff[key] = self._backoff.get(key, 0) + backoff
+
+    def snapshot(self):
+        """
+        Returns everything recorded so far as a dictionary keyed by "METHOD /path/template"
+        :return: dictionary of dictionaries with count, sum, mean, statuses, retries, backoff, sent and received
+        """
+        rtn = {}
+        with self._lock:
+            def entry(key):
+                name = "{0} {1}".format(*key)
+                if name not in rtn:
+                    rtn[name] = {'count': 0, 'sum': 0.0, 'mean': None, 'statuses': {}, 'retries': {}, 'backoff': 0,
+                                 'sent': self._sent.get(key, 0), 'received': self._received.get(key, 0)}
+                return rtn[name]
+
+            for key, histogram in self._latency.items():
+                e = entry(key)
+                e['count'] = histogram.count
+                e['sum'] = histogram.sum
+                e['mean'] = histogram.sum / histogram.count
+            for key, count in self._responses.items():
+                entry(key[0:2])['statuses'][key[2]] = count
+            for key, count in self._retries.items():
+                entry(key[0:2])['retries'][key[2]] = count
+            for key, seconds in self._backoff.items():
+                entry(key)['backoff'] = seconds
+        return rtn
+
+    def prometheus_text(self):
+        """
+        Returns everything recorded so far in the Prometheus text exposition format
+        :return: string
+        """
+        p = self.prefix
+        lines = []
+        with self._lock:
+            lines.append("# HELP {0}_request_duration_seconds Time taken by requests to Vidispine".format(p))
+            lines.append("# TYPE {0}_request_duration_seconds histogram".format(p))
+            for (method, path), histogram in sorted(self._latency.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append("{0}_request_duration_seconds_bucket{1} {2}".format(p, _labels(method=method, path=path, le=bound), count))
+                lines.append("{0}_request_duration_seconds_bucket{1} {2}".format(p, _labels(method=method, path=path, le="+Inf"), histogram.count))
+                lines.append("{0}_request_duration_seconds_sum{1} {2}".format(p, _labels(method=method, path=path), histogram.sum))
+                lines.append("{0}_request_duration_seconds_count{1} {2}".format(p, _labels(method=method, path=path), histogram.count))
+
+            lines.append("# HELP {0}_responses_total Responses from Vidispine by status code".format(p))
+            lines.append("# TYPE {0}_responses_total counter".format(p))
+            for (method, path, status), count in sorted(self._responses.items()):
+                lines.append("{0}_responses_total{1} {2}".format(p, _labels(method=method, path=path, status=status), count))
+
+            lines.append("# HELP {0}_retries_total Requests to Vidispine that had to be retried".format(p))
+            lines.append("# TYPE {0}_retries_total counter".format(p))
+            for (method, path, reason), count in sorted(self._retries.items()):
+                lines.append("{0}_retries_total{1} {2}".format(p, _labels(method=method, path=path, reason=reason), count))
+
+            lines.append("# HELP {0}_backoff_seconds_total Time spent waiting to retry requests to Vidispine".format(p))
+            lines.append("# TYPE {0}_backoff_seconds_total counter".format(p))
+            for (method, path), seconds in sorted(self._backoff.items()):
+                lines.append("{0}_backoff_seconds_total{1} {2}".format(p, _labels(method=method, path=path), seconds))
+
+            for name, values, help in (("request_bytes_total", self._sent, "Bytes sent to Vidispine in request bodies"),
+                                       ("response_bytes_total", self._received, "Bytes received from Vidispine in response bodies")):
+                lines.append("# HELP {0}_{1} {2}".format(p, name, help))
+                lines.append("# TYPE {0}_{1} counter".format(p, name))
+                for (method, path), count in sorted(values.items()):
+                    lines.append("{0}_{1}{2} {3}".format(p, name, _labels(method=method, path=path), count))
+        return "\n".join(lines) + "\n"
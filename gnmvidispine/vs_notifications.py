@@ -1,4 +1,5 @@
 from .vidispine_api import VSApi
+from . import vs_xml
 import logging
 
 logger = logging.getLogger('vidispine.vs_notifications')
@@ -18,7 +19,7 @@ class NotificationBase(object):
         Initialises a new notification document
         :return: self
         """
-        from xml.etree.cElementTree import Element
+        from xml.etree.ElementTree import Element
         if parent is None:
             self.dataContent = Element("ns0:action")
         else:
@@ -39,7 +40,6 @@ class NotificationBase(object):
         Sets the value of the node identified by xpath to newval, or if the parent= parameter is set to an ElementTree
         node will attempt to create it if it does not already exist.
         """
-        from xml.etree.cElementTree import SubElement
         if parent is None:
             parent = self.dataContent
         if not isinstance(newval,str):
@@ -51,7 +51,7 @@ class NotificationBase(object):
         else:
             if parent is None:
                 raise KeyError("Node {xp} is not found and no parent node specified to create".format(xp=xpath))
-            node = SubElement(parent,xpath)
+            node = vs_xml.SubElement(parent,xpath)
             node.text = newval
 
 
@@ -154,7 +154,7 @@ class VSTriggerEntry(NotificationBase):
         :return:
         """
         super(VSTriggerEntry,self).__init__(*args,**kwargs)
-        from xml.etree.cElementTree import Element
+        from xml.etree.ElementTree import Element
         self.dataContent = Element('trigger')
         #set these properties then call as_xml() to get a document
         self.trigger_class = None
@@ -166,7 +166,7 @@ class VSTriggerEntry(NotificationBase):
         Returns the document content as an ElementTree element
         :return: Element
         """
-        from xml.etree.cElementTree import Element, SubElement
+        from xml.etree.ElementTree import Element, SubElement
         trigger_el = Element('{0}trigger'.format(self.xmlns))
         class_el = SubElement(trigger_el, '{0}{1}'.format(self.xmlns,self.trigger_class))
         action_el = SubElement(class_el, '{0}{1}'.format(self.xmlns,self.action))
@@ -184,7 +184,7 @@ class VSTriggerEntry(NotificationBase):
         Returns the doucment content as a UTF-8 string
         :return:
         """
-        from xml.etree.cElementTree import tostring
+        from xml.etree.ElementTree import tostring
         return tostring(self.as_xml_node(), encoding="UTF-8")
 
 
@@ -200,7 +200,7 @@ class VSNotification(VSApi):
 
     def __init__(self,*args,**kwargs):
         super(VSNotification, self).__init__(*args, **kwargs)
-        from xml.etree.cElementTree import Element
+        from xml.etree.ElementTree import Element
         self.name = None
         self.objectclass = None
         self.dataContent = Element('NotificationDocument', {'xmlns:ns0': self.xmlns[1:-1]})
@@ -224,7 +224,7 @@ class VSNotification(VSApi):
         will change
         :return: None
         """
-        from xml.etree.cElementTree import tostring
+        from xml.etree.ElementTree import tostring
         from .vidispine_api import VSNotFound
         from pprint import pprint
         
@@ -241,7 +241,7 @@ class VSNotification(VSApi):
         #raise StandardError("testing")
 
     def as_xml(self):
-        from xml.etree.cElementTree import tostring
+        from xml.etree.ElementTree import tostring
         import re
         
         #strip_attributes(self.dataContent, 'xmlns', 'xmlns:ns0')
@@ -276,12 +276,11 @@ class VSNotification(VSApi):
         Generator that yields objects for every action associated with this notification
         :return: yields HttpNotification or similar subclass
         """
-        from xml.etree.cElementTree import SubElement
         action_node = self.dataContent.find('{0}action'.format(self.xmlns))
         if action_node is None:
-            action_node = SubElement(self.dataContent,'{0}action'.format(self.xmlns))
+            action_node = vs_xml.SubElement(self.dataContent,'{0}action'.format(self.xmlns))
             #FIXME: shouldn't be hardcoded!
-            type_node = SubElement(action_node,'{0}http'.format(self.xmlns), {'synchronous': 'false'})
+            type_node = vs_xml.SubElement(action_node,'{0}http'.format(self.xmlns), {'synchronous': 'false'})
             yield HttpNotification(type_node)
         else:
             for n in action_node:
@@ -296,15 +295,14 @@ class VSNotification(VSApi):
         :param act: Action to add.  This should be a NotificationBase subclass, e.g. HttpNotification
         :return:
         """
-        from xml.etree.cElementTree import SubElement
         if not isinstance(act,NotificationBase):
             raise TypeError("add_action must be given a notification action")
 
         action_node = self.dataContent.find('{0}action'.format(self.xmlns))
         if action_node is None:
-            action_node = SubElement(self.dataContent,'{0}action'.format(self.xmlns))
+            action_node = vs_xml.SubElement(self.dataContent,'{0}action'.format(self.xmlns))
 
-        action_node.append(act.dataContent)
+        vs_xml.append(action_node, act.dataContent)
 
         return self
 
@@ -331,7 +329,6 @@ class VSNotification(VSApi):
         Sets a new trigger value
         :param newval: Populated VSTriggerEntry representing the trigger value
         """
-        from xml.etree.cElementTree import SubElement
         if not isinstance(newval,VSTriggerEntry):
             raise ValueError("trigger must be a VSTriggerEntry")
 
@@ -344,7 +341,7 @@ class VSNotification(VSApi):
           del node.attrib['xmlns:ns0']
         except KeyError:
           pass          
-        self.dataContent.append(node)
+        vs_xml.append(self.dataContent, node)
 
 
 class VSNotificationCollection(VSApi):
@@ -0,0 +1,269 @@
+import threading
+import logging
+from contextlib import contextmanager
+from time import time, sleep
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket. Tokens are added at rate per second up to burst, and each request takes one.
+
+    A caller that finds the bucket empty reserves the next token (taking the level below zero) and sleeps until it is
+    due, so waiting callers are served in the order they arrived rather than all waking at once.
+    """
+    def __init__(self, rate, burst=None):
+        """
+        Initialise a new bucket
+        :param rate: number of requests per second to allow on average
+        :param burst: number of requests that may be sent back-to-back after a quiet period. Defaults to rate, or 1.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be greater than zero")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(1.0, self.rate)
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time()
+
+    def __repr__(self):
+        return "TokenBucket(rate={0}, burst={1})".format(self.rate, self.burst)
+
+    def reserve(self):
+        """
+        Take a token from the bucket
+        :return: number of seconds that the caller must wait before it is allowed to send its request
+        """
+        with self._lock:
+            now = time()
+            self._tokens = min(self.burst, self._tokens + max(0, now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class _Limit(object):
+    """
+    Internal class, a rate and concurrency limit for one class of endpoint
+    """
+    def __init__(self, prefix, method, rate, burst, max_in_flight):
+        self.prefix = prefix
+        self.method = method
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+
+    def matches(self, method, path):
+        if self.method is not None and self.method != method:
+            return False
+        if not path.startswith(self.prefix):
+            return False
+        #match on whole path segments, so that /item does not also cover /itemtype
+        return len(path) == len(self.prefix) or self.prefix.endswith("/") or path[len(self.prefix)] in "/;?"
+
+
+class VSRateLimiter(object):
+    """
+    Client-side rate and concurrency limits for requests to a single Vidispine host, shared by every VSApi object that
+    talks to it.  With no limits set (the default) it does nothing.
+
+    Limits are set per path prefix (as passed to VSApi.request, without /API) and optionally per HTTP method.  Each
+    limit has its own token bucket, so a flood of searches can be paced without holding up cheap item lookups.  A
+    request is governed by the most specific limit that matches it: the longest prefix, with a method-specific limit
+    preferred over one for all methods.  max_in_flight caps the number of requests outstanding to the host at once,
+    across all threads.
+
+    limiter = get_rate_limiter("vidispine.local", 8080)
+    limiter.set_limit("/search", rate=2, burst=5, max_in_flight=4)
+    limiter.set_limit("/import", rate=1)
+    limiter.set_limit("/item", rate=50, burst=100, method="GET")
+    limiter.max_in_flight = 20
+    """
+    def __init__(self, host, port, max_in_flight=None):
+        """
+        Initialise a new rate limiter
+        :param host: Vidispine host
+        :param port: Vidispine port
+        :param max_in_flight: maximum number of requests to have outstanding to the host at once, or None for no limit
+        """
+        self.host = host
+        self.port = port
+        self.max_in_flight = max_in_flight
+        self._limits = []
+        self._condition = threading.Condition()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.slot_waits = 0
+
+    def __repr__(self):
+        return "VSRateLimiter({0}:{1}, {2} limits)".format(self.host, self.port, len(self._limits))
+
+    def set_limit(self, prefix, rate=None, burst=None, method=None, max_in_flight=None):
+        """
+        Add or replace the limit for a class of endpoint
+        :param prefix: path prefix that the limit applies to, e.g. "/search"
+        :param rate: number of requests per second to allow, or None not to limit the rate
+        :param burst: number of requests that may be sent back-to-back. Defaults to rate.
+        :param method: HTTP method that the limit applies to, or None for all methods
+        :param max_in_flight: maximum number of these requests to have outstanding at once, or None for no limit
+        :return: None
+        """
+        limit = _Limit(prefix, method, rate, burst, max_in_flight)
+        with self._condition:
+            self._limits = [l for l in self._limits if not (l.prefix == prefix and l.method == method)]
+            self._limits.append(limit)
+            #most specific first: longest prefix, then method-specific before any-method
+            self._limits.sort(key=lambda l: (-len(l.prefix), l.method is None))
+
+    def remove_limit(self, prefix, method=None):
+        """
+        Remove the limit for a class of endpoint
+        :param prefix: path prefix passed to set_limit
+        :param method: HTTP method passed to set_limit
+        :return: None
+        """
+        with self._condition:
+            self._limits = [l for l in self._limits if not (l.prefix == prefix and l.method == method)]
+
+    def _find_limit(self, method, path):
+        for limit in self._limits:
+            if limit.matches(method, path):
+                return limit
+        return None
+
+    def _can_start(self, limit):
+        """
+        Internal method, returns True if another request may start now. Call with the condition held.
+        """
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            return False
+        if limit is not None and limit.max_in_flight is not None and limit.in_flight >= limit.max_in_flight:
+            return False
+        return True
+
+    def limits(self, method, path):
+        """
+        Returns True if any limit applies to a request, i.e. if acquire() might have to wait for it
+        :param method: HTTP method of the request
+        :param path: URL path of the request, not including /API
+        :return: boolean
+        """
+        return self.max_in_flight is not None or self._find_limit(method, path) is not None
+
+    def acquire(self, method, path):
+        """
+        Waits until a request is allowed by the rate limit for its endpoint and there is room for it under the in-flight
+        caps, and counts it as in flight until it is passed to release().  slot() is usually more convenient.
+        :param method: HTTP method of the request
+        :param path: URL path of the request, not including /API
+        :return: value to pass to release()
+        """
+        limit = self._find_limit(method, path)
+        if limit is None and self.max_in_flight is None:
+            return None
+
+        if limit is not None and limit.bucket is not None:
+            delay = limit.bucket.reserve()
+            if delay > 0:
+                logger.debug("Rate limit for {0} {1} reached, waiting {2:.2f}s".format(method, limit.prefix, delay))
+                with self._condition:
+                    limit.throttled += 1
+                    limit.wait_time += delay
+                sleep(delay)
+
+        with self._condition:
+            if not self._can_start(limit):
+                self.slot_waits += 1
+                while not self._can_start(limit):
+                    self._condition.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if limit is not None:
+                limit.in_flight += 1
+                limit.requests += 1
+        return (limit,)
+
+    def release(self, held):
+        """
+        Stops counting a request from acquire() as in flight
+        :param held: value returned by acquire()
+        :return: None
+        """
+        if held is None:
+            return
+        limit = held[0]
+        with self._condition:
+            self.in_flight -= 1
+            if limit is not None:
+                limit.in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, method, path):
+        """
+        Context manager to wrap around a request. This waits until the request is allowed by the rate limit for its
+        endpoint and there is room for it under the in-flight caps, and counts it as in flight until the block exits.
+        :param method: HTTP method of the request
+        :param path: URL path of the request, not including /API
+        :return: None
+        """
+        held = self.acquire(method, path)
+        try:
+            yield
+        finally:
+            self.release(held)
+
+    def stats(self):
+        """
+        Returns a dictionary of counters for this limiter
+        :return: dictionary with the host-wide counters, and a list of counters for each limit under 'limits'
+        """
+        with self._condition:
+            return {
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'slot_waits': self.slot_waits,
+                'limits': [{
+                    'prefix': l.prefix,
+                    'method': l.method,
+                    'in_flight': l.in_flight,
+                    'requests': l.requests,
+                    'throttled': l.throttled,
+                    'wait_time': l.wait_time,
+                } for l in self._limits],
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(host, port):
+    """
+    Returns the shared VSRateLimiter for a Vidispine host, creating it if necessary
+    :param host: Vidispine host
+    :param port: Vidispine port
+    :return: VSRateLimiter
+    """
+    key = (host, int(port))
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = VSRateLimiter(host, int(port))
+            _limiters[key] = limiter
+        return limiter
+
+
+def clear_rate_limiters():
+    """
+    Forget every rate limiter, removing all limits
+    :return: None
+    """
+    with _limiters_lock:
+        _limiters.clear()
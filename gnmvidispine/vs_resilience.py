@@ -0,0 +1,190 @@
+import threading
+import logging
+import random
+from time import time
+
+logger = logging.getLogger(__name__)
+
+
+class VSHostHealth(object):
+    """
+    Process-wide record of how a Vidispine host is coping, shared by every VSApi (and AsyncVSApi) object that talks to it.
+
+    Each 503, 504 or connection error raises the backoff level, so every object waits longer before retrying, and
+    successes lower it again.  Waits are exponential in the level, with jitter so that many workers don't retry in step.
+
+    After failure_threshold consecutive failures the circuit breaker opens, and requests fail immediately with
+    VSCircuitOpenError rather than adding to the load on the server.  Once reset_timeout seconds have passed it goes
+    half-open, letting a single probe request through every probe_interval seconds. A successful probe closes the
+    circuit again; a failed one re-opens it.
+
+    You don't normally need to create one of these yourself; get_host_health() returns the shared one for a host.
+    pprint(get_host_health("vidispine.local", 8080).snapshot())
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    failure_threshold = 5
+    reset_timeout = 30
+    probe_interval = 5
+    base_delay = 1
+    max_delay = 300
+    max_level = 16
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.level = 0
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.trips = 0
+        self.opened_at = None
+        self._next_probe_at = None
+
+    def __repr__(self):
+        return "VSHostHealth({0}:{1}, {2})".format(self.host, self.port, self.state)
+
+    def _open(self, now):
+        """
+        Internal method, trips the circuit breaker. Call with the lock held.
+        """
+        if self.state != self.OPEN:
+            logger.warning("Circuit breaker for {0}:{1} is now open after {2} consecutive failures".format(self.host, self.port,
+                                                                                                           self.consecutive_failures))
+            self.trips += 1
+        self.state = self.OPEN
+        self.opened_at = now
+
+    def allow_request(self):
+        """
+        Check whether a request may be sent to the host now
+        :return: True if the request may go ahead, False if the circuit breaker is open
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                logger.info("Circuit breaker for {0}:{1} is now half-open, probing".format(self.host, self.port))
+                self.state = self.HALF_OPEN
+                self._next_probe_at = now
+            if now >= self._next_probe_at:
+                self._next_probe_at = now + self.probe_interval
+                return True
+            return False
+
+    def retry_after(self):
+        """
+        Returns the number of seconds until the circuit breaker will next let a request through, or 0 if it is closed
+        """
+        with self._lock:
+            now = time()
+            if self.state == self.OPEN:
+                return max(0, self.opened_at + self.reset_timeout - now)
+            elif self.state == self.HALF_OPEN:
+                return max(0, self._next_probe_at - now)
+            return 0
+
+    def record_success(self):
+        """
+        Record that a request succeeded (in the sense that the server was able to handle it)
+        :return: None
+        """
+        with self._lock:
+            self.total_successes += 1
+            self.consecutive_failures = 0
+            if self.level > 0:
+                self.level -= 1
+            if self.state != self.CLOSED:
+                logger.info("Circuit breaker for {0}:{1} is now closed".format(self.host, self.port))
+                self.state = self.CLOSED
+                self.opened_at = None
+
+    def record_failure(self):
+        """
+        Record that a request failed because the server was unavailable, overloaded or unreachable
+        :return: None
+        """
+        with self._lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            self.level = min(self.level + 1, self.max_level)
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._open(time())
+
+    def backoff_delay(self, base=None):
+        """
+        Returns how long to wait before retrying, based on the current backoff level. The result is between half of and
+        the full exponential delay, so that it never collapses to nothing but different workers still spread out.
+        :param base: delay at level 1, in seconds. Defaults to base_delay.
+        :return: number of seconds to wait
+        """
+        if base is None:
+            base = self.base_delay
+        with self._lock:
+            level = self.level
+        delay = min(self.max_delay, base * (2 ** max(0, level - 1)))
+        return delay / 2.0 + random.uniform(0, delay / 2.0)
+
+    def snapshot(self):
+        """
+        Returns a dictionary describing the current state, for monitoring
+        :return: dictionary
+        """
+        with self._lock:
+            return {
+                'host': self.host,
+                'port': self.port,
+                'state': self.state,
+                'level': self.level,
+                'consecutive_failures': self.consecutive_failures,
+                'total_failures': self.total_failures,
+                'total_successes': self.total_successes,
+                'trips': self.trips,
+                'opened_at': self.opened_at,
+            }
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+def get_host_health(host, port):
+    """
+    Returns the shared VSHostHealth for a Vidispine host, creating it if necessary
+    :param host: Vidispine host
+    :param port: Vidispine port
+    :return: VSHostHealth
+    """
+    key = (host, int(port))
+    with _hosts_lock:
+        health = _hosts.get(key)
+        if health is None:
+            health = VSHostHealth(host, int(port))
+            _hosts[key] = health
+        return health
+
+
+def all_host_health():
+    """
+    Returns a list of snapshots of every host that has been talked to so far
+    :return: list of dictionaries, see VSHostHealth.snapshot()
+    """
+    with _hosts_lock:
+        hosts = list(_hosts.values())
+    return [h.snapshot() for h in hosts]
+
+
+def clear_host_health():
+    """
+    Forget the state of every host, e.g. after a planned outage
+    :return: None
+    """
+    with _hosts_lock:
+        _hosts.clear()
@@ -4,6 +4,8 @@ from .vidispine_api import VSApi,VSBadRequest,VSException,VSNotFound, always_str
 from .vs_timecode import VSTimecode
 from .vs_item import VSItem
 from .vs_collection import VSCollection
+from . import vs_json
+from . import vs_xml
 
 import xml.etree.ElementTree as ET
 import logging
@@ -109,62 +111,188 @@ class VSFacet(object):
 
 
 class VSSearchResult(VSApi):
-    def __init__(self, search_url="", body="",searchType="",debug=False, pageSize=100, *args,**kwargs):
+    def __init__(self, search_url="", body="",searchType="",debug=False, pageSize=100, fields=None, *args,**kwargs):
+        """
+        Represents the results of a search. You normally get one of these from VSSearch.execute() rather than creating it yourself.
+        :param fields: list of field names to return when items are populated from the search results. Default (None)
+        returns all fields.
+        """
         super(VSSearchResult, self).__init__(*args,**kwargs)
         self.searchURL = search_url
         #self.searchParam = urllib.pathname2url(body.replace('/','%2F'))
         self.searchParam = body
         self.itemsRetrieved = 0
         self.pageSize = pageSize
+        self._deferredPage = None
         self.totalItems = -1
         self.debug = debug
         self.cachedData = None
+        self.cachedDataHasMetadata = False
+        self.cachedPageNumber = -1
         self.searchType = searchType
-
-    def _nextPage(self, page_number=-1):
-        #ns = "{http://xml.vidispine.com/schema/vidispine}"
+        self.fields = fields
+
+    @property
+    def totalItems(self):
+        """
+        Total number of hits for the search, or -1 if it is not known yet.  If execute() left fetching the first page
+        until it was needed, it is fetched (without metadata) to find this out.
+        """
+        self._fetch_deferred(False)
+        return self._totalItems
+
+    @totalItems.setter
+    def totalItems(self, value):
+        self._totalItems = value
+
+    @property
+    def _inline_metadata(self):
+        """
+        Internal property, True if the hits of this search can come with their metadata.  Collections are always
+        populated individually, so it is not asked for in collection searches.
+        """
+        return self.searchType != "collection" or self.searchURL.endswith("/item")
+
+    def _page_start(self, page_number=-1):
         start_at = self.itemsRetrieved+1
         if page_number>=0:
             start_at = page_number*self.pageSize
             if start_at<1:
                 start_at=1
-        if self.searchType == "search":
-            xmlData = self.request(self.searchURL,method="PUT",
-                                   matrix={'first': start_at, 'number': self.pageSize},
-                                   body=self.searchParam
-                                   )
-        else:
-            logger.debug("VSSearchResult::_nextPage: url is {0} first is {1} number is {2} method is PUT body is {3}".format(
-                self.searchURL,start_at,self.pageSize,self.searchParam
-            ))
-            xmlData = self.request(self.searchURL,method="PUT",
-                         matrix={'first': start_at, 'number': self.pageSize },
-                         #query={'q': self.searchParam }
-                        body=self.searchParam,
-            )
+        return start_at
+
+    def _page_matrix(self, page_number=-1, withMetadata=False, start_at=None):
+        """
+        Internal method, returns the matrix parameters to request a page of results.
+        :param page_number: page to request, or -1 for the page after the last one retrieved
+        :param withMetadata: if True, ask Vidispine to include the metadata of each item in the page (limited to
+        self.fields if that is set) so that the items can be populated without requesting each one
+        :param start_at: if set, request the page starting at this (1-based) hit number, ignoring page_number
+        :return: dictionary
+        """
+        mtx = {'first': start_at if start_at is not None else self._page_start(page_number), 'number': self.pageSize}
+        if withMetadata and self._inline_metadata:
+            mtx['content'] = 'metadata'
+            if self.fields is not None:
+                mtx['field'] = ",".join(self.fields)
+        return mtx
+
+    def _nextPage(self, page_number=-1, withMetadata=False, start_at=None):
+        #ns = "{http://xml.vidispine.com/schema/vidispine}"
+        mtx = self._page_matrix(page_number, withMetadata, start_at)
+        logger.debug("VSSearchResult::_nextPage: url is {0} first is {1} number is {2} method is PUT body is {3}".format(
+            self.searchURL,mtx['first'],self.pageSize,self.searchParam
+        ))
+        fetch = self.request_json if self.use_json else self.request
+        xmlData = fetch(self.searchURL,method="PUT",
+                        matrix=mtx,
+                        body=self.searchParam
+                        )
+        return self._check_page(xmlData)
+
+    async def _nextPage_async(self, client, page_number=-1, withMetadata=False):
+        if self.use_json:
+            data = await client.request(self.searchURL,method="PUT",
+                                        matrix=self._page_matrix(page_number, withMetadata),
+                                        body=self.searchParam,
+                                        accept='application/json'
+                                        )
+            return self._check_page(vs_json.decode(data))
+        xmlData = await client.request(self.searchURL,method="PUT",
+                                       matrix=self._page_matrix(page_number, withMetadata),
+                                       body=self.searchParam
+                                       )
+        return self._check_page(xmlData)
+
+    def _stream_page(self, page_number=-1, withMetadata=False, clear=True):
+        """
+        Internal generator, streaming counterpart to _nextPage.  Yields each child node of the page of results as it is
+        parsed, so that the whole page is never held in memory.
+        :param page_number: page to request, or -1 for the page after the last one retrieved
+        :param withMetadata: request metadata along with the page
+        :param clear: clear each node once it has been consumed. Set this to False if the nodes are kept, e.g. by items
+        populated from inline metadata
+        :return: yields ElementTree elements
+        """
+        gotHits = False
+        for node in self.stream_request(self.searchURL, method="PUT", matrix=self._page_matrix(page_number, withMetadata),
+                                        body=self.searchParam, clear=clear):
+            if not gotHits:
+                if node.tag != '{0}hits'.format(self.xmlns):
+                    raise AssertionError("Invalid XML returned from search request (no hits node)")
+                self.totalItems = int(node.text)
+                gotHits = True
+            yield node
+        if not gotHits:
+            raise AssertionError("Invalid XML returned from search request (no hits node)")
+
+    def _check_page(self, xmlData):
+        if isinstance(xmlData, dict):
+            if 'hits' not in xmlData:
+                raise AssertionError("Invalid JSON returned from search request (no hits)")
+            self.totalItems = int(xmlData['hits'])
+            return xmlData
 
         hitsNode = xmlData.find('{0}hits'.format(self.xmlns))
         if hitsNode is not None:
             self.totalItems = int(hitsNode.text)
             #self.itemsRetrieved += self.pageSize
         else:
-            logger.debug(ET.tostring(xmlData))
+            logger.debug(vs_xml.tostring(xmlData))
             raise AssertionError("Invalid XML returned from search request (no hits node)")
 
         return xmlData
 
-    def setup(self,page_number=-1):
-        self.cachedData = self._nextPage(page_number=page_number)
+    def setup(self,page_number=-1,withMetadata=False):
+        """
+        Fetches the first page of results
+        :param page_number: page to fetch
+        :param withMetadata: whether to fetch the page with item metadata, or None to leave fetching it until it is
+        needed, when it is fetched in the way that it will be used
+        :return: self
+        """
+        if withMetadata is None:
+            self._deferredPage = page_number
+            return self
+        self.cachedData = self._nextPage(page_number=page_number,withMetadata=withMetadata)
+        self.cachedDataHasMetadata = withMetadata and self._inline_metadata
+        self.cachedPageNumber = page_number
         return self
 
+    def _fetch_deferred(self, withMetadata):
+        """
+        Internal method, fetches the first page of results if setup() was told to leave it until it was needed
+        """
+        if self._deferredPage is None:
+            return
+        page_number = self._deferredPage
+        self._deferredPage = None
+        self.setup(page_number, withMetadata)
+
+    def _take_cached_page(self, shouldPopulate):
+        """
+        Internal method, returns the page of results fetched by setup() and clears it. If the caller wants populated
+        objects and the cached page was fetched without metadata, the page is fetched again with metadata as that is
+        much cheaper than populating each object individually.
+        :return: parsed page data
+        """
+        pageData = self.cachedData
+        self.cachedData = None
+        if shouldPopulate and self._inline_metadata and not self.cachedDataHasMetadata:
+            pageData = self._nextPage(self.cachedPageNumber, withMetadata=True)
+        return pageData
+
     def facets(self):
         #ns = "{http://xml.vidispine.com/schema/vidispine}"
+        self._fetch_deferred(False)
         if self.cachedData is not None:
             pageData = self.cachedData
         else:
             logger.debug("getting next page of results...")
             pageData = self._nextPage()
             self.cachedData = pageData
+        if isinstance(pageData, dict):
+            pageData = vs_json.json_to_element(pageData, "ItemListDocument")
 
         for node in pageData.findall('{0}facet'.format(self.xmlns)):
             rtn={}
@@ -179,7 +307,84 @@ class VSSearchResult(VSApi):
     def _namedChildNode(self,parent,child_name):
         return parent.find('{0}{1}'.format(self.xmlns,child_name))
 
+    def _item_from_node(self, itemnode, shouldPopulate):
+        """
+        Internal method, returns a VSItem for an <item> node of a search result page. If the page was requested with
+        metadata then the item is populated directly from it; otherwise it is populated from the server if shouldPopulate
+        is set.
+        :param itemnode: <item> node
+        :param shouldPopulate: whether the item should be populated
+        :return: VSItem
+        """
+        rtn = VSItem(self.host,self.port,self.user,self.passwd)
+        if self._namedChildNode(itemnode, 'metadata') is not None:
+            #wrap the node so that it looks the same as the document that VSItem.populate() would have got
+            doc = vs_xml.element_like(itemnode, '{0}MetadataListDocument'.format(self.xmlns))
+            doc.append(itemnode)
+            rtn.fromXML(doc)
+            #only the fields in self.fields came with the page, so lazy_populate can fetch any others that are needed
+            rtn._set_loaded_fields(self.fields)
+        elif shouldPopulate:
+            rtn.populate(itemnode.attrib['id'])
+        else:
+            rtn.name = itemnode.attrib['id']
+        return rtn
+
+    def _item_from_json(self, itemnode, shouldPopulate):
+        """
+        Internal method, JSON counterpart to _item_from_node
+        :param itemnode: decoded JSON item from a search result page
+        :param shouldPopulate: whether the item should be populated
+        :return: VSItem
+        """
+        rtn = VSItem(self.host,self.port,self.user,self.passwd,use_json=True)
+        if itemnode.get('metadata') is not None:
+            rtn.fromJSON({'item': [itemnode]})
+            rtn._set_loaded_fields(self.fields)
+        elif shouldPopulate:
+            rtn.populate(itemnode['id'])
+        else:
+            rtn.name = itemnode['id']
+        return rtn
+
+    def _collection_from_json(self, node, shouldPopulate):
+        rtn = VSCollection(self.host,self.port,self.user,self.passwd)
+        if shouldPopulate:
+            rtn.populate(vs_json.text_of(node['id']))
+        else:
+            rtn.name = vs_json.text_of(node['id'])
+        return rtn
+
+    def _json_page_generator(self,pageData,shouldPopulate=False):
+        """
+        Internal generator, JSON counterpart to _page_node_generator
+        """
+        if self.totalItems<0 and 'hits' in pageData:
+            self.totalItems = int(pageData['hits'])
+
+        for node in vs_json.as_list(pageData.get('item')):
+            self.itemsRetrieved += 1
+            yield self._item_from_json(node, shouldPopulate)
+        for node in vs_json.as_list(pageData.get('collection')):
+            if 'id' not in node:
+                logger.error("Invalid data received - no id for collection")
+                continue
+            self.itemsRetrieved += 1
+            yield self._collection_from_json(node, shouldPopulate)
+        for node in vs_json.as_list(pageData.get('entry')):
+            if node.get('type')=="Collection":
+                self.itemsRetrieved += 1
+                yield self._collection_from_json(node, shouldPopulate)
+            elif node.get('type')=="Item":
+                self.itemsRetrieved += 1
+                yield self._item_from_json(node, shouldPopulate)
+
     def _page_node_generator(self,pageDataRoot,shouldPopulate=False):
+        if isinstance(pageDataRoot, dict):
+            for i in self._json_page_generator(pageDataRoot, shouldPopulate=shouldPopulate):
+                yield i
+            return
+
         rtn=None
         for childnode in pageDataRoot:
             # pprint(childnode)
@@ -194,11 +399,7 @@ class VSSearchResult(VSApi):
                 itemstart = childnode.attrib['start']
                 itemend = childnode.attrib['end']
                 logger.debug("Item: {0} ({1} -> {2})".format(itemid, itemstart, itemend))
-                rtn = VSItem(self.host,self.port,self.user,self.passwd)
-                if shouldPopulate:
-                    rtn.populate(itemid)
-                else:
-                    rtn.name = itemid
+                rtn = self._item_from_node(childnode, shouldPopulate)
             elif childnode.tag.endswith('collection'):
                 rtn = VSCollection(self.host,self.port,self.user,self.passwd)
                 try:
@@ -223,11 +424,7 @@ class VSSearchResult(VSApi):
                     else:
                         rtn.name = childnode.attrib['id']
                 elif childnode.attrib['type']=="Item":
-                    rtn = VSItem(self.host,self.port,self.user,self.passwd)
-                    if shouldPopulate:
-                        rtn.populate(childnode.attrib['id'])
-                    else:
-                        rtn.name = childnode.attrib['id']
+                    rtn = self._item_from_node(childnode, shouldPopulate)
             elif childnode.tag.endswith('facet'):
                 pass
             else:
@@ -238,24 +435,118 @@ class VSSearchResult(VSApi):
                 self.itemsRetrieved += 1
                 yield rtn
 
-    def results(self,shouldPopulate=True):
+    def _prefetched_pages(self, withMetadata, prefetchPages, prefetchWorkers=None):
+        """
+        Internal generator that yields parsed pages of results in order, while fetching up to prefetchPages pages ahead
+        on background threads.  Once the first page has told us the total number of hits the start of every following
+        page is known, so they can be requested in parallel.  If fetching a page fails, the exception is raised when
+        that page is reached.
+        :param withMetadata: request metadata along with each page
+        :param prefetchPages: number of pages to fetch ahead of the one being consumed
+        :param prefetchWorkers: number of threads to fetch pages with. Defaults to prefetchPages.
+        :return: yields parsed page data
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from collections import deque
+
+        self._fetch_deferred(withMetadata)
+        if self.cachedData is not None:
+            start_at = self._page_start(self.cachedPageNumber)
+            firstPage = self._take_cached_page(withMetadata)
+        else:
+            start_at = self._page_start()
+            firstPage = self._nextPage(withMetadata=withMetadata)
+        next_start = start_at + self.pageSize
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=prefetchWorkers or prefetchPages) as executor:
+            try:
+                pageData = firstPage
+                while pageData is not None:
+                    while len(pending) < prefetchPages and next_start <= self.totalItems:
+                        logger.debug("prefetching page of results starting at {0}".format(next_start))
+                        pending.append(executor.submit(self._nextPage, withMetadata=withMetadata, start_at=next_start))
+                        next_start += self.pageSize
+                    yield pageData
+                    pageData = pending.popleft().result() if len(pending) > 0 else None
+            finally:
+                #if the caller stopped iterating early, don't bother fetching pages that have not started yet
+                for f in pending:
+                    f.cancel()
+
+    def results(self,shouldPopulate=True,prefetchPages=0,prefetchWorkers=None):
+        """
+        Generator that yields VSItem or VSCollection objects for each hit, fetching pages of results as required.
+        If shouldPopulate is True then item metadata is requested along with each page, so items are populated without
+        any extra requests.
+        :param shouldPopulate: if True (the default) populate each object before yielding it
+        :param prefetchPages: if more than 0, fetch this many pages ahead in the background while the current page is
+        being consumed. Results are still yielded in order.
+        :param prefetchWorkers: number of threads to prefetch pages with. Defaults to prefetchPages.
+        :return: yields VSItem or VSCollection objects
+        """
+        self._fetch_deferred(shouldPopulate)
+        if prefetchPages>0:
+            for pageData in self._prefetched_pages(shouldPopulate, prefetchPages, prefetchWorkers):
+                for i in self._page_node_generator(pageData,shouldPopulate=shouldPopulate):
+                    yield i
+            return
+
         while(self.totalItems<0 or self.itemsRetrieved<self.totalItems):
             if self.cachedData is not None:
-                pageData = self.cachedData
-                self.cachedData = None
+                pageData = self._take_cached_page(shouldPopulate)
+            elif self.use_json:
+                logger.debug("getting next page of results...")
+                pageData = self._nextPage(withMetadata=shouldPopulate)
             else:
                 logger.debug("getting next page of results...")
-                pageData = self._nextPage()
+                pageData = self._stream_page(withMetadata=shouldPopulate, clear=not shouldPopulate)
 
             for i in self._page_node_generator(pageData,shouldPopulate=shouldPopulate):
                 yield i
 
+    async def results_async(self,client,shouldPopulate=True):
+        """
+        asyncio version of results(). Async generator that yields VSItem or VSCollection objects for each hit.
+        If shouldPopulate is True, all of the objects on each page are populated concurrently.
+        :param client: AsyncVSApi object to make the requests with
+        :param shouldPopulate: if True (the default) populate each object before yielding it
+        :return: yields VSItem or VSCollection objects
+        """
+        import asyncio
+        if self._deferredPage is not None:
+            page_number = self._deferredPage
+            self._deferredPage = None
+            self.cachedData = await self._nextPage_async(client, page_number, withMetadata=shouldPopulate)
+            self.cachedDataHasMetadata = shouldPopulate and self._inline_metadata
+            self.cachedPageNumber = page_number
+        while(self.totalItems<0 or self.itemsRetrieved<self.totalItems):
+            if self.cachedData is not None:
+                pageData = self.cachedData
+                self.cachedData = None
+                if shouldPopulate and self._inline_metadata and not self.cachedDataHasMetadata:
+                    pageData = await self._nextPage_async(client, self.cachedPageNumber, withMetadata=True)
+            else:
+                logger.debug("getting next page of results...")
+                pageData = await self._nextPage_async(client, withMetadata=shouldPopulate)
+
+            page = list(self._page_node_generator(pageData,shouldPopulate=False))
+            if len(page)==0:
+                break
+            if shouldPopulate:
+                #items that came with inline metadata are already populated
+                await asyncio.gather(*[entry.populate_async(client) for entry in page if not entry._has_content()])
+            for i in page:
+                yield i
+
     def results_page(self,page_number,shouldPopulate=True):
+        self._fetch_deferred(shouldPopulate)
         if self.cachedData is not None:
-            pageData = self.cachedData
-            self.cachedData = None
+            pageData = self._take_cached_page(shouldPopulate)
+        elif self.use_json:
+            pageData = self._nextPage(page_number,withMetadata=shouldPopulate)
         else:
-            pageData = self._nextPage(page_number)
+            pageData = self._stream_page(page_number,withMetadata=shouldPopulate,clear=not shouldPopulate)
         for i in self._page_node_generator(pageData,shouldPopulate=shouldPopulate):
             yield i
 
@@ -335,7 +626,16 @@ class VSSearch(VSApi):
 
         return ET.tostring(root)
 
-    def execute(self,page_number=-1):
+    def execute(self,page_number=-1,shouldPopulate=None,fields=None):
+        """
+        Runs the search
+        :param page_number: page of results to start at
+        :param shouldPopulate: whether the first page is fetched with item metadata included.  By default (None) the
+        first page is not fetched until it is needed: with metadata if results() is going to populate the items, and
+        without if only the number of hits, the ids or the facets are wanted.
+        :param fields: list of field names to include when items are populated from the results. Default (None) is all fields.
+        :return: VSSearchResult object
+        """
         xmlBody = self._makeXML()
         logger.debug("VSSearch::execute - request body is %s" % xmlBody)
         if xmlBody is None:
@@ -352,7 +652,8 @@ class VSSearch(VSApi):
 
         #call to .setup retrieves the first page of results and with it information like total number of hits
         rtn= VSSearchResult(host=self.host,port=self.port,user=self.user,passwd=self.passwd,
-                        search_url=url,body=xmlBody,searchType=self.searchType,debug=self.debug,pageSize=self.pageSize).setup(page_number=page_number)
+                        search_url=url,body=xmlBody,searchType=self.searchType,debug=self.debug,pageSize=self.pageSize,
+                        fields=fields,use_json=self.use_json).setup(page_number=page_number,withMetadata=shouldPopulate)
         rtn.pageSize = self.pageSize
         return rtn
 
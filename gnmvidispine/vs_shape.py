@@ -1,7 +1,8 @@
 from .vidispine_api import VSApi,VSException,HTTPError, VSNotFound
 from .vs_storage_rule import VSStorageRule,VSStorageRuleCollection
+from . import vs_json
 import logging
-import xml.etree.cElementTree as ET
+import xml.etree.ElementTree as ET
 
 class VSShape(VSApi):
     def __init__(self, *args,**kwargs):
@@ -13,8 +14,16 @@ class VSShape(VSApi):
     def populate(self,itemid,id):
         ns = "{http://xml.vidispine.com/schema/vidispine}"
         self.name = id
-        self.dataContent = self.request("/item/%s/shape/%s" % (itemid,id))
         self.itemid = itemid
+        if self.use_json:
+            document = self.request_json("/item/%s/shape/%s" % (itemid,id))
+            self._set_json_content(document, "ShapeDocument")
+            for key in ['id','essenceVersion','tag','mimeType']:
+                if key in document:
+                    self.contentDict[key] = vs_json.text_of(document[key])
+            return
+
+        self.dataContent = self.request("/item/%s/shape/%s" % (itemid,id))
 
         for key in ['id','essenceVersion','tag','mimeType']:
             nodeName = "{0}%s" % key
@@ -60,7 +69,7 @@ class VSShape(VSApi):
         :return: HTTPResponse object. Call .read() on this to get the data
         """
         import http.client
-        #import xml.etree.cElementTree as ET
+        #import xml.etree.ElementTree as ET
         from pprint import pprint
 
         if self.dataContent is None:
@@ -88,6 +97,35 @@ class VSShape(VSApi):
                 except VSNotFound as e:
                     logging.warning(e)
 
+    def download_to(self, destination, segments=1, resume=True, block_size=None):
+        """
+        Download the shape's file to disk, streaming it in blocks rather than reading it into memory. A partial download
+        at destination is resumed, and the result is checked against the file's hash if Vidispine has one.
+        :param destination: path to download to, or an open file object to write to
+        :param segments: number of byte ranges to download in parallel. Defaults to 1.
+        :param resume: if True (the default) continue a partial download at destination rather than starting again
+        :param block_size: size of the blocks to read and write, in bytes
+        :return: destination. Raises DownloadError or HashMismatchError if the download is incomplete or corrupt.
+        """
+        from .vs_download import download_file_to
+
+        if self.dataContent is None:
+            raise ValueError("You must populate a shape before calling download_to()")
+
+        for componentType in ['containerComponent','binaryComponent']:
+            for node in self.dataContent.findall("{0}{1}/{0}file".format(self.xmlns,componentType)):
+                idNode = node.find('{0}id'.format(self.xmlns))
+                if idNode is None:
+                    continue
+                sizeNode = node.find('{0}size'.format(self.xmlns))
+                hashNode = node.find('{0}hash'.format(self.xmlns))
+                logging.debug("downloading {0} to {1}".format(idNode.text,destination))
+                return download_file_to(self, idNode.text, destination,
+                                        size=sizeNode.text if sizeNode is not None else None,
+                                        file_hash=hashNode.text if hashNode is not None else None,
+                                        block_size=block_size, segments=segments, resume=resume)
+        raise VSNotFound("Shape {0} has no files to download".format(self.name))
+
     @property
     def mime_type(self):
         if self.dataContent is None:
@@ -131,7 +169,7 @@ class VSShape(VSApi):
 
     def add_storage_rule(self, newrule):
         from .vs_storage_rule import VSStorageRuleNew
-        from xml.etree.cElementTree import tostring
+        from xml.etree.ElementTree import tostring
         if not isinstance(newrule,VSStorageRuleNew): raise TypeError("add() accepts only a VSStorageRuleNew object")
         newrule.assert_populated()
         
@@ -0,0 +1,83 @@
+import threading
+import logging
+from copy import deepcopy
+
+logger = logging.getLogger(__name__)
+
+
+class _Call(object):
+    """
+    Internal class, a request that is in flight and the callers waiting for it
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.followers = 0
+        self.result = None
+        self.error = None
+
+
+class VSSingleFlight(object):
+    """
+    Collapses identical requests that are made at the same time into one.  The first caller for a key (the leader)
+    makes the request; anyone else asking for the same key before it completes waits for that request rather than
+    making their own, and gets a deep copy of its result (or the same exception), so callers can never see each
+    other's changes to a shared document.  Nothing is kept once the request completes; this is not a cache.
+
+    VSApi uses this for GET requests if a VSSingleFlight object is set on it:
+    VSApi.single_flight = VSSingleFlight()
+    Requests are only collapsed if they are for the same server, URL, credentials, RunAs user and Accept type.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._led = 0
+        self._shared = 0
+
+    def do(self, key, fn):
+        """
+        Call fn, unless a call for the same key is already in flight in which case wait for its result
+        :param key: hashable key identifying the request
+        :param fn: function taking no arguments that makes the request
+        :return: the result of fn, or a copy of it. Raises whatever fn raised.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self._shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._led += 1
+                leader = True
+
+        if not leader:
+            logger.debug("Waiting for in-flight request {0}".format(key))
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return deepcopy(call.result)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                followers = call.followers
+            if call.error is None and followers > 0:
+                #the leader is free to change its own result as soon as we return, so keep a copy for the others
+                call.result = deepcopy(result)
+            call.done.set()
+        return result
+
+    def stats(self):
+        """
+        Returns counts of how many requests were actually made and how many were served by one already in flight
+        :return: dictionary of requests, shared and in_flight
+        """
+        with self._lock:
+            return {'requests': self._led, 'shared': self._shared, 'in_flight': len(self._calls)}
@@ -0,0 +1,214 @@
+import threading
+import logging
+import sqlite3
+import json
+import os
+from time import time
+from . import vs_xml
+
+logger = logging.getLogger(__name__)
+
+
+class VSSqliteCache(object):
+    """
+    Persistent metadata cache in a SQLite database, which any number of processes on the same host can share.  It has
+    the same interface as VSMetadataCache so it can be used wherever that can:
+    VSItem.metadata_cache = VSSqliteCache("/var/cache/gnmvidispine/metadata.db", ttl=300)
+    VSStorage.metadata_cache = VSItem.metadata_cache
+
+    The database is opened in WAL mode, so readers never block each other or the writer.  Documents are stored
+    serialised (XML documents as XML, JSON documents as JSON) with an expiry time and a version stamp; entries written
+    with a different version are ignored, so bump the version to discard everything when the format of what you store
+    changes.  Expired entries are purged from time to time as new ones are written, and the oldest entries are dropped
+    once there are more than maxsize.
+
+    Each thread gets its own connection, and connections are reopened in a child process after a fork.
+    """
+    default_maxsize = 100000
+    default_ttl = 300
+    #2: bytes are stored as "bytes" rather than "text"
+    format_version = 2
+    purge_interval = 100
+    busy_timeout = 5.0
+
+    def __init__(self, path, maxsize=None, ttl=None, version="1"):
+        """
+        Open a cache, creating the database if necessary
+        :param path: filename of the SQLite database
+        :param maxsize: maximum number of entries to hold
+        :param ttl: number of seconds that an entry is valid for
+        :param version: version stamp for entries written by this cache. Entries with any other stamp are ignored.
+        """
+        self.path = path
+        self.maxsize = maxsize if maxsize is not None else self.default_maxsize
+        self.ttl = ttl if ttl is not None else self.default_ttl
+        self.version = "{0}:{1}".format(self.format_version, version)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+        conn = self._connection()
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                entity_id TEXT,
+                format TEXT NOT NULL,
+                body BLOB NOT NULL,
+                version TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS documents_entity ON documents (type, entity_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS documents_expiry ON documents (expires_at)")
+
+    def _connection(self):
+        """
+        Internal method, returns this thread's connection to the database, opening it if necessary
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        """
+        Close this thread's connection to the database. It is reopened if the cache is used again.
+        :return: None
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    @staticmethod
+    def _key_string(key):
+        return json.dumps([list(k) if isinstance(k, tuple) else k for k in key])
+
+    @staticmethod
+    def _serialise(document):
+        if isinstance(document, dict):
+            return "json", json.dumps(document).encode('utf-8')
+        if isinstance(document, str):
+            return "text", document.encode('utf-8')
+        if isinstance(document, bytes):
+            #raw response bodies, which need not be UTF-8, are stored and returned exactly as they are
+            return "bytes", document
+        return "xml", vs_xml.tostring(document, "utf-8")
+
+    @staticmethod
+    def _deserialise(format, body):
+        if format == "json":
+            return json.loads(body.decode('utf-8'))
+        if format == "text":
+            return body.decode('utf-8')
+        if format == "bytes":
+            return body
+        return vs_xml.fromstring(body)
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        """
+        Look up a document in the cache
+        :param key: key from cache_key()
+        :return: the cached document, freshly parsed, or None if it is not cached, has expired or has a different version
+        """
+        row = self._connection().execute("SELECT format, body, version, expires_at FROM documents WHERE key=?",
+                                         (self._key_string(key),)).fetchone()
+        if row is None or row[2] != self.version:
+            self._count("misses")
+            return None
+        if time() >= row[3]:
+            self._count("expired")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return self._deserialise(row[0], bytes(row[1]))
+
+    def put(self, key, document):
+        """
+        Add a document to the cache, replacing any existing entry for the key
+        :param key: key from cache_key()
+        :param document: parsed XML document, or decoded JSON document
+        :return: None
+        """
+        format, body = self._serialise(document)
+        now = time()
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO documents (key, type, entity_id, format, body, version, stored_at, expires_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (self._key_string(key), key[0], key[1], format, sqlite3.Binary(body), self.version, now, now + self.ttl))
+        with self._lock:
+            self._puts += 1
+            should_purge = self._puts % self.purge_interval == 0
+        if should_purge:
+            self.purge()
+
+    def purge(self):
+        """
+        Delete expired entries, then the oldest entries if there are still more than maxsize
+        :return: number of entries deleted
+        """
+        conn = self._connection()
+        with conn:
+            deleted = conn.execute("DELETE FROM documents WHERE expires_at <= ? OR version != ?", (time(), self.version)).rowcount
+            excess = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0] - self.maxsize
+            if excess > 0:
+                deleted += conn.execute("DELETE FROM documents WHERE key IN (SELECT key FROM documents ORDER BY stored_at LIMIT ?)",
+                                        (excess,)).rowcount
+        return deleted
+
+    def invalidate(self, type, entity_id):
+        """
+        Drop every cached document for the given entity, in every process using this database
+        :param type: "item", "collection", "storage", etc.
+        :param entity_id: Vidispine ID of the entity
+        :return: None
+        """
+        conn = self._connection()
+        with conn:
+            deleted = conn.execute("DELETE FROM documents WHERE type=? AND entity_id=?", (type, entity_id)).rowcount
+        if deleted > 0:
+            self._count("invalidations")
+
+    def clear(self):
+        """
+        Drop everything in the cache
+        :return: None
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM documents")
+
+    def stats(self):
+        """
+        Returns a dictionary of counters for this cache. The size covers every process; the other counts are for
+        this process only.
+        :return: dictionary with size, hits, misses, expired and invalidations counts
+        """
+        size = len(self)
+        with self._lock:
+            return {
+                'size': size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'invalidations': self.invalidations,
+            }
@@ -15,7 +15,14 @@ import logging
 import json
 
 from .vidispine_api import HTTPError, VSApi, VSException, VSNotFound, always_string
+from .vs_cache import cache_key
+from . import vs_json
+from . import vs_xml
 
+_file_item = vs_xml.Path('{0}item')
+_file_item_id = vs_xml.Path('{0}id')
+#lookups for the simple values of a file document, keyed by tag name
+_file_values = {}
 
 class FileAlreadyImportedError(Exception):
     pass
@@ -25,48 +32,81 @@ class FileDoesNotExistError(Exception):
 
 
 class VSFile(object):
+    """
+    A file on a Vidispine storage.  Storage listings can give a great many of these, so the values are copied out of the
+    file document into slots and the document is not kept; the VSItem for memberOfItem is only created when it is
+    first asked for.
+    """
+    __slots__ = ('parent', 'name', 'path', 'uri', 'state', 'size', 'hash', 'timestamp', 'refreshFlag', 'storageName',
+                 '_memberOfItemId', '_memberOfItem')
+
     def __init__(self, parent_storage, parsed_data, conn=None):
         self.parent = parent_storage
-
-        self.dataContent = parsed_data
-        self.contentDict = {}
-
-        self.name = self._valueOrNone('id')
-        self.path = self._valueOrNone('path')
-        self.uri = self._valueOrNone('uri')
-        self.state = self._valueOrNone('state')
-        self.size = self._valueOrNone('size')
-        self.hash = self._valueOrNone('hash')
-        self.timestamp = self._valueOrNone('timestamp')
-        self.refreshFlag = self._valueOrNone('refreshFlag')
-        self.storageName = self._valueOrNone('storage')
-
-        namespace = "{http://xml.vidispine.com/schema/vidispine}"
+        self._load(parsed_data)
 
         if self.parent is None:
             self.parent = VSStorage(host=conn.host,port=conn.port,user=conn.user,passwd=conn.passwd)
             self.parent.populate(self.storageName)
 
-        self.memberOfItem = None
-        node = self.dataContent.find('{0}item'.format(namespace))
+    def _load(self, parsed_data):
+        """
+        Internal method, reads the values of a file document, parsed XML or decoded JSON, into this object
+        """
+        self.name = self._valueOrNone(parsed_data, 'id')
+        self.path = self._valueOrNone(parsed_data, 'path')
+        self.uri = self._valueOrNone(parsed_data, 'uri')
+        self.state = self._valueOrNone(parsed_data, 'state')
+        self.size = self._valueOrNone(parsed_data, 'size')
+        self.hash = self._valueOrNone(parsed_data, 'hash')
+        self.timestamp = self._valueOrNone(parsed_data, 'timestamp')
+        self.refreshFlag = self._valueOrNone(parsed_data, 'refreshFlag')
+        self.storageName = self._valueOrNone(parsed_data, 'storage')
+
+        self._memberOfItem = None
+        self._memberOfItemId = None
+        if isinstance(parsed_data, dict):
+            items = vs_json.as_list(parsed_data.get('item'))
+            if len(items) > 0 and items[0].get('id') is not None:
+                self._memberOfItemId = vs_json.text_of(items[0]['id'])
+            return
+
+        node = _file_item.find(parsed_data)
         if node is not None:
-            idNode = node.find('{0}id'.format(namespace))
-            if id is not None:
-                host = self.parent.host
-                port = self.parent.port
-                user = self.parent.user
-                passwd = self.parent.passwd
+            idNode = _file_item_id.find(node)
+            if idNode is not None:
+                self._memberOfItemId = idNode.text
 
-                self.memberOfItem = VSItem(host=host, port=port, user=user, passwd=passwd)
-                self.memberOfItem.name = idNode.text
+    @property
+    def memberOfItem(self):
+        """
+        VSItem that the file belongs to, with only its name set; or None if the file is not part of an item
+        """
+        if self._memberOfItem is None and self._memberOfItemId is not None:
+            item = VSItem(host=self.parent.host, port=self.parent.port, user=self.parent.user,
+                          passwd=self.parent.passwd, use_json=self.parent.use_json)
+            item.name = self._memberOfItemId
+            self._memberOfItem = item
+        return self._memberOfItem
+
+    @memberOfItem.setter
+    def memberOfItem(self, value):
+        self._memberOfItem = value
+        self._memberOfItemId = value.name if value is not None else None
 
     def __unicode__(self):
         return 'Vidispine file {0}: {1} on storage {2}'.format(self.name,self.path,self.storageName)
 
-    def _valueOrNone(self, path):
+    @staticmethod
+    def _valueOrNone(parsed_data, path):
         namespace = "{http://xml.vidispine.com/schema/vidispine}"
 
-        node = self.dataContent.find('{0}{1}'.format(namespace, path))
+        if isinstance(parsed_data, dict):
+            return vs_json.text_of(parsed_data.get(path))
+        lookup = _file_values.get(path)
+        if lookup is None:
+            lookup = vs_xml.Path('{0}' + path, namespace)
+            _file_values[path] = lookup
+        node = lookup.find(parsed_data)
         if node is not None:
             return node.text
         return None
@@ -84,15 +124,15 @@ class VSFile(object):
             'refreshFlag': self.refreshFlag,
             'storageName': self.storageName,
         }
-        if self.memberOfItem is not None:
-            rtn['memberOfItem'] = self.memberOfItem.name
+        if self._memberOfItemId is not None:
+            rtn['memberOfItem'] = self._memberOfItemId
         return rtn
 
     def to_json(self):
         return json.dumps(self.json_data())
 
     def dump(self):
-        pprint(self.__dict__)
+        pprint(self.json_data())
 
     def importToItem(self, metadata, jobMetadata=None, tags=['lowres','WebM'], priority="LOW", thumbnails=True):
         """
@@ -104,9 +144,9 @@ class VSFile(object):
         :param thumbnails: boolean - true/false, should thumbnails be made or not
         :return: VSJob object
         """
-        if self.memberOfItem is not None:
+        if self._memberOfItemId is not None:
             msg = "The file {filename} is already associated with item {itemid}".format(filename=self.path,
-                                                                                        itemid=self.memberOfItem.name)
+                                                                                        itemid=self._memberOfItemId)
             raise FileAlreadyImportedError(msg)
 
         mdtext = ""
@@ -142,18 +182,7 @@ class VSFile(object):
         self.parent.request("/storage/{0}/file/{1}".format(self.parent.name, self.name), method="DELETE")
         
     def refreshNewData(self,response):
-        self.dataContent = response
-        self.contentDict = {}
-
-        self.name = self._valueOrNone('id')
-        self.path = self._valueOrNone('path')
-        self.uri = self._valueOrNone('uri')
-        self.state = self._valueOrNone('state')
-        self.size = self._valueOrNone('size')
-        self.hash = self._valueOrNone('hash')
-        self.timestamp = self._valueOrNone('timestamp')
-        self.refreshFlag = self._valueOrNone('refreshFlag')
-        self.storageName = self._valueOrNone('storage')
+        self._load(response)
 
     def setNewPath(self,newPath,storage=None):
         if not os.path.exists(newPath):
@@ -193,6 +222,21 @@ class VSFile(object):
 
         return response
 
+    def download_to(self, destination, segments=1, resume=True, block_size=None):
+        """
+        Download the file to disk, streaming it in blocks rather than reading it into memory. A partial download at
+        destination is resumed, and the result is checked against the file's hash if Vidispine has one.
+        :param destination: path to download to, or an open file object to write to
+        :param segments: number of byte ranges to download in parallel. Defaults to 1.
+        :param resume: if True (the default) continue a partial download at destination rather than starting again
+        :param block_size: size of the blocks to read and write, in bytes
+        :return: destination. Raises DownloadError or HashMismatchError if the download is incomplete or corrupt.
+        """
+        from .vs_download import download_file_to
+        logging.debug("downloading {0} from storage {1} to {2}".format(self.name,self.storageName,destination))
+        return download_file_to(self.parent, self.name, destination, size=self.size, file_hash=self.hash,
+                                block_size=block_size, segments=segments, resume=resume)
+
     def move(self, storage):
         """
         Move the file to another storage
@@ -246,6 +290,9 @@ class VSStorageMethod(object):
 
 
 class VSStorage(VSApi):
+    #cache storage definitions loaded by populate(), e.g. a VSMetadataCache or VSSqliteCache
+    metadata_cache = None
+
     def __init__(self, *args,**kwargs):
         super(VSStorage, self).__init__(*args,**kwargs)
         self.dataContent = None
@@ -282,7 +329,15 @@ class VSStorage(VSApi):
         
     def populate(self, vsid):
         if vsid is not None:
-            self.dataContent = self.request("/storage/%s" % vsid, method="GET")
+            cache = self.metadata_cache
+            if cache is None:
+                self.dataContent = self.request("/storage/%s" % vsid, method="GET")
+            else:
+                key = cache_key("storage", vsid)
+                self.dataContent = cache.get(key)
+                if self.dataContent is None:
+                    self.dataContent = self.request("/storage/%s" % vsid, method="GET")
+                    cache.put(key, self.dataContent)
 
         #logging.debug("VSStorage::populate")
         #pprint(self.dataContent)
@@ -375,6 +430,18 @@ class VSStorage(VSApi):
         internal method to make storage-file request to server
         :return:
         """
+        mtx, q = self._file_request_params(path, got_files, pageSize, state, include_item)
+        return self.request("/storage/{storage}/file".format(storage=self.name),
+                                method="GET",
+                                matrix=mtx,
+                                query=q
+                                )
+
+    def _file_request_params(self, path, got_files, pageSize, state, include_item):
+        """
+        internal method, returns the matrix and query parameters for a storage-file request
+        :return: tuple of (matrix dict, query dict)
+        """
         q = {
             'path': path
         }
@@ -388,11 +455,7 @@ class VSStorage(VSApi):
         if include_item:
             mtx['includeItem'] = True
 
-        return self.request("/storage/{storage}/file".format(storage=self.name),
-                                method="GET",
-                                matrix=mtx,
-                                query=q
-                                )
+        return mtx, q
 
     def file_count(self, path='/', include_item=True, state=None):
         """
@@ -425,16 +488,31 @@ class VSStorage(VSApi):
         total_hits = -1
         pageSize = 100
 
-        while True:
-            response = self._file_request(path, got_files, pageSize, state, include_item)
-            if total_hits == -1:
-                total_hits = int(response.find("{0}hits".format(self.xmlns)).text)
-                logging.debug("Got {0} hits".format(total_hits))
+        hits_tag = "{0}hits".format(self.xmlns)
+        file_tag = "{0}file".format(self.xmlns)
 
+        while True:
+            mtx, q = self._file_request_params(path, got_files, pageSize, state, include_item)
             start_num_files = got_files
-            for filenode in response.findall("{0}file".format(self.xmlns)):
+            if self.use_json:
+                page = self.request_json("/storage/{storage}/file".format(storage=self.name), method="GET", matrix=mtx, query=q)
+                for node in vs_json.as_list(page.get('file')):
+                    got_files += 1
+                    yield VSFile(self,node)
+                if got_files == start_num_files:
+                    break
+                continue
+
+            #VSFile copies what it needs out of the node, so each one can be cleared once it has been yielded
+            for node in self.stream_request("/storage/{storage}/file".format(storage=self.name), [hits_tag, file_tag],
+                                            method="GET", matrix=mtx, query=q):
+                if node.tag == hits_tag:
+                    if total_hits == -1:
+                        total_hits = int(node.text)
+                        logging.debug("Got {0} hits".format(total_hits))
+                    continue
                 got_files += 1
-                yield VSFile(self,filenode)
+                yield VSFile(self,node)
 
             if got_files == start_num_files: #no files returned => we got to the end
                 break
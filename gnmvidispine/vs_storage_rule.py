@@ -3,6 +3,7 @@ __author__ = 'Andy Gallagher <andy.gallagher@theguardian.com>'
 from .vidispine_api import VSApi,VSException,VSNotFound
 #from vidispine.vs_storage import VSStorage
 from xml.etree import ElementTree as ET
+from . import vs_xml
 from pprint import pprint
 import logging
 
@@ -49,7 +50,7 @@ class VSStorageRuleNew(VSApi):
 
         node = self.xmlDOM.find('{0}storageCount'.format(self.xmlns))
         if node is None:
-            node = ET.SubElement(self.xmlDOM,'{0}storageCount'.format(self.xmlns))
+            node = vs_xml.SubElement(self.xmlDOM,'{0}storageCount'.format(self.xmlns))
         node.text = str(value)
 
     @property
@@ -82,7 +83,7 @@ class VSStorageRuleNew(VSApi):
 
         node = self.xmlDOM.find('{0}precedence'.format(self.xmlns))
         if node is None:
-            node = ET.SubElement(self.xmlDOM, '{0}precedence'.format(self.xmlns))
+            node = vs_xml.SubElement(self.xmlDOM, '{0}precedence'.format(self.xmlns))
         node.text = value
 
     def _generic_get_ref(self,type,invert=False):
@@ -141,7 +142,7 @@ class VSStorageRuleCollection(VSApi):
         if not isinstance(newrule,VSStorageRuleNew): raise TypeError("add() accepts only a VSStorageRuleNew object")
         newrule.assert_populated()
 
-        from xml.etree.cElementTree import tostring
+        from xml.etree.ElementTree import tostring
         self.request('/item/{itemid}/shape/{shapeid}/storage-rule'.format(itemid=self.parentshape.parent.name,shapeid=self.parentshape.name),
                      method='PUT',body=tostring(newrule.xmlDOM))
         self.reload()
@@ -188,7 +189,7 @@ class VSStorageRule(VSApi):
             self.content[tagName] = ruleContent
 
     def toXml(self):
-        return ET.tostring(self.dataContent, encoding="UTF-8")
+        return vs_xml.tostring(self.dataContent, encoding="UTF-8")
 
     def isEmpty(self):
         if self.content == {}:
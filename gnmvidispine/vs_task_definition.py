@@ -1,5 +1,6 @@
 import xml.etree.ElementTree as ET
 from .vidispine_api import VSApi,VSException,VSNotFound
+from . import vs_xml
 import json
 import sys
 import os.path
@@ -52,7 +53,8 @@ def serializeXML(info,parentNode,ns=""):
 class VSTaskDefinition(VSApi):
     def populate(self,vsid):
         ns = "{http://xml.vidispine.com/schema/vidispine}"
-        self.dataContent = self.request("/task-definition/{0}".format(vsid))
+        #store() relies on the standard library's serialiser for CDATA, so always work on a standard library tree
+        self.dataContent = vs_xml.to_stdlib(self.request("/task-definition/{0}".format(vsid)))
 
         self.id=vsid
         self.contentDict = {}
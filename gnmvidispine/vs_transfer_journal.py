@@ -0,0 +1,172 @@
+import json
+import os
+import hashlib
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VSTransferJournal(object):
+    """
+    Records the progress of a chunked upload in a local file, so that an interrupted upload can be resumed by sending
+    only the chunks that were not acknowledged.
+
+    The journal file is a line of JSON describing the transfer (transfer id, upload path, total size, chunk size and
+    the identity of the source file, see source_identity) followed by one line for each chunk that the server has accepted.  Lines are only ever appended, so a crash can at
+    worst lose a partially written last line, which is ignored on reading.  The file is removed once the upload has
+    completed.
+
+    journal = VSTransferJournal("/var/tmp/rushes.mov.journal")
+    api.chunked_upload_request(f, size, chunk_size, path, journal=journal)  #if this dies, run it again to resume
+    """
+    def __init__(self, filepath):
+        """
+        Initialise a journal
+        :param filepath: path of the journal file. It does not need to exist.
+        """
+        self.filepath = filepath
+        self.transfer_id = None
+        self.upload_path = None
+        self.total_size = None
+        self.chunk_size = None
+        self.source = None
+        self.acknowledged = set()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def __repr__(self):
+        return "VSTransferJournal({0})".format(self.filepath)
+
+    def _read(self):
+        """
+        Internal method, reads an existing journal file
+        :return: True if a journal was read, False if there is no usable journal
+        """
+        try:
+            with open(self.filepath, "r") as f:
+                lines = f.read().split("\n")
+        except IOError:
+            return False
+
+        try:
+            header = json.loads(lines[0])
+            self.transfer_id = header['transferId']
+            self.upload_path = header['path']
+            self.total_size = int(header['totalSize'])
+            self.chunk_size = int(header['chunkSize'])
+            self.source = header.get('source')
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring unreadable transfer journal {0}: {1}".format(self.filepath, e))
+            return False
+
+        self.acknowledged = set()
+        for line in lines[1:]:
+            try:
+                self.acknowledged.add(int(line))
+            except ValueError:
+                pass    #blank or partially written line
+        return True
+
+    @staticmethod
+    def source_identity(upload_io, chunk_size):
+        """
+        Describes the data being uploaded, so that a journal is not resumed against a file that has been replaced by
+        different content of the same size.  This is the modification time, device and inode of the file if there is
+        one behind upload_io, and a hash of the first chunk.  The position of upload_io is left unchanged.
+        :param upload_io: file-like object that the upload is read from
+        :param chunk_size: size of each chunk, in bytes
+        :return: dictionary that can be stored as JSON
+        """
+        rtn = {}
+        try:
+            stat = os.fstat(upload_io.fileno())
+            rtn['mtime'] = stat.st_mtime_ns
+            rtn['device'] = stat.st_dev
+            rtn['inode'] = stat.st_ino
+        except (AttributeError, OSError, ValueError):
+            pass    #not a real file, e.g. BytesIO
+
+        position = upload_io.tell()
+        try:
+            upload_io.seek(0)
+            rtn['firstChunk'] = hashlib.sha1(upload_io.read(chunk_size)).hexdigest()
+        finally:
+            upload_io.seek(position)
+        return rtn
+
+    def open(self, upload_path, total_size, chunk_size, new_transfer_id, source=None):
+        """
+        Open the journal for a transfer.  If the journal file describes an interrupted upload of the same size, to the
+        same path, in the same chunk size, from the same source, then its transfer id and acknowledged chunks are picked
+        up; otherwise a new journal is started.
+        :param upload_path: path that the chunks are sent to
+        :param total_size: total size of the upload, in bytes
+        :param chunk_size: size of each chunk, in bytes
+        :param new_transfer_id: callable returning a new transfer id, used if the upload can't be resumed
+        :param source: optional identity of the data being uploaded, from source_identity(). If the journal was written
+        for a different source, it is not resumed.
+        :return: the transfer id to use
+        """
+        if self._read() and self.upload_path == upload_path and self.total_size == total_size and \
+                self.chunk_size == chunk_size and self.source == source:
+            logger.info("Resuming transfer {0} with {1} chunks already acknowledged".format(self.transfer_id, len(self.acknowledged)))
+            self._file = open(self.filepath, "a")
+            return self.transfer_id
+
+        self.transfer_id = new_transfer_id()
+        self.upload_path = upload_path
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+        self.source = source
+        self.acknowledged = set()
+        self._file = open(self.filepath, "w")
+        self._file.write(json.dumps({
+            'transferId': self.transfer_id,
+            'path': upload_path,
+            'totalSize': total_size,
+            'chunkSize': chunk_size,
+            'source': source,
+        }) + "\n")
+        self._file.flush()
+        return self.transfer_id
+
+    def is_acknowledged(self, startbyte):
+        """
+        Returns True if the chunk starting at this byte has already been accepted by the server
+        """
+        with self._lock:
+            return startbyte in self.acknowledged
+
+    def acknowledge(self, startbyte):
+        """
+        Record that the chunk starting at this byte has been accepted by the server. Safe to call from several threads.
+        :param startbyte: index of the chunk
+        :return: None
+        """
+        with self._lock:
+            self.acknowledged.add(startbyte)
+            self._file.write("{0}\n".format(startbyte))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        Close the journal file, leaving it in place so that the transfer can be resumed
+        :return: None
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def finish(self):
+        """
+        Close and remove the journal once the transfer has completed
+        :return: None
+        """
+        self.close()
+        try:
+            os.unlink(self.filepath)
+        except OSError as e:
+            logger.warning("Could not remove transfer journal {0}: {1}".format(self.filepath, e))
@@ -0,0 +1,182 @@
+import xml.etree.ElementTree as ET
+from xml.parsers.expat import ExpatError
+import logging
+
+logger = logging.getLogger(__name__)
+
+xmlns = "{http://xml.vidispine.com/schema/vidispine}"
+
+_lxml_etree = None      #lxml.etree, once it has been loaded
+_lxml_parser = None
+_use_lxml = False
+
+parse_errors = (ExpatError, ET.ParseError)
+
+
+def set_backend(name):
+    """
+    Choose the XML parser used for responses from Vidispine.
+    "stdlib" (the default) uses xml.etree.ElementTree.  "lxml" uses lxml.etree, which is considerably faster at
+    parsing large documents and evaluates the precompiled lookups in this module as XPath; it raises ImportError if
+    lxml is not installed.  "auto" uses lxml if it is installed and the standard library if not.
+    Elements from either parser can be used anywhere in this library, as long as new elements are added to them with
+    SubElement() or append() and they are serialised with tostring() from this module.
+    :param name: "stdlib", "lxml" or "auto"
+    :return: name of the backend that is now in use
+    """
+    global _lxml_etree, _lxml_parser, _use_lxml, parse_errors
+    if name == "stdlib":
+        _use_lxml = False
+        return get_backend()
+    if name not in ("lxml", "auto"):
+        raise ValueError("XML backend must be stdlib, lxml or auto, not {0}".format(name))
+
+    if _lxml_etree is None:
+        try:
+            from lxml import etree
+        except ImportError:
+            if name == "auto":
+                logger.info("lxml is not installed, using the standard library XML parser")
+                _use_lxml = False
+                return get_backend()
+            raise
+        _lxml_etree = etree
+        #don't fetch anything from the network or expand entities, and leave out nodes that the stdlib parser would not give us
+        _lxml_parser = etree.XMLParser(resolve_entities=False, no_network=True, remove_comments=True, remove_pis=True,
+                                       huge_tree=True)
+        parse_errors = (ExpatError, ET.ParseError, etree.XMLSyntaxError)
+    _use_lxml = True
+    return get_backend()
+
+
+def get_backend():
+    """
+    Returns the name of the XML parser in use, "stdlib" or "lxml"
+    """
+    return "lxml" if _use_lxml else "stdlib"
+
+
+def is_lxml(node):
+    return _lxml_etree is not None and isinstance(node, _lxml_etree._Element)
+
+
+def fromstring(data):
+    """
+    Parses an XML document with the current backend
+    :param data: XML as bytes or string
+    :return: root element
+    """
+    if not _use_lxml:
+        return ET.fromstring(data)
+    if isinstance(data, str):
+        data = data.encode('utf-8')     #lxml won't parse a string that has an encoding declaration
+    return _lxml_etree.fromstring(data, _lxml_parser)
+
+
+def tostring(element, encoding="utf8"):
+    """
+    Serialises an element from either backend, in the same way as ElementTree.tostring
+    """
+    if is_lxml(element):
+        if encoding == "unicode":
+            return _lxml_etree.tostring(element, encoding=str)
+        return _lxml_etree.tostring(element, encoding=encoding, xml_declaration=encoding.lower() not in ("utf-8", "us-ascii"))
+    return ET.tostring(element, encoding)
+
+
+def SubElement(parent, tag, attrib={}):
+    """
+    Adds a new child element to an element from either backend, in the same way as ElementTree.SubElement
+    """
+    if is_lxml(parent):
+        return _lxml_etree.SubElement(parent, tag, attrib)
+    return ET.SubElement(parent, tag, attrib)
+
+
+def append(parent, child):
+    """
+    Appends an element to one from either backend, converting it first if it came from the other backend
+    """
+    if is_lxml(parent) != is_lxml(child):
+        child = _lxml_etree.fromstring(ET.tostring(child)) if is_lxml(parent) else to_stdlib(child)
+    parent.append(child)
+
+
+def to_stdlib(element):
+    """
+    Returns an element from either backend as an xml.etree.ElementTree element, for code that relies on the standard
+    library's implementation. Standard library elements are returned unchanged.
+    """
+    if is_lxml(element):
+        return ET.fromstring(_lxml_etree.tostring(element))
+    return element
+
+
+def element_like(node, tag, attrib={}):
+    """
+    Creates a new element from the same backend as an existing one, so that the existing one can be appended to it
+    """
+    if is_lxml(node):
+        return _lxml_etree.Element(tag, attrib)
+    return ET.Element(tag, attrib)
+
+
+def pull_parser(events=("start", "end")):
+    """
+    Returns an incremental parser for the current backend, with the same interface as ElementTree.XMLPullParser
+    """
+    if _use_lxml:
+        return _lxml_etree.XMLPullParser(events=events, resolve_entities=False, no_network=True, remove_comments=True,
+                                         remove_pis=True, huge_tree=True)
+    return ET.XMLPullParser(events=events)
+
+
+class Path(object):
+    """
+    A lookup of child elements, with the namespace filled in once rather than formatted on every call.
+
+    Paths are written in ElementPath syntax with {0} standing for the Vidispine namespace, and work on elements from
+    either backend.  Standard library elements are searched with ElementPath, which caches its own compiled form of
+    the path; lxml elements are searched with an XPath expression that is compiled the first time it is used.
+
+    _timespans = Path('{0}item/{0}metadata/{0}timespan')
+    for ts in _timespans.findall(doc):
+        ...
+    """
+    def __init__(self, path, ns=xmlns):
+        self.path = path.format(ns)
+        self._xpath = None
+
+    def __repr__(self):
+        return "Path({0})".format(self.path)
+
+    def _compiled(self):
+        if self._xpath is None:
+            self._xpath = _lxml_etree.ETXPath(self.path)
+        return self._xpath
+
+    def findall(self, node):
+        """
+        Returns a list of the matching elements under node
+        """
+        if is_lxml(node):
+            return self._compiled()(node)
+        return node.findall(self.path)
+
+    def find(self, node):
+        """
+        Returns the first matching element under node, or None
+        """
+        if is_lxml(node):
+            matches = self._compiled()(node)
+            return matches[0] if len(matches) > 0 else None
+        return node.find(self.path)
+
+    def findtext(self, node, default=None):
+        """
+        Returns the text of the first matching element under node, or default if there is not one
+        """
+        match = self.find(node)
+        if match is None:
+            return default
+        return match.text if match.text is not None else ""
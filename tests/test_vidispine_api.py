@@ -174,8 +174,10 @@ class TestVSApi(unittest2.TestCase):
         test the exponential backoff/retry if server not available
         :return:
         """
-        from gnmvidispine.vidispine_api import VSApi,HTTPError
-        from time import time
+        from gnmvidispine.vidispine_api import VSApi,HTTPError,VSCircuitOpenError
+        from gnmvidispine.vs_resilience import VSHostHealth, get_host_health, clear_host_health
+        self.addCleanup(clear_host_health)
+        clear_host_health()
         
         conn = http.client.HTTPConnection(host=self.fake_host, port=self.fake_port)
         conn.request = MagicMock()
@@ -190,11 +192,9 @@ class TestVSApi(unittest2.TestCase):
         api.retry_delay=1
         api.retry_attempts=5
         
-        start_time = time()
-        with self.assertRaises(HTTPError) as cm:
-            api.request("/path/to/endpoint", method="GET")
-
-        end_time = time()
+        with patch('gnmvidispine.vidispine_api.sleep') as mock_sleep:   #don't really wait
+            with self.assertRaises(HTTPError) as cm:
+                api.request("/path/to/endpoint", method="GET")
 
         authstring = u"{0}:{1}".format(self.fake_user, self.fake_passwd)
         computed_auth = base64.b64encode(authstring.encode("UTF-8"))
@@ -203,9 +203,20 @@ class TestVSApi(unittest2.TestCase):
         conn.getresponse.assert_called_with()
 
         self.assertEqual(cm.exception.code, 503)
-        self.assertGreaterEqual(end_time - start_time, api.retry_delay * api.retry_attempts)
-        
-        logger.warning.assert_called_with('Server not available error when contacting Vidispine. Waiting 1s before retry.')
+        #the circuit breaker opened after failure_threshold errors, so the remaining attempts were not sent
+        self.assertIsInstance(cm.exception, VSCircuitOpenError)
+        self.assertEqual(conn.getresponse.call_count, VSHostHealth.failure_threshold)
+        self.assertEqual(get_host_health(self.fake_host, self.fake_port).snapshot()['state'], VSHostHealth.OPEN)
+
+        #each wait should be at least half of the exponential delay for that attempt
+        delays = [c[0][0] for c in mock_sleep.call_args_list]
+        self.assertEqual(len(delays), 6)
+        for n, delay in enumerate(delays[0:4]):
+            self.assertGreaterEqual(delay, api.retry_delay * (2 ** n) / 2.0)
+            self.assertLessEqual(delay, api.retry_delay * (2 ** n))
+        self.assertGreaterEqual(delays[5], VSHostHealth.reset_timeout - 1)
+
+        self.assertTrue(logger.warning.call_args[0][0].startswith('Server not available error when contacting Vidispine. Waiting '))
         self.assertEqual(logger.warning.call_count, 6)
         
         logger.error.assert_called_with('Did not work after 5 retries, giving up')
@@ -263,8 +274,7 @@ class TestVSApi(unittest2.TestCase):
             """
             mock object to return a known id. used via mock.patch below.
             """
-            def get_hex(self):
-                return 'fa6032d61c7b4db19425c6404ea7b822'
+            hex = 'fa6032d61c7b4db19425c6404ea7b822'
             
         with tempfile.TemporaryFile() as f:
             filecontent = bytes(urandom(testfilesize))
@@ -297,6 +307,177 @@ class TestVSApi(unittest2.TestCase):
 
                 self.assertEqual(api.raw_request.call_count, 100)
 
+    def test_chunked_upload_parallel(self):
+        """
+        chunks should be uploaded in parallel when concurrency is set, and a failed chunk retried on its own
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi, HTTPError
+        import threading
+
+        api = VSApi(user=self.fake_user, passwd=self.fake_passwd, logger=MagicMock())
+        api.chunk_retry_delay = 0
+        received = {}
+        failed = []
+        lock = threading.Lock()
+
+        def fake_raw_request(path, method, matrix, query, body, content_type, rawData, extra_headers):
+            with lock:
+                if extra_headers['index'] == 5000 and len(failed) == 0:
+                    failed.append(extra_headers['index'])
+                    raise HTTPError(500, method, path, 500, "Internal Server Error", "")
+                received[extra_headers['index']] = (bytes(body), query['transferId'], extra_headers['size'])
+
+        api.raw_request = MagicMock(side_effect=fake_raw_request)
+
+        class FakeUuid4(object):
+            hex = 'fa6032d61c7b4db19425c6404ea7b822'
+
+        with tempfile.TemporaryFile() as f:
+            filecontent = bytes(urandom(100000))
+            f.write(filecontent)
+            with patch('uuid.uuid4', side_effect=lambda: FakeUuid4()):
+                api.chunked_upload_request(f, 100000, 1000, '/API/fakeupload', method="POST", concurrency=4)
+
+        self.assertEqual(failed, [5000])
+        self.assertEqual(api.raw_request.call_count, 101)
+        self.assertEqual(sorted(received.keys()), list(range(0, 100000, 1000)))
+        for byteindex, (body, transfer_id, size) in received.items():
+            self.assertEqual(body, filecontent[byteindex:byteindex+1000])
+            self.assertEqual(transfer_id, 'fa6032d61c7b4db19425c6404ea7b822')
+            self.assertEqual(size, 100000)
+
+    def test_chunked_upload_zero_copy(self):
+        """
+        chunks of a real file should be sent as views onto a memory map of it, and passed to the connection unchanged
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=lambda: self.MockedResponse(200, ""))
+        api = VSApi(user=self.fake_user, passwd=self.fake_passwd, conn=conn, logger=MagicMock())
+
+        with tempfile.TemporaryFile() as f:
+            filecontent = bytes(urandom(2500))
+            f.write(filecontent)
+            api.chunked_upload_request(f, 2500, 1000, '/fakeupload', method="POST", content_type='application/xml')
+
+        sent_bodies = [c[0][2] for c in conn.request.call_args_list]
+        self.assertEqual(len(sent_bodies), 3)
+        for n, body in enumerate(sent_bodies):
+            self.assertIsInstance(body, memoryview)
+            self.assertEqual(body, filecontent[n*1000:(n+1)*1000])
+
+    def test_chunked_upload_resume(self):
+        """
+        an interrupted upload with a journal should resume with the same transfer id, sending only the missing chunks
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi, HTTPError
+        from gnmvidispine.vs_transfer_journal import VSTransferJournal
+        import os.path
+
+        api = VSApi(user=self.fake_user, passwd=self.fake_passwd, logger=MagicMock())
+        api.chunk_retry_attempts = 0
+
+        def failing_raw_request(path, method, matrix, query, body, content_type, rawData, extra_headers):
+            if extra_headers['index'] == 3000:
+                raise HTTPError(500, method, path, 500, "Internal Server Error", "")
+
+        tempdir = tempfile.mkdtemp()
+        journal_path = os.path.join(tempdir, "upload.journal")
+        with tempfile.TemporaryFile() as f:
+            f.write(bytes(urandom(10000)))
+
+            api.raw_request = MagicMock(side_effect=failing_raw_request)
+            with self.assertRaises(HTTPError):
+                api.chunked_upload_request(f, 10000, 1000, '/API/fakeupload', method="POST", journal=VSTransferJournal(journal_path))
+            first_transfer_id = api.raw_request.call_args[1]['query']['transferId']
+            self.assertTrue(os.path.exists(journal_path))
+
+            api.raw_request = MagicMock()
+            journal = VSTransferJournal(journal_path)
+            api.chunked_upload_request(f, 10000, 1000, '/API/fakeupload', method="POST", journal=journal)
+
+        self.assertEqual(journal.transfer_id, first_transfer_id)
+        self.assertEqual([c[1]['extra_headers']['index'] for c in api.raw_request.call_args_list], list(range(3000, 10000, 1000)))
+        for c in api.raw_request.call_args_list:
+            self.assertEqual(c[1]['query']['transferId'], first_transfer_id)
+        self.assertFalse(os.path.exists(journal_path))
+        os.rmdir(tempdir)
+
+    def test_chunked_upload_changed_source(self):
+        """
+        a journal should not be resumed if the file has been modified since, even if its size is the same
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi, HTTPError
+        from gnmvidispine.vs_transfer_journal import VSTransferJournal
+        import os.path
+
+        api = VSApi(user=self.fake_user, passwd=self.fake_passwd, logger=MagicMock())
+        api.chunk_retry_attempts = 0
+
+        def failing_raw_request(path, method, matrix, query, body, content_type, rawData, extra_headers):
+            if extra_headers['index'] == 3000:
+                raise HTTPError(500, method, path, 500, "Internal Server Error", "")
+
+        tempdir = tempfile.mkdtemp()
+        journal_path = os.path.join(tempdir, "upload.journal")
+        source_path = os.path.join(tempdir, "source.dat")
+        with open(source_path, "wb") as f:
+            f.write(bytes(urandom(10000)))
+
+        with open(source_path, "rb") as f:
+            api.raw_request = MagicMock(side_effect=failing_raw_request)
+            with self.assertRaises(HTTPError):
+                api.chunked_upload_request(f, 10000, 1000, '/API/fakeupload', method="POST", journal=VSTransferJournal(journal_path))
+            first_transfer_id = api.raw_request.call_args[1]['query']['transferId']
+
+        #same size and first chunk, different content further in
+        with open(source_path, "r+b") as f:
+            f.seek(9000)
+            f.write(bytes(urandom(1000)))
+        stat = os.stat(source_path)
+        os.utime(source_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+        with open(source_path, "rb") as f:
+            api.raw_request = MagicMock()
+            journal = VSTransferJournal(journal_path)
+            api.chunked_upload_request(f, 10000, 1000, '/API/fakeupload', method="POST", journal=journal)
+
+        self.assertNotEqual(journal.transfer_id, first_transfer_id)
+        self.assertEqual([c[1]['extra_headers']['index'] for c in api.raw_request.call_args_list], list(range(0, 10000, 1000)))
+        self.assertFalse(os.path.exists(journal_path))
+        os.unlink(source_path)
+        os.rmdir(tempdir)
+
+    def test_stream_bad_status_line(self):
+        """
+        stream_request should retry a bad status line in the same way as request()
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_resilience import clear_host_health
+        from http.client import BadStatusLine
+        import io
+        self.addCleanup(clear_host_health)
+
+        body = io.BytesIO(b"""<?xml version="1.0"?><FileListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+        <file><id>VX-1</id></file><file><id>VX-2</id></file></FileListDocument>""")
+        response = MagicMock(status=200)
+        response.read = MagicMock(side_effect=body.read)
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=[BadStatusLine("''"), response])
+        api = VSApi(user=self.fake_user, passwd=self.fake_passwd, conn=conn, logger=MagicMock())
+
+        with patch('gnmvidispine.vidispine_api.sleep') as mock_sleep:
+            ids = [f.find('{http://xml.vidispine.com/schema/vidispine}id').text for f in api.stream_request("/storage/VX-1/file")]
+        self.assertEqual(ids, ["VX-1", "VX-2"])
+        self.assertEqual(conn.request.call_count, 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+
     def test_reuse(self):
         from gnmvidispine.vidispine_api import VSApi
         conn = http.client.HTTPConnection(host='localhost',port=8080)
@@ -0,0 +1,273 @@
+# *-* coding: UTF-8 --*
+
+import unittest2
+from mock import MagicMock, patch
+import asyncio
+import base64
+
+
+class TestAsyncVSApi(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    sample_returned_xml = b"""<?xml version="1.0"?>
+    <root xmlns="http://xml.vidispine.com/schema/vidispine">
+      <element>string</element>
+    </root>"""
+
+    @staticmethod
+    def run_coroutine(coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    @staticmethod
+    def make_roundtrip(*responses):
+        """
+        returns a mock for AsyncVSApi._roundtrip that returns the given AsyncResponses in order
+        """
+        calls = []
+        responses = list(responses)
+
+        async def fake_roundtrip(method, url, body, headers):
+            calls.append((method, url, body, headers))
+            return responses.pop(0)
+        return fake_roundtrip, calls
+
+    def test_get(self):
+        """
+        a GET request should be encoded and authorised in the same way as VSApi
+        :return:
+        """
+        from gnmvidispine.vidispine_async import AsyncVSApi, AsyncResponse
+        api = AsyncVSApi(user=self.fake_user, passwd=self.fake_passwd)
+        api._roundtrip, calls = self.make_roundtrip(AsyncResponse(200, "OK", {}, self.sample_returned_xml))
+
+        parsed_xml = self.run_coroutine(api.request("/path/to/endpoint", matrix={'mtx1': 'value 1'}, query={'q': ['a', 'b']}))
+
+        computed_auth = base64.b64encode(u"{0}:{1}".format(self.fake_user, self.fake_passwd).encode("UTF-8"))
+        self.assertEqual(calls, [('GET', '/API/path/to/endpoint;mtx1=value%201?q=a&q=b', None,
+                                  {'Authorization': "Basic " + computed_auth.decode("UTF-8"), 'Accept': 'application/xml'})])
+        self.assertEqual(parsed_xml.find('{http://xml.vidispine.com/schema/vidispine}element').text, "string")
+
+    def test_404(self):
+        from gnmvidispine.vidispine_async import AsyncVSApi, AsyncResponse
+        from gnmvidispine.vidispine_api import VSNotFound
+        exception_response = b"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<ExceptionDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <notFound>
+    <type>Item</type>
+    <id>SD-46362</id>
+  </notFound>
+</ExceptionDocument>"""
+        api = AsyncVSApi(user=self.fake_user, passwd=self.fake_passwd)
+        api._roundtrip, calls = self.make_roundtrip(AsyncResponse(404, "Not Found", {}, exception_response))
+
+        with self.assertRaises(VSNotFound) as ex:
+            self.run_coroutine(api.request("/item/SD-46362/metadata"))
+        self.assertEqual("SD-46362", ex.exception.exceptionID)
+
+    def test_503(self):
+        """
+        503 errors should be retried up to retry_attempts times
+        :return:
+        """
+        from gnmvidispine.vidispine_async import AsyncVSApi, AsyncResponse
+        from gnmvidispine.vidispine_api import HTTPError
+        from gnmvidispine.vs_resilience import clear_host_health
+        self.addCleanup(clear_host_health)
+        api = AsyncVSApi(user=self.fake_user, passwd=self.fake_passwd, logger=MagicMock())
+        api.retry_delay = 0
+        api.retry_attempts = 2
+        api._roundtrip, calls = self.make_roundtrip(*[AsyncResponse(503, "Unavailable", {}, b"") for n in range(0, 3)])
+
+        with self.assertRaises(HTTPError) as ex:
+            self.run_coroutine(api.request("/path/to/endpoint"))
+        self.assertEqual(ex.exception.code, 503)
+        self.assertEqual(len(calls), 3)
+
+    def test_raw_str_body(self):
+        """
+        a str body sent as raw data should be encoded rather than passed to the transport as text
+        :return:
+        """
+        from gnmvidispine.vidispine_async import AsyncVSApi, AsyncResponse
+        api = AsyncVSApi(user=self.fake_user, passwd=self.fake_passwd)
+        api._roundtrip, calls = self.make_roundtrip(AsyncResponse(200, "OK", {}, b""))
+
+        self.run_coroutine(api.raw_request("/path/to/endpoint", method="PUT", body=u"caf\u00e9", rawData=True))
+        self.assertEqual(calls[0][2], u"caf\u00e9".encode("UTF-8"))
+
+    def test_redirect(self):
+        """
+        a 303 response should be followed to its location, as VSApi does
+        :return:
+        """
+        from gnmvidispine.vidispine_async import AsyncVSApi, AsyncResponse
+        api = AsyncVSApi(user=self.fake_user, passwd=self.fake_passwd)
+        api._roundtrip, calls = self.make_roundtrip(AsyncResponse(303, "See Other", {'location': '/API/other/endpoint'}, b""),
+                                                    AsyncResponse(200, "OK", {}, self.sample_returned_xml))
+
+        parsed_xml = self.run_coroutine(api.request("/path/to/endpoint"))
+        self.assertEqual([c[1] for c in calls], ['/API/path/to/endpoint', '/API/other/endpoint'])
+        self.assertEqual(parsed_xml.find('{http://xml.vidispine.com/schema/vidispine}element').text, "string")
+
+    def test_bad_status_line(self):
+        """
+        a malformed status line should be retried up to retry_attempts times, as VSApi does
+        :return:
+        """
+        from gnmvidispine.vidispine_async import AsyncVSApi, AsyncResponse
+        from gnmvidispine.vs_resilience import clear_host_health
+        import http.client
+        self.addCleanup(clear_host_health)
+        api = AsyncVSApi(user=self.fake_user, passwd=self.fake_passwd, logger=MagicMock())
+        api.retry_delay = 0
+        api.retry_attempts = 2
+        responses = [http.client.BadStatusLine("garbage"), AsyncResponse(200, "OK", {}, self.sample_returned_xml)]
+        calls = []
+
+        async def fake_roundtrip(method, url, body, headers):
+            calls.append(url)
+            rtn = responses.pop(0)
+            if isinstance(rtn, Exception):
+                raise rtn
+            return rtn
+        api._roundtrip = fake_roundtrip
+
+        parsed_xml = self.run_coroutine(api.request("/path/to/endpoint"))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(parsed_xml.find('{http://xml.vidispine.com/schema/vidispine}element').text, "string")
+
+    def test_rate_limit(self):
+        """
+        requests should count against the shared per-host rate limiter while they are in flight
+        :return:
+        """
+        from gnmvidispine.vidispine_async import AsyncVSApi, AsyncResponse
+        from gnmvidispine.vs_rate_limit import clear_rate_limiters
+        self.addCleanup(clear_rate_limiters)
+        api = AsyncVSApi(user=self.fake_user, passwd=self.fake_passwd)
+        limiter = api._rate_limiter()
+        limiter.set_limit("/item", max_in_flight=1)
+        seen = []
+
+        async def fake_roundtrip(method, url, body, headers):
+            seen.append(limiter.in_flight)
+            return AsyncResponse(200, "OK", {}, self.sample_returned_xml)
+        api._roundtrip = fake_roundtrip
+
+        async def run_test():
+            await asyncio.gather(api.request("/item/VX-1"), api.request("/item/VX-2"))
+
+        self.run_coroutine(run_test())
+        self.assertEqual(seen, [1, 1])
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.peak_in_flight, 1)
+
+    def test_roundtrip(self):
+        """
+        test the transport against a local server, with a chunked response followed by a re-used connection
+        :return:
+        """
+        from gnmvidispine.vidispine_async import AsyncVSApi
+        received = []
+
+        async def handle(reader, writer):
+            for n in range(0, 2):
+                request = await reader.readuntil(b"\r\n\r\n")
+                received.append(request)
+                if n == 0:
+                    writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\n<root\r\n2\r\n/>\r\n0\r\n\r\n")
+                else:
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 7\r\n\r\n<root/>")
+                await writer.drain()
+            writer.close()
+
+        async def run_test():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            api = AsyncVSApi(host="127.0.0.1", port=port, user=self.fake_user, passwd=self.fake_passwd)
+            first = await api.raw_request("/first")
+            second = await api.raw_request("/second")
+            await api.close()
+            server.close()
+            await server.wait_closed()
+            return first, second
+
+        first, second = self.run_coroutine(run_test())
+        self.assertEqual(first, b"<root/>")
+        self.assertEqual(second, b"<root/>")
+        self.assertTrue(received[0].startswith(b"GET /API/first HTTP/1.1\r\n"))
+        self.assertTrue(received[1].startswith(b"GET /API/second HTTP/1.1\r\n"))
+
+    def test_stale_connection(self):
+        """
+        if the server has closed an idle pooled connection, the request should be sent again on a new connection
+        without counting as a failure of the host
+        :return:
+        """
+        from gnmvidispine.vidispine_async import AsyncVSApi
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_resilience import clear_host_health
+        self.addCleanup(clear_host_health)
+        received = []
+        metrics = MagicMock()
+
+        async def handle(reader, writer):
+            request = await reader.readuntil(b"\r\n\r\n")
+            received.append(request)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 7\r\n\r\n<root/>")
+            await writer.drain()
+            writer.close()
+
+        async def run_test():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            api = AsyncVSApi(host="127.0.0.1", port=port, user=self.fake_user, passwd=self.fake_passwd)
+            health = api._host_health()
+            with patch.object(health, 'record_failure') as mock_failure, patch.object(VSApi, 'metrics', metrics):
+                first = await api.raw_request("/first")
+                await asyncio.sleep(0.1)
+                second = await api.raw_request("/second")
+            await api.close()
+            server.close()
+            await server.wait_closed()
+            return first, second, mock_failure
+
+        first, second, mock_failure = self.run_coroutine(run_test())
+        self.assertEqual(first, b"<root/>")
+        self.assertEqual(second, b"<root/>")
+        self.assertEqual(len(received), 2)
+        self.assertTrue(received[1].startswith(b"GET /API/second HTTP/1.1\r\n"))
+        mock_failure.assert_not_called()
+        metrics.record_retry.assert_called_once_with('GET', '/API/second', 'connection_reuse', 0)
+
+    def test_item_populate_async(self):
+        from gnmvidispine.vidispine_async import AsyncVSApi, AsyncResponse
+        from gnmvidispine.vs_item import VSItem
+        testdoc = b"""<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1234">
+    <metadata>
+      <timespan start="-INF" end="+INF">
+        <field>
+          <name>title</name>
+          <value>Test item</value>
+        </field>
+      </timespan>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+        api = AsyncVSApi(user=self.fake_user, passwd=self.fake_passwd)
+        api._roundtrip, calls = self.make_roundtrip(AsyncResponse(200, "OK", {}, testdoc))
+
+        i = VSItem(user=self.fake_user, passwd=self.fake_passwd)
+        self.run_coroutine(i.populate_async(api, "VX-1234", specificFields=['title']))
+        self.assertEqual(calls[0][1], "/API/item/VX-1234/metadata;field=title")
+        self.assertEqual(i.name, "VX-1234")
+        self.assertEqual(i.get('title'), "Test item")
@@ -0,0 +1,104 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+from mock import MagicMock, patch
+import xml.etree.ElementTree as ET
+
+
+class TestVSMetadataCache(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    testdoc = """<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1234">
+    <metadata>
+      <timespan start="-INF" end="+INF">
+        <field>
+          <name>title</name>
+          <value>Test item</value>
+        </field>
+      </timespan>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+
+    def test_lru(self):
+        """
+        the least recently used entry should be dropped when the cache is full
+        :return:
+        """
+        from gnmvidispine.vs_cache import VSMetadataCache, cache_key
+        cache = VSMetadataCache(maxsize=2)
+
+        cache.put(cache_key("item", "VX-1"), ET.Element("one"))
+        cache.put(cache_key("item", "VX-2"), ET.Element("two"))
+        self.assertEqual(cache.get(cache_key("item", "VX-1")).tag, "one")
+        cache.put(cache_key("item", "VX-3"), ET.Element("three"))
+
+        self.assertIsNone(cache.get(cache_key("item", "VX-2")))
+        self.assertEqual(cache.get(cache_key("item", "VX-1")).tag, "one")
+        self.assertEqual(cache.get(cache_key("item", "VX-3")).tag, "three")
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl(self):
+        """
+        entries should not be returned once they have expired
+        :return:
+        """
+        from gnmvidispine.vs_cache import VSMetadataCache, cache_key
+        cache = VSMetadataCache(ttl=10)
+
+        with patch('gnmvidispine.vs_cache.time', return_value=100):
+            cache.put(cache_key("item", "VX-1"), ET.Element("one"))
+        with patch('gnmvidispine.vs_cache.time', return_value=109):
+            self.assertIsNotNone(cache.get(cache_key("item", "VX-1")))
+        with patch('gnmvidispine.vs_cache.time', return_value=110):
+            self.assertIsNone(cache.get(cache_key("item", "VX-1")))
+        self.assertEqual(cache.stats()['expired'], 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        """
+        invalidate() should drop an entity whatever field list it was cached with, and nothing else
+        :return:
+        """
+        from gnmvidispine.vs_cache import VSMetadataCache, cache_key
+        cache = VSMetadataCache()
+
+        cache.put(cache_key("item", "VX-1"), ET.Element("all"))
+        cache.put(cache_key("item", "VX-1", ["title"]), ET.Element("title"))
+        cache.put(cache_key("item", "VX-2"), ET.Element("other"))
+        cache.invalidate("item", "VX-1")
+
+        self.assertIsNone(cache.get(cache_key("item", "VX-1")))
+        self.assertIsNone(cache.get(cache_key("item", "VX-1", ("title",))))
+        self.assertIsNotNone(cache.get(cache_key("item", "VX-2")))
+
+    def test_item_populate(self):
+        """
+        VSItem.populate should use the cache if one is set, and set_metadata should invalidate it
+        :return:
+        """
+        from gnmvidispine.vs_item import VSItem
+        from gnmvidispine.vs_cache import VSMetadataCache
+
+        cache = VSMetadataCache()
+        with patch('gnmvidispine.vs_item.VSItem.metadata_cache', cache):
+            with patch('gnmvidispine.vs_item.VSItem.request', side_effect=lambda *args, **kwargs: ET.fromstring(self.testdoc)) as mock_request:
+                i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+                i.populate("VX-1234", specificFields=['title'])
+                i.contentDict['title'] = "changed locally"
+                i.dataContent.find('{http://xml.vidispine.com/schema/vidispine}item').attrib['id'] = "VX-changed"
+
+                j = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+                j.populate("VX-1234", specificFields=['title'])
+                self.assertEqual(mock_request.call_count, 1)
+                self.assertEqual(j.name, "VX-1234")
+                self.assertEqual(j.get('title'), "Test item")
+
+                j.set_metadata({'title': 'new title'})
+                self.assertEqual(mock_request.call_count, 2)
+                j.populate("VX-1234", specificFields=['title'])
+                self.assertEqual(mock_request.call_count, 3)
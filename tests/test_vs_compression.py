@@ -0,0 +1,91 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import gzip
+import zlib
+from mock import MagicMock, patch
+
+
+class TestVSCompression(unittest2.TestCase):
+    class MockedResponse(object):
+        def __init__(self, status_code, content, reason="", headers=None):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+            self.headers = headers if headers is not None else {}
+            self.position = 0
+
+        def getheader(self, name, default=None):
+            return self.headers.get(name, default)
+
+        def read(self, amt=None):
+            if amt is None:
+                amt = len(self.body) - self.position
+            data = self.body[self.position:self.position+amt]
+            self.position += len(data)
+            return data
+
+    testdoc = b"""<?xml version="1.0" encoding="UTF-8"?>
+<FileListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+""" + b"".join([b"<file><id>VX-%d</id><path>some/long/path/to/a/file/called/file%d.mxf</path></file>\n" % (n, n) for n in range(0, 500)]) + b"""</FileListDocument>"""
+
+    def test_streaming_decompression(self):
+        """
+        DecompressingResponse should return the original data whether read in one go or in small pieces, for gzip,
+        zlib-wrapped deflate and raw deflate
+        :return:
+        """
+        from gnmvidispine.vs_compression import DecompressingResponse
+        raw_deflate = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        bodies = [
+            ("gzip", gzip.compress(self.testdoc)),
+            ("deflate", zlib.compress(self.testdoc)),
+            ("deflate", raw_deflate.compress(self.testdoc) + raw_deflate.flush()),
+        ]
+        for encoding, body in bodies:
+            response = DecompressingResponse(self.MockedResponse(200, body), encoding)
+            self.assertEqual(response.read(), self.testdoc)
+
+            response = DecompressingResponse(self.MockedResponse(200, body), encoding)
+            response.chunk_size = 100
+            pieces = []
+            while True:
+                piece = response.read(1000)
+                if not piece:
+                    break
+                self.assertLessEqual(len(piece), 1000)
+                pieces.append(piece)
+            self.assertEqual(b"".join(pieces), self.testdoc)
+            self.assertEqual(response.status, 200)
+
+    def test_request_compressed(self):
+        """
+        with compress_responses set, request() should ask for compression and parse a gzipped response
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        conn = MagicMock()
+        conn.getresponse = MagicMock(return_value=self.MockedResponse(200, gzip.compress(self.testdoc),
+                                                                      headers={'Content-Encoding': 'gzip'}))
+        api = VSApi(host="localhost", user="username", passwd="password", conn=conn, logger=MagicMock())
+        api.compress_responses = True
+
+        result = api.request("/storage/VX-1/file")
+        self.assertEqual(len(result), 500)
+        self.assertEqual(conn.request.call_args[0][3]['Accept-Encoding'], "gzip, deflate")
+
+    def test_stream_request_compressed(self):
+        """
+        stream_request should parse a compressed response as it is decompressed
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        conn = MagicMock()
+        conn.getresponse = MagicMock(return_value=self.MockedResponse(200, gzip.compress(self.testdoc),
+                                                                      headers={'Content-Encoding': 'gzip'}))
+        api = VSApi(host="localhost", user="username", passwd="password", conn=conn, logger=MagicMock())
+        api.compress_responses = True
+        api.stream_chunk_size = 512
+
+        ids = [f.find('{http://xml.vidispine.com/schema/vidispine}id').text
+               for f in api.stream_request("/storage/VX-1/file", clear=False)]
+        self.assertEqual(ids, ["VX-%d" % n for n in range(0, 500)])
@@ -0,0 +1,188 @@
+# *-* coding: UTF-8 --*
+
+import unittest2
+from mock import MagicMock, patch
+
+
+class TestVSConnectionPool(unittest2.TestCase):
+    class MockedResponse(object):
+        def __init__(self, status_code, content, reason=""):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+
+        def read(self):
+            return self.body
+
+    def test_reuse(self):
+        """
+        a released connection should be handed out again by the next acquire
+        :return:
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        factory = MagicMock(side_effect=lambda host, port: MagicMock())
+        pool = VSConnectionPool("localhost", 8080, connection_factory=factory)
+
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertEqual(pool.acquire(), conn)
+        self.assertEqual(factory.call_count, 1)
+        self.assertEqual(pool.stats()['hits'], 1)
+        self.assertEqual(pool.stats()['misses'], 1)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_maxsize(self):
+        """
+        connections released into a full pool should be closed
+        :return:
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        pool = VSConnectionPool("localhost", 8080, maxsize=1, connection_factory=lambda host, port: MagicMock())
+
+        first = pool.acquire()
+        second = pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        first.close.assert_not_called()
+        second.close.assert_called_once_with()
+        self.assertEqual(pool.stats()['idle'], 1)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_reap(self):
+        """
+        connections that have been idle for too long should be closed rather than re-used
+        :return:
+        """
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        pool = VSConnectionPool("localhost", 8080, idle_timeout=10, connection_factory=lambda host, port: MagicMock())
+
+        with patch('gnmvidispine.vs_connection_pool.time', return_value=100):
+            stale = pool.acquire()
+            pool.release(stale)
+        with patch('gnmvidispine.vs_connection_pool.time', return_value=111):
+            fresh = pool.acquire()
+
+        self.assertNotEqual(stale, fresh)
+        stale.close.assert_called_once_with()
+        self.assertEqual(pool.stats()['reaped'], 1)
+
+    def test_shared_pool(self):
+        """
+        VSApi objects with the same connection settings should share a pool
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_connection_pool import get_pool
+
+        a = VSApi(host="pooltest", port=8080, user="username", passwd="password")
+        b = VSApi(host="pooltest", port=8080, user="username", passwd="password")
+        c = VSApi(host="pooltest", port=8080, user="otheruser", passwd="password")
+        self.assertIs(a._pool, b._pool)
+        self.assertIsNot(a._pool, c._pool)
+        self.assertIs(a._pool, get_pool("pooltest", 8080, "username", "password"))
+
+    def test_request_returns_connection(self):
+        """
+        raw_request should hand the connection back to the pool once the response has been read
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi, VSNotFound
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=[self.MockedResponse(200, "<root/>"), self.MockedResponse(404, "")])
+        pool = VSConnectionPool("localhost", 8080, connection_factory=lambda host, port: conn)
+
+        api = VSApi(user="username", passwd="password", pool=pool)
+        api.raw_request("/path/to/endpoint")
+        self.assertEqual(pool.stats()['idle'], 1)
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+        with self.assertRaises(Exception):
+            api.raw_request("/path/to/endpoint")
+        self.assertEqual(pool.stats()['idle'], 1)
+        self.assertEqual(pool.stats()['hits'], 1)
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+    def test_previous_connection(self):
+        """
+        if a response was handed to the caller, its connection should go back to the pool once the response has been
+        read, or have its socket closed if the caller is still reading from it
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        from gnmvidispine.vs_resilience import clear_host_health
+        self.addCleanup(clear_host_health)
+        response = MagicMock(status=200)
+
+        def make_connection(host, port):
+            conn = MagicMock()
+            conn.getresponse.return_value = response
+            return conn
+        pool = VSConnectionPool("localhost", 8080, connection_factory=make_connection)
+        api = VSApi(user="username", passwd="password", pool=pool)
+
+        response.isclosed.return_value = True
+        api.sendAuthorized('GET', '/API/storage/file/VX-1/data', '', {'Accept': '*'})
+        first = api._current_connection()
+        api.sendAuthorized('GET', '/API/storage/file/VX-1/data', '', {'Accept': '*'})
+        self.assertIs(api._current_connection(), first)
+        self.assertEqual(pool.stats()['hits'], 1)
+        self.assertEqual(pool.stats()['discarded'], 0)
+
+        response.isclosed.return_value = False
+        sock = first.sock
+        api.sendAuthorized('GET', '/API/storage/file/VX-1/data', '', {'Accept': '*'})
+        self.assertIsNot(api._current_connection(), first)
+        sock.close.assert_called_once_with()
+        first.close.assert_not_called()
+        self.assertIsNone(first.sock)
+        self.assertEqual(pool.stats()['discarded'], 1)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_stale_connections(self):
+        """
+        a pooled connection that the server has closed should be retried on a new connection straight away, without
+        counting as a failure of the host; only a failure on the new connection should count
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+        from gnmvidispine.vs_resilience import VSHostHealth, get_host_health, clear_host_health
+        from http.client import RemoteDisconnected
+        self.addCleanup(clear_host_health)
+
+        def stale_connection():
+            conn = MagicMock()
+            conn.getresponse = MagicMock(side_effect=RemoteDisconnected("Remote end closed connection without response"))
+            return conn
+
+        def fresh_connection():
+            conn = MagicMock(sock=None)
+            conn.getresponse = MagicMock(return_value=self.MockedResponse(200, "<root/>"))
+            return conn
+
+        stale = [stale_connection() for n in range(0, 6)]
+        made = list(stale)
+        pool = VSConnectionPool("stalehost", 8080, connection_factory=lambda host, port: made.pop(0) if len(made) > 0 else fresh_connection())
+        for conn in [pool.acquire() for n in range(0, 6)]:
+            pool.release(conn)
+        api = VSApi(host="stalehost", user="username", passwd="password", pool=pool, logger=MagicMock())
+
+        with patch('time.sleep') as mock_time_sleep, patch('gnmvidispine.vidispine_api.sleep') as mock_sleep:
+            self.assertEqual(api.raw_request("/path/to/endpoint"), "<root/>")
+            mock_time_sleep.assert_not_called()
+            mock_sleep.assert_not_called()
+        health = get_host_health("stalehost", 8080).snapshot()
+        self.assertEqual(health['state'], VSHostHealth.CLOSED)
+        self.assertEqual(health['total_failures'], 0)
+        self.assertEqual(sum(1 for conn in stale if conn.getresponse.called), 1)
+
+        #if the new connection fails as well, that is a failure of the host
+        pool.clear()
+        made.extend([stale_connection(), stale_connection()])
+        pool.release(pool.acquire())
+        with self.assertRaises(RemoteDisconnected):
+            api.sendAuthorized('GET', '/API/path/to/endpoint', None, {})
+        self.assertEqual(get_host_health("stalehost", 8080).snapshot()['total_failures'], 1)
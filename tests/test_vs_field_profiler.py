@@ -0,0 +1,124 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+from mock import MagicMock, patch
+
+
+class TestVSFieldProfiler(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    testdoc = """<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1234">
+    <metadata>
+      <timespan start="-INF" end="+INF">
+        <field><name>title</name><value>Test item</value></field>
+        <field><name>owner</name><value>GNM</value></field>
+        <field><name>duration</name><value>12.5</value></field>
+      </timespan>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+
+    def _item(self):
+        from gnmvidispine.vs_item import VSItem
+        return VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+
+    def test_learn_and_project(self):
+        """
+        after the warmup, populate should only request the fields that the workload has read
+        :return:
+        """
+        from gnmvidispine.vs_field_profiler import VSFieldProfiler
+        profiler = VSFieldProfiler(warmup=2)
+        with patch('gnmvidispine.vs_item.VSItem.field_profiler', profiler):
+            with patch('gnmvidispine.vs_item.VSItem.request', return_value=self.testdoc) as mock_request:
+                for n in range(0, 2):
+                    i = self._item().populate("VX-1234", workload="test")
+                    mock_request.assert_called_with("/item/VX-1234/metadata", method="GET", parse=False)
+                    self.assertEqual(i.get("title"), "Test item")
+                i.get("owner")
+
+                i = self._item().populate("VX-1234", workload="test")
+                mock_request.assert_called_with("/item/VX-1234/metadata;field=owner,title", method="GET", parse=False)
+                self.assertEqual(i.get("title"), "Test item")
+                self.assertEqual(mock_request.call_count, 3)
+
+                #a miss fetches everything, and the field is requested next time
+                self.assertEqual(i.get("duration"), "12.5")
+                mock_request.assert_called_with("/item/VX-1234/metadata", method="GET", parse=False)
+                i.get("somethingelse")
+                self.assertEqual(mock_request.call_count, 4)
+                self._item().populate("VX-1234", workload="test")
+                mock_request.assert_called_with("/item/VX-1234/metadata;field=duration,owner,somethingelse,title", method="GET", parse=False)
+
+                self.assertEqual(profiler.profile("test"), {'fields': ['duration', 'owner', 'somethingelse', 'title'],
+                                                            'needs_all': False, 'populates': 4, 'projected': 2,
+                                                            'misses': 1})
+
+                #explicit fields are not profiled
+                i = self._item().populate("VX-1234", specificFields=["title"], workload="test")
+                i.get("owner")
+                self.assertEqual(profiler.profile("test")['populates'], 4)
+
+    def test_content_dict(self):
+        """
+        reading contentDict should stop the workload from being projected
+        :return:
+        """
+        from gnmvidispine.vs_field_profiler import VSFieldProfiler
+        profiler = VSFieldProfiler(warmup=0)
+        with patch('gnmvidispine.vs_item.VSItem.field_profiler', profiler):
+            with patch('gnmvidispine.vs_item.VSItem.request', return_value=self.testdoc) as mock_request:
+                self._item().populate("VX-1234", workload="test").get("title")
+                i = self._item().populate("VX-1234", workload="test")
+                mock_request.assert_called_with("/item/VX-1234/metadata;field=title", method="GET", parse=False)
+                self.assertEqual(len(i.contentDict), 3)
+                self.assertEqual(mock_request.call_count, 3)
+                self.assertTrue(profiler.profile("test")['needs_all'])
+                self._item().populate("VX-1234", workload="test")
+                mock_request.assert_called_with("/item/VX-1234/metadata", method="GET", parse=False)
+
+    def test_internal_reads(self):
+        """
+        methods of the item that need the whole document should fetch it, without stopping the workload from being
+        projected
+        :return:
+        """
+        from gnmvidispine.vs_field_profiler import VSFieldProfiler
+        profiler = VSFieldProfiler(warmup=0)
+        with patch('gnmvidispine.vs_item.VSItem.field_profiler', profiler):
+            with patch('gnmvidispine.vs_item.VSItem.request', return_value=self.testdoc) as mock_request:
+                self._item().populate("VX-1234", workload="test").get("title")
+                i = self._item().populate("VX-1234", workload="test")
+                mock_request.assert_called_with("/item/VX-1234/metadata;field=title", method="GET", parse=False)
+                self.assertEqual(len(i.to_cache()['content']), 3)
+                self.assertIn("<name>duration</name>", i.metadata_document().decode("UTF-8"))
+                mock_request.assert_called_with("/item/VX-1234/metadata", method="GET", parse=False)
+                self.assertEqual(mock_request.call_count, 3)
+                self.assertFalse(profiler.profile("test")['needs_all'])
+                self._item().populate("VX-1234", workload="test")
+                mock_request.assert_called_with("/item/VX-1234/metadata;field=title", method="GET", parse=False)
+
+    def test_call_site(self):
+        """
+        without a workload name, each line that calls populate should be profiled separately
+        :return:
+        """
+        from gnmvidispine.vs_field_profiler import VSFieldProfiler
+        profiler = VSFieldProfiler()
+        with patch('gnmvidispine.vs_item.VSItem.field_profiler', profiler):
+            with patch('gnmvidispine.vs_item.VSItem.request', return_value=self.testdoc):
+                for n in range(0, 2):
+                    self._item().populate("VX-1234").get("title")
+                self._item().populate("VX-1234").get("owner")
+        workloads = profiler.stats()
+        self.assertEqual(len(workloads), 2)
+        for name, profile in workloads.items():
+            self.assertIn("test_vs_field_profiler.py:", name)
+        self.assertEqual(sorted(p['populates'] for p in workloads.values()), [1, 2])
+
+        profiler.reset()
+        self.assertEqual(profiler.stats(), {})
@@ -0,0 +1,148 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+from mock import MagicMock
+
+
+class TestVSHttpCache(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    class MockedResponse(object):
+        def __init__(self, status_code, content, reason="", headers=None):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+            self.headers = headers if headers is not None else {}
+
+        def read(self, amt=None):
+            return self.body
+
+        def getheader(self, name, default=None):
+            return self.headers.get(name, default)
+
+    def _api(self, responses):
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_http_cache import VSHttpCache
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=responses)
+        api = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, conn=conn)
+        api.http_cache = VSHttpCache()
+        return api, conn
+
+    def test_freshness(self):
+        from gnmvidispine.vs_http_cache import freshness
+        r = self.MockedResponse
+        self.assertEqual(freshness(r(200, b"", headers={})), (True, 0))
+        self.assertEqual(freshness(r(200, b"", headers={}), default_ttl=5), (True, 5))
+        self.assertEqual(freshness(r(200, b"", headers={'Cache-Control': 'private, max-age=30'})), (True, 30))
+        self.assertEqual(freshness(r(200, b"", headers={'Cache-Control': 'no-cache, max-age=30'})), (True, 0))
+        self.assertEqual(freshness(r(200, b"", headers={'Cache-Control': 'no-store'})), (False, 0))
+        self.assertEqual(freshness(r(200, b"", headers={'Expires': 'Thu, 01 Jan 1970 00:00:00 GMT'})), (True, 0))
+        self.assertEqual(freshness(r(200, b"", headers={'Expires': 'garbage'})), (True, 0))
+        #objects without headers
+        self.assertEqual(freshness(object()), (True, 0))
+
+    def test_revalidate(self):
+        """
+        a cached response with an ETag should be revalidated, and a 304 should return the cached body
+        :return:
+        """
+        api, conn = self._api([
+            self.MockedResponse(200, b"<doc/>", headers={'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2018 00:00:00 GMT'}),
+            self.MockedResponse(304, b"", headers={'ETag': '"v1"'}),
+        ])
+        self.assertEqual(api.raw_request("/item/VX-1234/metadata"), b"<doc/>")
+        self.assertEqual(api.raw_request("/item/VX-1234/metadata"), b"<doc/>")
+
+        first_headers = conn.request.call_args_list[0][0][3]
+        second_headers = conn.request.call_args_list[1][0][3]
+        self.assertNotIn('If-None-Match', first_headers)
+        self.assertEqual(second_headers['If-None-Match'], '"v1"')
+        self.assertEqual(second_headers['If-Modified-Since'], 'Mon, 01 Jan 2018 00:00:00 GMT')
+        self.assertEqual(api.http_cache.stats()['revalidated'], 1)
+
+    def test_changed(self):
+        """
+        a changed document should replace the cached one
+        :return:
+        """
+        api, conn = self._api([
+            self.MockedResponse(200, b"<doc>1</doc>", headers={'ETag': '"v1"'}),
+            self.MockedResponse(200, b"<doc>2</doc>", headers={'ETag': '"v2"'}),
+            self.MockedResponse(304, b""),
+        ])
+        self.assertEqual(api.raw_request("/item/VX-1234"), b"<doc>1</doc>")
+        self.assertEqual(api.raw_request("/item/VX-1234"), b"<doc>2</doc>")
+        self.assertEqual(api.raw_request("/item/VX-1234"), b"<doc>2</doc>")
+        self.assertEqual(conn.request.call_args_list[2][0][3]['If-None-Match'], '"v2"')
+
+    def test_fresh(self):
+        """
+        a response within its max-age should be served without contacting the server, and not stored with no-store
+        :return:
+        """
+        api, conn = self._api([
+            self.MockedResponse(200, b"<doc/>", headers={'Cache-Control': 'max-age=60'}),
+            self.MockedResponse(200, b"<secret/>", headers={'Cache-Control': 'no-store', 'ETag': '"x"'}),
+            self.MockedResponse(200, b"<secret/>", headers={'Cache-Control': 'no-store', 'ETag': '"x"'}),
+        ])
+        self.assertEqual(api.raw_request("/storage/VX-1"), b"<doc/>")
+        self.assertEqual(api.raw_request("/storage/VX-1"), b"<doc/>")
+        self.assertEqual(conn.request.call_count, 1)
+        self.assertEqual(api.http_cache.stats()['hits'], 1)
+
+        api.raw_request("/storage/VX-2")
+        api.raw_request("/storage/VX-2")
+        self.assertEqual(conn.request.call_count, 3)
+        self.assertNotIn('If-None-Match', conn.request.call_args_list[2][0][3])
+
+    def test_invalidate_on_write(self):
+        """
+        a PUT to an entity should drop what is cached for it, but not for other entities
+        :return:
+        """
+        api, conn = self._api([
+            self.MockedResponse(200, b"<doc>1</doc>", headers={'Cache-Control': 'max-age=60'}),
+            self.MockedResponse(200, b"<doc>2</doc>", headers={'Cache-Control': 'max-age=60'}),
+            self.MockedResponse(200, b""),
+            self.MockedResponse(200, b"<doc>3</doc>"),
+        ])
+        api.raw_request("/item/VX-1/metadata", matrix={'field': 'title'})
+        api.raw_request("/item/VX-10/metadata")
+        api.raw_request("/item/VX-1/metadata", method="PUT", body="<MetadataDocument/>")
+        self.assertEqual(api.raw_request("/item/VX-1/metadata", matrix={'field': 'title'}), b"<doc>3</doc>")
+        self.assertEqual(api.raw_request("/item/VX-10/metadata"), b"<doc>2</doc>")
+        self.assertEqual(api.http_cache.stats()['invalidations'], 1)
+
+    def test_bounded(self):
+        """
+        the cache should drop the least recently used entries to stay within its size limits
+        :return:
+        """
+        from gnmvidispine.vs_http_cache import VSHttpCache
+        cache = VSHttpCache(max_bytes=10)
+        headers = self.MockedResponse(200, b"", headers={'ETag': '"a"'})
+        cache.store("a", b"12345", headers)
+        cache.store("b", b"12345", headers)
+        cache.lookup("a")
+        cache.store("c", b"123", headers)
+        self.assertIsNotNone(cache.lookup("a"))
+        self.assertIsNone(cache.lookup("b"))
+        cache.store("d", b"12345678901", headers)
+        self.assertIsNone(cache.lookup("d"))
+        self.assertEqual(cache.stats()['bytes'], 8)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_unconditional_304(self):
+        """
+        without the cache a 304 is still an error
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi, HTTPError
+        conn = MagicMock()
+        conn.getresponse = MagicMock(return_value=self.MockedResponse(304, b""))
+        api = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, conn=conn)
+        with self.assertRaises(HTTPError):
+            api.raw_request("/item/VX-1")
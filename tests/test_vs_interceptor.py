@@ -0,0 +1,131 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+from mock import MagicMock, patch
+
+
+class TestVSInterceptor(unittest2.TestCase):
+    class MockedResponse(object):
+        def __init__(self, status_code, content, reason=""):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+
+        def read(self):
+            return self.body
+
+    def make_api(self, *responses):
+        from gnmvidispine.vidispine_api import VSApi
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=list(responses))
+        return VSApi(host="localhost", user="username", passwd="password", conn=conn, logger=MagicMock()), conn
+
+    def test_hook_order(self):
+        """
+        before_send should be called in order and after_response in reverse, and interceptors can change the request
+        :return:
+        """
+        from gnmvidispine.vs_interceptor import VSInterceptor
+        calls = []
+
+        class Recorder(VSInterceptor):
+            def __init__(self, name):
+                self.name = name
+
+            def before_send(self, request):
+                calls.append(("before", self.name))
+                request.headers['X-' + self.name] = "yes"
+
+            def after_response(self, request, response):
+                calls.append(("after", self.name))
+                return response
+
+        api, conn = self.make_api(self.MockedResponse(200, "<root/>"))
+        api.add_interceptor(Recorder("one"))
+        api.add_interceptor(Recorder("two"))
+        api.request("/item/VX-1")
+
+        self.assertEqual(calls, [("before", "one"), ("before", "two"), ("after", "two"), ("after", "one")])
+        headers = conn.request.call_args[0][3]
+        self.assertEqual(headers['X-one'], "yes")
+        self.assertEqual(headers['X-two'], "yes")
+        self.assertIn('Authorization', headers)
+
+    def test_short_circuit(self):
+        """
+        a response returned from before_send should be used without sending the request
+        :return:
+        """
+        from gnmvidispine.vs_interceptor import VSInterceptor, VSResponse
+
+        class Canned(VSInterceptor):
+            def before_send(self, request):
+                return VSResponse(200, b"<canned/>")
+
+        later = MagicMock()
+        api, conn = self.make_api()
+        api.add_interceptor(Canned())
+        api.add_interceptor(later)
+        result = api.request("/item/VX-1")
+
+        self.assertEqual(result.tag, "canned")
+        conn.request.assert_not_called()
+        later.before_send.assert_not_called()
+
+    def test_fault_injection(self):
+        """
+        an injected 503 should be retried by request() in the same way as a real one
+        :return:
+        """
+        from gnmvidispine.vs_interceptor import VSInterceptor, VSResponse
+        from gnmvidispine.vs_resilience import clear_host_health
+        self.addCleanup(clear_host_health)
+
+        class FailFirst(VSInterceptor):
+            failed = False
+
+            def before_send(self, request):
+                if not self.failed:
+                    self.failed = True
+                    return VSResponse(503, b"", "Injected")
+
+        api, conn = self.make_api(self.MockedResponse(200, "<root/>"))
+        api.add_interceptor(FailFirst())
+        with patch('gnmvidispine.vidispine_api.sleep') as mock_sleep:
+            result = api.request("/item/VX-1")
+        self.assertEqual(result.tag, "root")
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertEqual(conn.request.call_count, 1)
+
+    def test_on_error(self):
+        """
+        on_error should be able to recover from an exception, and outer interceptors should see the replacement response
+        :return:
+        """
+        from gnmvidispine.vs_interceptor import VSInterceptor, VSResponse
+        from gnmvidispine.vs_resilience import clear_host_health
+        self.addCleanup(clear_host_health)
+        seen = []
+
+        class Outer(VSInterceptor):
+            def after_response(self, request, response):
+                seen.append(response.status)
+                return response
+
+        class Fallback(VSInterceptor):
+            def on_error(self, request, error):
+                if isinstance(error, ValueError):
+                    return VSResponse(200, b"<fallback/>")
+
+        api, conn = self.make_api()
+        conn.getresponse = MagicMock(side_effect=ValueError("broken"))
+        api.add_interceptor(Outer())
+        api.add_interceptor(Fallback())
+        result = api.request("/item/VX-1")
+        self.assertEqual(result.tag, "fallback")
+        self.assertEqual(seen, [200])
+
+        api, conn = self.make_api()
+        conn.getresponse = MagicMock(side_effect=KeyError("other"))
+        api.add_interceptor(Fallback())
+        with self.assertRaises(KeyError):
+            api.request("/item/VX-1")
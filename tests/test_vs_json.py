@@ -0,0 +1,174 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import json
+from mock import MagicMock, patch
+
+
+class TestVSJson(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+    ns = "{http://xml.vidispine.com/schema/vidispine}"
+
+    item_json = json.dumps({
+        "item": [{
+            "id": "VX-1234",
+            "metadata": {
+                "revision": "VX-9",
+                "group": "Asset",
+                "timespan": [{
+                    "start": "-INF",
+                    "end": "+INF",
+                    "field": [
+                        {"name": "title", "uuid": "a1", "value": [{"value": "Test item", "uuid": "v1", "user": "admin"}]},
+                        {"name": "keywords", "value": [{"value": "one"}, {"value": "two"}]},
+                    ],
+                    "group": [{
+                        "name": "Asset",
+                        "field": [{"name": "durationSeconds", "value": [{"value": "12.5"}]}],
+                        "group": [{"name": "Rights", "field": [{"name": "owner", "value": [{"value": "GNM"}]}]}],
+                    }],
+                }],
+            },
+        }]
+    })
+
+    item_xml = """<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1234">
+    <metadata>
+      <revision>VX-9</revision>
+      <group>Asset</group>
+      <timespan start="-INF" end="+INF">
+        <field uuid="a1"><name>title</name><value uuid="v1" user="admin">Test item</value></field>
+        <field><name>keywords</name><value>one</value><value>two</value></field>
+        <group>
+          <name>Asset</name>
+          <field><name>durationSeconds</name><value>12.5</value></field>
+          <group><name>Rights</name><field><name>owner</name><value>GNM</value></field></group>
+        </group>
+      </timespan>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+
+    def test_item_populate(self):
+        """
+        populating an item from JSON should give the same contentDict as from XML, and dataContent should still work
+        :return:
+        """
+        from gnmvidispine.vs_item import VSItem
+        import xml.etree.ElementTree as ET
+
+        with patch('gnmvidispine.vs_item.VSItem.request', return_value=self.item_json) as mock_request:
+            i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, use_json=True)
+            i.populate("VX-1234")
+            mock_request.assert_called_once_with("/item/VX-1234/metadata", method="GET", matrix=None, query=None,
+                                                 body=None, accept='application/json')
+
+        j = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        j.fromXML(ET.fromstring(self.item_xml))
+
+        self.assertEqual(i.name, "VX-1234")
+        self.assertEqual(i.contentDict, j.contentDict)
+        self.assertEqual(i.get('keywords'), "one|two")
+        self.assertEqual(i.get('owner'), "GNM")
+        self.assertIsNone(i._dataContent)
+
+        #dataContent is built on demand, with attributes where the XML would have them
+        self.assertEqual(i.master_group, "Asset")
+        node = i.dataContent.find('{0}item/{0}metadata/{0}timespan/{0}field/{0}value'.format(self.ns))
+        self.assertEqual(node.text, "Test item")
+        self.assertEqual(node.attrib['uuid'], "v1")
+        self.assertEqual(i.dataContent.find('{0}item'.format(self.ns)).attrib['id'], "VX-1234")
+
+    def test_shape_populate(self):
+        """
+        populating a shape from JSON should fill in the accessors
+        :return:
+        """
+        from gnmvidispine.vs_shape import VSShape
+        shape_json = json.dumps({
+            "id": "VX-55", "essenceVersion": 0, "tag": ["original"], "mimeType": ["video/mp4"],
+            "containerComponent": {"file": [{"id": "VX-99", "path": "test.mp4", "uri": ["file:///srv/test.mp4"],
+                                             "storage": "VX-1", "size": 1234}]},
+        })
+        with patch('gnmvidispine.vs_shape.VSShape.request', return_value=shape_json):
+            s = VSShape(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, use_json=True)
+            s.populate("VX-1234", "VX-55")
+
+        self.assertEqual(s.tag(), "original")
+        self.assertEqual(s.mimeType(), "video/mp4")
+        self.assertEqual(s.contentDict['essenceVersion'], "0")
+        self.assertEqual(s.essence_version, 0)
+        self.assertEqual(list(s.fileURIs()), ["file:///srv/test.mp4"])
+
+    def test_job_populate(self):
+        """
+        populating a job from JSON should fill in contentDict in the same way as XML
+        :return:
+        """
+        from gnmvidispine.vs_job import VSJob
+        import datetime
+        job_json = json.dumps({
+            "jobId": "VX-876", "user": "admin", "started": "2016-11-01T12:05:34.123Z", "status": "FAILED_TOTAL",
+            "type": "TRANSCODE", "priority": "MEDIUM",
+            "data": [{"key": "errorMessage", "value": "it broke"}, {"key": "fileSize", "value": "1234"}],
+        })
+        with patch('gnmvidispine.vs_job.VSJob.request', return_value=job_json):
+            j = VSJob(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, use_json=True)
+            j.populate("VX-876")
+
+        self.assertEqual(j.status(), "FAILED_TOTAL")
+        self.assertTrue(j.didFail())
+        self.assertEqual(j.contentDict['fileSize'], 1234)
+        self.assertEqual(j.started(), datetime.datetime(2016, 11, 1, 12, 5, 34))
+        self.assertEqual(j.errorMessage, "it broke")
+
+    def test_search_results(self):
+        """
+        search results requested as JSON should give populated items
+        :return:
+        """
+        from gnmvidispine.vs_search import VSSearchResult
+        page = json.loads(self.item_json)
+        page['hits'] = 1
+        page['item'][0]['start'] = "-INF"
+        page['item'][0]['end'] = "+INF"
+
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', return_value=json.dumps(page)) as mock_request:
+            r = VSSearchResult(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd,
+                               search_url="/item", body="<ItemSearchDocument/>", use_json=True)
+            results = list(r.results(shouldPopulate=True))
+
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(mock_request.call_args[1]['accept'], 'application/json')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].name, "VX-1234")
+        self.assertEqual(results[0].get('title'), "Test item")
+        self.assertTrue(results[0].use_json)
+
+    def test_storage_files(self):
+        """
+        listing files on a storage as JSON should give VSFile objects
+        :return:
+        """
+        from gnmvidispine.vs_storage import VSStorage
+        pages = [
+            json.dumps({"hits": 2, "file": [
+                {"id": "VX-1", "path": "one.mxf", "state": "CLOSED", "size": 100, "storage": "VX-2", "item": [{"id": "VX-5"}]},
+                {"id": "VX-3", "path": "two.mxf", "state": "LOST", "size": 200, "storage": "VX-2"},
+            ]}),
+            json.dumps({"hits": 2}),
+        ]
+        with patch('gnmvidispine.vs_storage.VSStorage.request', side_effect=pages):
+            s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, use_json=True)
+            s.name = "VX-2"
+            files = list(s.files())
+
+        self.assertEqual([f.name for f in files], ["VX-1", "VX-3"])
+        self.assertEqual(files[0].size, "100")
+        self.assertEqual(files[0].memberOfItem.name, "VX-5")
+        self.assertIsNone(files[1].memberOfItem)
+        self.assertEqual(files[1].state, "LOST")
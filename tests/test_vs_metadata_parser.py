@@ -0,0 +1,149 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import logging
+from mock import MagicMock, patch
+import xml.etree.ElementTree as ET
+
+
+class TestMetadataParser(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    itemdoc = u"""<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1234">
+    <metadata>
+      <revision>VX-1,VX-2</revision>
+      <timespan start="-INF" end="+INF">
+        <field uuid="a1"><name>title</name><value uuid="v1" user="admin">Tést item</value></field>
+        <field><name>keywords</name><value>one</value><value/><value>two<extra>ignored</extra> tail</value></field>
+        <field><value>nameless</value></field>
+        <field><name/><value>empty name</value></field>
+        <group>
+          <name>Asset</name>
+          <field><name>owner</name><value>GNM</value></field>
+          <group><name>Rights</name><field><name>title</name><value>nested</value></field></group>
+        </group>
+        <other><field><name>ignored</name><value>ignored</value></field></other>
+      </timespan>
+      <timespan start="10" end="20">
+        <field><name>title</name><value>second timespan</value></field>
+      </timespan>
+    </metadata>
+  </item>
+  <item id="VX-5678">
+    <metadata>
+      <timespan start="-INF" end="+INF">
+        <field><name>title</name><value>second item</value></field>
+      </timespan>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+
+    itemdocumentdoc = b"""<?xml version="1.0" encoding="UTF-8"?>
+<ItemDocument xmlns="http://xml.vidispine.com/schema/vidispine" id="VX-99">
+  <metadata>
+    <timespan start="-INF" end="+INF">
+      <field><name>title</name><value>item document</value></field>
+    </timespan>
+  </metadata>
+</ItemDocument>"""
+
+    collectiondoc = """<MetadataDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <timespan start="-INF" end="+INF">
+    <field><name>collectionId</name><value>VX-7</value></field>
+    <field><name>title</name><value>collection</value></field>
+  </timespan>
+</MetadataDocument>"""
+
+    def _item(self):
+        from gnmvidispine.vs_item import VSItem
+        return VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+
+    def test_same_as_tree(self):
+        """
+        the single-pass parser should give exactly the same contentDict and name as walking the tree
+        :return:
+        """
+        for doc, objectClass in ((self.itemdoc, "item"), (self.itemdoc.encode('utf-8'), "item"),
+                                 (self.itemdocumentdoc, "item"), (self.collectiondoc, "collection")):
+            fast = self._item().fromXML(doc, objectClass=objectClass)
+            tree = self._item().fromXML(doc, objectClass=objectClass, keepTree=True)
+            self.assertEqual(fast.contentDict, tree.contentDict)
+            self.assertEqual(fast.name, tree.name)
+            self.assertEqual(fast.type, tree.type)
+
+        i = self._item().fromXML(self.itemdoc)
+        self.assertEqual(i.name, "VX-1234")
+        self.assertEqual(i.get("title", allowArray=True), [u"Tést item", "nested", "second timespan", "second item"])
+        self.assertEqual(i.get("keywords", allowArray=True), ["one", None, "two"])
+        self.assertEqual(i.get(""), "nameless")
+        self.assertEqual(i.contentDict[None], "empty name")
+        self.assertNotIn("ignored", i.contentDict)
+        self.assertEqual(self._item().fromXML(self.collectiondoc, objectClass="collection").name, "VX-7")
+
+    def test_lazy_tree(self):
+        """
+        the tree should only be built if something asks for it
+        :return:
+        """
+        i = self._item()
+        with patch('gnmvidispine.vs_xml.fromstring', side_effect=ET.fromstring) as mock_parse:
+            i.fromXML(self.itemdoc)
+            mock_parse.assert_not_called()
+            self.assertTrue(i._has_content())
+            self.assertEqual(i.get("owner"), "GNM")
+            mock_parse.assert_not_called()
+            self.assertEqual(len(list(i._get_timespans())), 3)
+            self.assertEqual(mock_parse.call_count, 1)
+            self.assertIn(b"VX-1234", i.toXML())
+            self.assertEqual(mock_parse.call_count, 1)
+
+    def test_invalid(self):
+        from gnmvidispine.vs_item import InvalidSourceError
+        from xml.parsers.expat import ExpatError
+        with self.assertRaises(InvalidSourceError):
+            self._item().fromXML("<ItemListDocument xmlns=\"http://xml.vidispine.com/schema/vidispine\"/>")
+        with self.assertRaises(TypeError):
+            self._item().fromXML(self.itemdoc, objectClass="shape")
+        with self.assertRaises(ExpatError):
+            self._item().fromXML("<broken>")
+
+    def test_populate(self):
+        """
+        populate should ask for the raw document, and still work if request gives it a parsed tree
+        :return:
+        """
+        from gnmvidispine.vs_item import VSItem
+        with patch('gnmvidispine.vs_item.VSItem.request', return_value=self.itemdocumentdoc) as mock_request:
+            i = self._item().populate("VX-99")
+            mock_request.assert_called_once_with("/item/VX-99/metadata", method="GET", parse=False)
+            self.assertEqual(i.get("title"), "item document")
+            self.assertIsNone(i._dataContent)
+        with patch('gnmvidispine.vs_item.VSItem.request', return_value=ET.fromstring(self.itemdocumentdoc)):
+            i = self._item().populate("VX-99")
+            self.assertEqual(i.get("title"), "item document")
+
+    def test_request_unparsed(self):
+        from gnmvidispine.vidispine_api import VSApi
+        api = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch.object(api, 'raw_request', return_value=self.itemdocumentdoc):
+            self.assertEqual(api.request("/item/VX-99/metadata", parse=False), self.itemdocumentdoc)
+            self.assertEqual(api.request("/item/VX-99/metadata").attrib['id'], "VX-99")
+
+    def test_no_debug_formatting(self):
+        """
+        makeContentDict should not log anything unless debug logging is on
+        :return:
+        """
+        i = self._item()
+        root = ET.fromstring(self.itemdoc)
+        with patch('gnmvidispine.vs_item.logging.debug') as mock_debug:
+            with patch.object(logging.getLogger(), 'isEnabledFor', return_value=False):
+                i.fromXML(root)
+            mock_debug.assert_not_called()
+            with patch.object(logging.getLogger(), 'isEnabledFor', return_value=True):
+                i.fromXML(root)
+            self.assertGreater(mock_debug.call_count, 0)
@@ -0,0 +1,84 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+from mock import MagicMock, patch
+
+
+class TestVSMetrics(unittest2.TestCase):
+    class MockedResponse(object):
+        def __init__(self, status_code, content, reason=""):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+
+        def read(self):
+            return self.body
+
+    def test_normalise_path(self):
+        """
+        normalise_path should strip /API, matrix and query parameters and replace IDs
+        :return:
+        """
+        from gnmvidispine.vs_metrics import normalise_path
+        self.assertEqual(normalise_path("/API/item/VX-1234/metadata;field=title?p=1"), "/item/{id}/metadata")
+        self.assertEqual(normalise_path("/item/VX-1234/shape/VX-55"), "/item/{id}/shape/{id}")
+        self.assertEqual(normalise_path("/search;first=1;number=100"), "/search")
+        self.assertEqual(normalise_path("/job/12345"), "/job/{id}")
+        self.assertEqual(normalise_path("/storage/file/VX-9/data"), "/storage/file/{id}/data")
+        self.assertEqual(normalise_path("/import/raw"), "/import/raw")
+
+    def test_prometheus_text(self):
+        """
+        prometheus_text should export cumulative histograms and counters with labels
+        :return:
+        """
+        from gnmvidispine.vs_metrics import VSMetrics
+        metrics = VSMetrics(buckets=[0.1, 1])
+        metrics.observe("GET", "/item/VX-1", 200, 0.05, 0, 100)
+        metrics.observe("GET", "/item/VX-2", 200, 0.5, 0, 200)
+        metrics.observe("GET", "/item/VX-3", 404, 2, 0, 10)
+        metrics.record_retry("GET", "/item/VX-3", "503", 1.5)
+
+        text = metrics.prometheus_text()
+        self.assertIn('vidispine_request_duration_seconds_bucket{method="GET",path="/item/{id}",le="0.1"} 1\n', text)
+        self.assertIn('vidispine_request_duration_seconds_bucket{method="GET",path="/item/{id}",le="1"} 2\n', text)
+        self.assertIn('vidispine_request_duration_seconds_bucket{method="GET",path="/item/{id}",le="+Inf"} 3\n', text)
+        self.assertIn('vidispine_request_duration_seconds_count{method="GET",path="/item/{id}"} 3\n', text)
+        self.assertIn('vidispine_responses_total{method="GET",path="/item/{id}",status="404"} 1\n', text)
+        self.assertIn('vidispine_retries_total{method="GET",path="/item/{id}",reason="503"} 1\n', text)
+        self.assertIn('vidispine_backoff_seconds_total{method="GET",path="/item/{id}"} 1.5\n', text)
+        self.assertIn('vidispine_response_bytes_total{method="GET",path="/item/{id}"} 310\n', text)
+
+    def test_request_instrumented(self):
+        """
+        requests should be recorded, including errors and retries, when VSApi.metrics is set
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi, VSNotFound
+        from gnmvidispine.vs_metrics import VSMetrics
+        from gnmvidispine.vs_resilience import clear_host_health
+        self.addCleanup(clear_host_health)
+
+        metrics = VSMetrics()
+        events = []
+        metrics.add_listener(events.append)
+
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=[
+            self.MockedResponse(504, ""),
+            self.MockedResponse(200, "<root/>"),
+            self.MockedResponse(404, "<ExceptionDocument/>"),
+        ])
+        api = VSApi(host="metricshost", user="username", passwd="password", conn=conn, logger=MagicMock())
+        with patch('gnmvidispine.vidispine_api.VSApi.metrics', metrics):
+            with patch('time.sleep'):
+                api.request("/item/VX-1/metadata", method="PUT", body="<MetadataDocument/>")
+                with self.assertRaises(VSNotFound):
+                    api.request("/item/VX-2/metadata")
+
+        self.assertEqual([(e['method'], e['path'], e['status']) for e in events],
+                         [("PUT", "/item/{id}/metadata", 200), ("GET", "/item/{id}/metadata", 404)])
+        self.assertEqual(events[0]['sent'], len("<MetadataDocument/>"))
+        self.assertEqual(events[0]['received'], len("<root/>"))
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["PUT /item/{id}/metadata"]['retries'], {"504": 1})
+        self.assertEqual(snapshot["GET /item/{id}/metadata"]['statuses'], {404: 1})
@@ -0,0 +1,131 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import threading
+from mock import MagicMock, patch
+
+
+class TestVSRateLimiter(unittest2.TestCase):
+    class MockedResponse(object):
+        def __init__(self, status_code, content, reason=""):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+
+        def read(self):
+            return self.body
+
+    def tearDown(self):
+        from gnmvidispine.vs_rate_limit import clear_rate_limiters
+        clear_rate_limiters()
+
+    def test_token_bucket(self):
+        """
+        a token bucket should allow a burst then pace requests at its rate, queueing callers in order
+        :return:
+        """
+        from gnmvidispine.vs_rate_limit import TokenBucket
+        with patch('gnmvidispine.vs_rate_limit.time', return_value=100):
+            bucket = TokenBucket(rate=2, burst=3)
+            self.assertEqual([bucket.reserve() for n in range(0, 3)], [0, 0, 0])
+            self.assertEqual(bucket.reserve(), 0.5)
+            self.assertEqual(bucket.reserve(), 1.0)
+        with patch('gnmvidispine.vs_rate_limit.time', return_value=101):
+            self.assertEqual(bucket.reserve(), 0.5)
+
+    def test_limit_matching(self):
+        """
+        the most specific limit should apply, matching whole path segments
+        :return:
+        """
+        from gnmvidispine.vs_rate_limit import VSRateLimiter
+        limiter = VSRateLimiter("localhost", 8080)
+        limiter.set_limit("/item", rate=10)
+        limiter.set_limit("/item", rate=50, method="GET")
+        limiter.set_limit("/item/VX-1/metadata", rate=1)
+        limiter.set_limit("/search", rate=2)
+
+        self.assertEqual(limiter._find_limit("GET", "/item/VX-2").bucket.rate, 50)
+        self.assertEqual(limiter._find_limit("PUT", "/item/VX-2").bucket.rate, 10)
+        self.assertEqual(limiter._find_limit("GET", "/item/VX-1/metadata").bucket.rate, 1)
+        self.assertEqual(limiter._find_limit("PUT", "/search;first=1").bucket.rate, 2)
+        self.assertIsNone(limiter._find_limit("GET", "/itemtype"))
+        self.assertIsNone(limiter._find_limit("GET", "/storage"))
+
+    def test_raw_request_throttled(self):
+        """
+        raw_request should wait for the rate limit of its endpoint, and leave other endpoints alone
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_rate_limit import get_rate_limiter
+
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=lambda: self.MockedResponse(200, "<root/>"))
+        api = VSApi(host="ratehost", user="username", passwd="password", conn=conn, logger=MagicMock())
+
+        with patch('gnmvidispine.vs_rate_limit.time', return_value=100):
+            get_rate_limiter("ratehost", 8080).set_limit("/search", rate=1, burst=1)
+            with patch('gnmvidispine.vs_rate_limit.sleep') as mock_sleep:
+                api.raw_request("/search", method="PUT", body="<ItemSearchDocument/>")
+                api.raw_request("/item/VX-1")
+                self.assertEqual(mock_sleep.call_count, 0)
+                api.raw_request("/search", method="PUT", body="<ItemSearchDocument/>")
+                mock_sleep.assert_called_once_with(1.0)
+        stats = get_rate_limiter("ratehost", 8080).stats()
+        self.assertEqual(stats['limits'][0]['requests'], 2)
+        self.assertEqual(stats['limits'][0]['throttled'], 1)
+        self.assertEqual(stats['in_flight'], 0)
+
+    def test_max_in_flight(self):
+        """
+        no more than max_in_flight requests should be outstanding at once, across threads
+        :return:
+        """
+        from gnmvidispine.vs_rate_limit import VSRateLimiter
+        limiter = VSRateLimiter("localhost", 8080, max_in_flight=2)
+        lock = threading.Lock()
+        release = threading.Event()
+        state = {'current': 0, 'peak': 0}
+
+        def worker():
+            with limiter.slot("GET", "/item/VX-1"):
+                with lock:
+                    state['current'] += 1
+                    state['peak'] = max(state['peak'], state['current'])
+                release.wait(5)
+                with lock:
+                    state['current'] -= 1
+
+        threads = [threading.Thread(target=worker) for n in range(0, 5)]
+        for t in threads:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(state['peak'], 2)
+        self.assertEqual(limiter.stats()['peak_in_flight'], 2)
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+    def test_released_during_backoff(self):
+        """
+        a request should not count as in flight while it is sleeping before a retry
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_rate_limit import get_rate_limiter
+        from gnmvidispine.vs_resilience import clear_host_health
+        self.addCleanup(clear_host_health)
+
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=[self.MockedResponse(504, ""), self.MockedResponse(200, "<root/>")])
+        api = VSApi(host="ratehost", user="username", passwd="password", conn=conn, logger=MagicMock())
+        limiter = get_rate_limiter("ratehost", 8080)
+        limiter.max_in_flight = 1
+        in_flight = []
+
+        with patch('time.sleep', side_effect=lambda delay: in_flight.append(limiter.in_flight)) as mock_sleep:
+            self.assertEqual(api.raw_request("/item/VX-1"), "<root/>")
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertEqual(in_flight, [0])
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.stats()['peak_in_flight'], 1)
@@ -0,0 +1,91 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+from mock import MagicMock, patch
+
+
+class TestVSHostHealth(unittest2.TestCase):
+    class MockedResponse(object):
+        def __init__(self, status_code, content, reason=""):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+
+        def read(self):
+            return self.body
+
+    def tearDown(self):
+        from gnmvidispine.vs_resilience import clear_host_health
+        clear_host_health()
+
+    def test_circuit_breaker(self):
+        """
+        the breaker should open after failure_threshold consecutive failures, half-open after reset_timeout and close
+        again after a successful probe
+        :return:
+        """
+        from gnmvidispine.vs_resilience import VSHostHealth
+        health = VSHostHealth("localhost", 8080)
+        health.failure_threshold = 3
+        health.reset_timeout = 10
+        health.probe_interval = 5
+
+        with patch('gnmvidispine.vs_resilience.time', return_value=100):
+            for n in range(0, 3):
+                self.assertTrue(health.allow_request())
+                health.record_failure()
+            self.assertEqual(health.state, VSHostHealth.OPEN)
+            self.assertFalse(health.allow_request())
+            self.assertEqual(health.retry_after(), 10)
+
+        with patch('gnmvidispine.vs_resilience.time', return_value=110):
+            self.assertTrue(health.allow_request())     #the probe
+            self.assertEqual(health.state, VSHostHealth.HALF_OPEN)
+            self.assertFalse(health.allow_request())    #only one probe per probe_interval
+            health.record_failure()
+            self.assertEqual(health.state, VSHostHealth.OPEN)
+
+        with patch('gnmvidispine.vs_resilience.time', return_value=120):
+            self.assertTrue(health.allow_request())
+            health.record_success()
+            self.assertEqual(health.state, VSHostHealth.CLOSED)
+            self.assertTrue(health.allow_request())
+        self.assertEqual(health.snapshot()['trips'], 2)
+
+    def test_backoff(self):
+        """
+        the backoff delay should double with each failure, with jitter, and come down again with successes
+        :return:
+        """
+        from gnmvidispine.vs_resilience import VSHostHealth
+        health = VSHostHealth("localhost", 8080)
+        health.failure_threshold = 100
+
+        for n in range(0, 4):
+            health.record_failure()
+        with patch('gnmvidispine.vs_resilience.random.uniform', side_effect=lambda a, b: b):
+            self.assertEqual(health.backoff_delay(2), 16)
+        with patch('gnmvidispine.vs_resilience.random.uniform', side_effect=lambda a, b: a):
+            self.assertEqual(health.backoff_delay(2), 8)
+
+        health.record_success()
+        self.assertEqual(health.level, 3)
+
+    def test_shared_between_objects(self):
+        """
+        a 504 seen by one object should make other objects talking to the same host back off too
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_resilience import get_host_health
+
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=[self.MockedResponse(504, ""), self.MockedResponse(200, "<root/>")])
+        first = VSApi(host="sharedhost", user="username", passwd="password", conn=conn, logger=MagicMock())
+        second = VSApi(host="sharedhost", user="otheruser", passwd="password")
+
+        with patch('time.sleep') as mock_sleep:
+            first.raw_request("/path/to/endpoint")
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertIs(first._host_health(), second._host_health())
+        self.assertEqual(get_host_health("sharedhost", 8080).snapshot()['total_failures'], 1)
+        self.assertEqual(get_host_health("sharedhost", 8080).snapshot()['total_successes'], 1)
@@ -0,0 +1,133 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import threading
+from time import sleep
+from mock import MagicMock, patch
+
+
+class TestVSSingleFlight(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    item_doc = b"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<ItemDocument xmlns="http://xml.vidispine.com/schema/vidispine" id="VX-1234"/>"""
+
+    @staticmethod
+    def _wait_for(condition):
+        for n in range(0, 500):
+            if condition():
+                return
+            sleep(0.01)
+        raise AssertionError("timed out")
+
+    def _run_concurrently(self, single_flight, count, call):
+        """
+        Start count threads running call and wait until all but the first are waiting on it
+        """
+        results = [None] * count
+        errors = [None] * count
+
+        def run(n):
+            try:
+                results[n] = call()
+            except Exception as e:
+                errors[n] = e
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(0, count)]
+        for t in threads:
+            t.start()
+        self._wait_for(lambda: single_flight.stats()['shared'] == count - 1)
+        return threads, results, errors
+
+    def test_collapse(self):
+        """
+        identical concurrent calls should be made once, with the followers getting copies of the result
+        :return:
+        """
+        from gnmvidispine.vs_single_flight import VSSingleFlight
+        sf = VSSingleFlight()
+        release = threading.Event()
+        fn = MagicMock(side_effect=lambda: release.wait() and {'key': ['value']})
+
+        threads, results, errors = self._run_concurrently(sf, 4, lambda: sf.do("key", fn))
+        release.set()
+        for t in threads:
+            t.join()
+
+        fn.assert_called_once_with()
+        self.assertEqual(errors, [None] * 4)
+        self.assertEqual(results, [{'key': ['value']}] * 4)
+        self.assertEqual(len(set(id(r) for r in results)), 4)
+        self.assertEqual(sf.stats(), {'requests': 1, 'shared': 3, 'in_flight': 0})
+
+        #once complete nothing is remembered
+        fn.side_effect = lambda: "second"
+        self.assertEqual(sf.do("key", fn), "second")
+
+    def test_error(self):
+        """
+        followers should get the exception that the leader's call raised
+        :return:
+        """
+        from gnmvidispine.vs_single_flight import VSSingleFlight
+        sf = VSSingleFlight()
+        release = threading.Event()
+
+        def fail():
+            release.wait()
+            raise ValueError("broken")
+
+        threads, results, errors = self._run_concurrently(sf, 3, lambda: sf.do("key", fail))
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        self.assertEqual(sf.stats()['in_flight'], 0)
+
+    def test_request(self):
+        """
+        VSApi.request should collapse concurrent GETs for the same URL but not other methods or URLs
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_single_flight import VSSingleFlight
+
+        sf = VSSingleFlight()
+        release = threading.Event()
+        api = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        api.single_flight = sf
+
+        def fake_raw_request(path, **kwargs):
+            release.wait()
+            return self.item_doc
+
+        with patch.object(api, 'raw_request', side_effect=fake_raw_request) as mock_raw:
+            threads, results, errors = self._run_concurrently(sf, 3, lambda: api.request("/item/VX-1234", matrix={'field': 'title'}))
+            release.set()
+            for t in threads:
+                t.join()
+            self.assertEqual(mock_raw.call_count, 1)
+            self.assertEqual([r.attrib['id'] for r in results], ["VX-1234"] * 3)
+            self.assertEqual(len(set(id(r) for r in results)), 3)
+
+            api.request("/item/VX-1234", method="PUT", body="<doc/>")
+            api.request("/item/VX-1234", accept="application/json")
+            self.assertEqual(mock_raw.call_count, 3)
+            self.assertEqual(sf.stats()['requests'], 2)
+
+    def test_key(self):
+        """
+        requests made as different users must not be collapsed together
+        :return:
+        """
+        from gnmvidispine.vidispine_api import VSApi
+        sf = MagicMock()
+        sf.do = MagicMock(side_effect=lambda key, fn: key)
+        first = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        second = VSApi(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, run_as="someone")
+        first.single_flight = sf
+        second.single_flight = sf
+        self.assertNotEqual(first.request("/item/VX-1"), second.request("/item/VX-1"))
+        self.assertEqual(first.request("/item/VX-1", query={'p': 'a b'}), first.request("/item/VX-1", query={'p': 'a b'}))
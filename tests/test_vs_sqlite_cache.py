@@ -0,0 +1,167 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import os
+import shutil
+import tempfile
+from mock import MagicMock, patch
+import xml.etree.ElementTree as ET
+
+
+class TestVSSqliteCache(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    testdoc = """<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1234">
+    <metadata>
+      <timespan start="-INF" end="+INF">
+        <field>
+          <name>title</name>
+          <value>Test item</value>
+        </field>
+      </timespan>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+
+    storagedoc = """<?xml version="1.0" encoding="UTF-8"?>
+<StorageDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <id>VX-2</id>
+  <state>NONE</state>
+  <type>LOCAL</type>
+  <capacity>1000</capacity>
+  <freeCapacity>500</freeCapacity>
+  <method><id>VX-5</id><uri>file:///srv/media/</uri><read>true</read><write>true</write><browse>true</browse><type>NONE</type></method>
+</StorageDocument>"""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.dbpath = os.path.join(self.tempdir, "cache.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_round_trip(self):
+        """
+        XML and JSON documents should come back as they went in, and be shared with another cache on the same file
+        :return:
+        """
+        from gnmvidispine.vs_sqlite_cache import VSSqliteCache
+        from gnmvidispine.vs_cache import cache_key
+        cache = VSSqliteCache(self.dbpath)
+        cache.put(cache_key("item", "VX-1234", ("title",)), ET.fromstring(self.testdoc))
+        cache.put(cache_key("item", "VX-5"), {'item': [{'id': 'VX-5'}]})
+
+        other = VSSqliteCache(self.dbpath)
+        doc = other.get(cache_key("item", "VX-1234", ("title",)))
+        self.assertEqual(doc.find('{http://xml.vidispine.com/schema/vidispine}item').attrib['id'], "VX-1234")
+        self.assertEqual(other.get(cache_key("item", "VX-5")), {'item': [{'id': 'VX-5'}]})
+        self.assertIsNone(other.get(cache_key("item", "VX-1234")))
+        self.assertEqual(other.stats(), {'size': 2, 'hits': 2, 'misses': 1, 'expired': 0, 'invalidations': 0})
+
+        journal_mode = other._connection().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(journal_mode, "wal")
+
+    def test_raw_bodies(self):
+        """
+        strings should come back as strings, and bytes as the same bytes even if they are not UTF-8
+        :return:
+        """
+        from gnmvidispine.vs_sqlite_cache import VSSqliteCache
+        from gnmvidispine.vs_cache import cache_key
+        cache = VSSqliteCache(self.dbpath)
+        body = self.testdoc.encode("ISO-8859-1") + b"<!-- \xe9\xff -->"
+        cache.put(cache_key("item", "VX-1"), body)
+        cache.put(cache_key("item", "VX-2"), u"caf\u00e9")
+
+        self.assertEqual(cache.get(cache_key("item", "VX-1")), body)
+        self.assertEqual(cache.get(cache_key("item", "VX-2")), u"caf\u00e9")
+
+    def test_expiry_and_version(self):
+        """
+        entries should expire after the ttl, and be ignored by a cache with a different version stamp
+        :return:
+        """
+        from gnmvidispine.vs_sqlite_cache import VSSqliteCache
+        from gnmvidispine.vs_cache import cache_key
+        with patch('gnmvidispine.vs_sqlite_cache.time', return_value=1000):
+            cache = VSSqliteCache(self.dbpath, ttl=10)
+            cache.put(cache_key("item", "VX-1"), ET.Element("one"))
+            self.assertEqual(cache.get(cache_key("item", "VX-1")).tag, "one")
+            self.assertIsNone(VSSqliteCache(self.dbpath, version="2").get(cache_key("item", "VX-1")))
+        with patch('gnmvidispine.vs_sqlite_cache.time', return_value=1010):
+            self.assertIsNone(cache.get(cache_key("item", "VX-1")))
+            self.assertEqual(cache.stats()['expired'], 1)
+            self.assertEqual(cache.purge(), 1)
+            self.assertEqual(len(cache), 0)
+
+    def test_invalidate_and_purge(self):
+        from gnmvidispine.vs_sqlite_cache import VSSqliteCache
+        from gnmvidispine.vs_cache import cache_key
+        cache = VSSqliteCache(self.dbpath, maxsize=2)
+        cache.put(cache_key("item", "VX-1"), ET.Element("one"))
+        cache.put(cache_key("item", "VX-1", ("title",)), ET.Element("one"))
+        cache.put(cache_key("item", "VX-2"), ET.Element("two"))
+        cache.invalidate("item", "VX-1")
+        self.assertEqual(len(cache), 1)
+        self.assertIsNotNone(cache.get(cache_key("item", "VX-2")))
+
+        cache.put(cache_key("item", "VX-3"), ET.Element("three"))
+        cache.put(cache_key("item", "VX-4"), ET.Element("four"))
+        self.assertEqual(cache.purge(), 1)
+        self.assertIsNone(cache.get(cache_key("item", "VX-2")))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_item_populate(self):
+        """
+        VSItem.populate and the shape list should read through the cache
+        :return:
+        """
+        from gnmvidispine.vs_item import VSItem
+        from gnmvidispine.vs_sqlite_cache import VSSqliteCache
+
+        cache = VSSqliteCache(self.dbpath)
+        shapedoc = '<URIListDocument xmlns="http://xml.vidispine.com/schema/vidispine"><uri>VX-10</uri></URIListDocument>'
+
+        def fake_request(path, **kwargs):
+            return ET.fromstring(shapedoc if path.endswith("/shape") else self.testdoc)
+
+        with patch('gnmvidispine.vs_item.VSItem.metadata_cache', cache):
+            with patch('gnmvidispine.vs_item.VSItem.request', side_effect=fake_request) as mock_request:
+                with patch('gnmvidispine.vs_item.VSShape') as mock_shape:
+                    i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+                    i.populate("VX-1234")
+                    self.assertEqual(len(list(i.shapes())), 1)
+
+                    j = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+                    j.populate("VX-1234")
+                    self.assertEqual(len(list(j.shapes())), 1)
+                    self.assertEqual(j.get('title'), "Test item")
+                    self.assertEqual(mock_request.call_count, 2)
+                    mock_shape.return_value.populate.assert_called_with("VX-1234", "VX-10")
+
+                    j.reload()
+                    self.assertEqual(mock_request.call_count, 3)
+                    self.assertEqual(len(cache), 1)
+
+    def test_storage_populate(self):
+        """
+        VSStorage.populate should read through the cache
+        :return:
+        """
+        from gnmvidispine.vs_storage import VSStorage
+        from gnmvidispine.vs_sqlite_cache import VSSqliteCache
+
+        cache = VSSqliteCache(self.dbpath)
+        with patch('gnmvidispine.vs_storage.VSStorage.metadata_cache', cache):
+            with patch('gnmvidispine.vs_storage.VSStorage.request', side_effect=lambda *args, **kwargs: ET.fromstring(self.storagedoc)) as mock_request:
+                for n in range(0, 3):
+                    s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+                    s.populate("VX-2")
+                    self.assertEqual(s.name, "VX-2")
+                    self.assertEqual(s.freeCapacity, "500")
+                self.assertEqual(mock_request.call_count, 1)
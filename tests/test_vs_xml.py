@@ -0,0 +1,185 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import xml.etree.ElementTree as ET
+from mock import patch
+
+try:
+    import lxml
+    have_lxml = True
+except ImportError:
+    have_lxml = False
+
+
+class TestVSXml(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    doc = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+    <item id="VX-1234">
+        <metadata>
+            <timespan start="-INF" end="+INF">
+                <field><name>title</name><value>Test item</value></field>
+                <field><name>keywords</name><value>one</value><value>two</value></field>
+                <group><name>Asset</name><field><name>owner</name><value>GNM</value></field></group>
+            </timespan>
+            <timespan start="10" end="20">
+                <field><name>title</name><value/></field>
+            </timespan>
+        </metadata>
+    </item>
+</MetadataListDocument>"""
+
+    def tearDown(self):
+        from gnmvidispine import vs_xml
+        vs_xml.set_backend("stdlib")
+
+    def test_path_findall(self):
+        """
+        A path of child tags should find the same nodes as ElementTree's own findall
+        """
+        from gnmvidispine.vs_xml import Path, fromstring
+        root = fromstring(self.doc)
+        p = Path('{0}item/{0}metadata/{0}timespan')
+        self.assertEqual(p.findall(root), root.findall(p.path))
+        self.assertEqual(len(p.findall(root)), 2)
+        self.assertEqual(p.find(root).attrib['start'], "-INF")
+
+        self.assertEqual(Path('{0}item/{0}nothing').findall(root), [])
+        self.assertIsNone(Path('{0}item/{0}nothing').find(root))
+
+    def test_path_findtext(self):
+        from gnmvidispine.vs_xml import Path, fromstring
+        root = fromstring(self.doc)
+        timespans = Path('{0}item/{0}metadata/{0}timespan').findall(root)
+        value = Path('{0}field/{0}value')
+        self.assertEqual(value.findtext(timespans[0]), "Test item")
+        self.assertEqual(value.findtext(timespans[1]), "")
+        self.assertEqual(Path('{0}nothing').findtext(timespans[0], "default"), "default")
+
+    def test_path_special_syntax(self):
+        """
+        Paths that are not plain child tags should fall back to ElementPath
+        """
+        from gnmvidispine.vs_xml import Path, fromstring
+        root = fromstring(self.doc)
+        p = Path('.//{0}field')
+        self.assertEqual(len(p.findall(root)), 4)
+        self.assertEqual(Path("{0}item/{0}metadata/{0}timespan[@start='10']").find(root).attrib['end'], "20")
+
+    def test_path_namespace(self):
+        from gnmvidispine.vs_xml import Path
+        root = ET.fromstring('<doc><field><name>title</name></field></doc>')
+        self.assertEqual(Path('{0}field/{0}name', ns="").findtext(root), "title")
+
+    def test_set_backend(self):
+        from gnmvidispine import vs_xml
+        self.assertEqual(vs_xml.get_backend(), "stdlib")
+        with self.assertRaises(ValueError):
+            vs_xml.set_backend("expat")
+        self.assertEqual(vs_xml.set_backend("stdlib"), "stdlib")
+
+    @unittest2.skipIf(have_lxml, "lxml is installed")
+    def test_backend_without_lxml(self):
+        """
+        Asking for lxml when it is not installed should fail, but auto should fall back to the standard library
+        """
+        from gnmvidispine import vs_xml
+        with self.assertRaises(ImportError):
+            vs_xml.set_backend("lxml")
+        self.assertEqual(vs_xml.set_backend("auto"), "stdlib")
+        self.assertIsInstance(vs_xml.fromstring(self.doc), ET.Element)
+
+    @unittest2.skipUnless(have_lxml, "lxml is not installed")
+    def test_lxml_item(self):
+        """
+        An item populated with the lxml backend should come out the same as with the standard library
+        """
+        from gnmvidispine import vs_xml
+        from gnmvidispine.vs_item import VSItem
+        self.assertEqual(vs_xml.set_backend("lxml"), "lxml")
+        root = vs_xml.fromstring(self.doc)
+        self.assertTrue(vs_xml.is_lxml(root))
+
+        i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        i.fromXML(self.doc)
+        self.assertEqual(i.name, "VX-1234")
+        self.assertEqual(i.get("title", allowArray=True), ["Test item", None])
+        self.assertEqual(i.get("keywords", allowArray=True), ["one", "two"])
+        self.assertEqual(i.get("owner"), "GNM")
+        self.assertIn(b'<name>owner</name>', vs_xml.tostring(i.dataContent))
+
+    @unittest2.skipUnless(have_lxml, "lxml is not installed")
+    def test_lxml_path(self):
+        """
+        Paths should find the same nodes in an lxml tree as in a standard library one
+        """
+        from gnmvidispine import vs_xml
+        from gnmvidispine.vs_xml import Path
+        stdlib_root = vs_xml.fromstring(self.doc)
+        vs_xml.set_backend("lxml")
+        lxml_root = vs_xml.fromstring(self.doc)
+        for path in ['{0}item/{0}metadata/{0}timespan', './/{0}field', '{0}item/{0}nothing',
+                     "{0}item/{0}metadata/{0}timespan[@start='10']"]:
+            p = Path(path)
+            self.assertEqual([(n.tag, dict(n.attrib), n.findtext('{0}name'.format(vs_xml.xmlns))) for n in p.findall(lxml_root)],
+                             [(n.tag, n.attrib, n.findtext('{0}name'.format(vs_xml.xmlns))) for n in p.findall(stdlib_root)])
+            self.assertEqual(p.find(lxml_root) is None, p.find(stdlib_root) is None)
+        self.assertEqual(Path('{0}item/{0}metadata/{0}timespan/{0}field/{0}value').findtext(lxml_root), "Test item")
+
+    @unittest2.skipUnless(have_lxml, "lxml is not installed")
+    def test_lxml_modify(self):
+        """
+        Parsed lxml documents should be changed and serialised with the helpers, as the rest of the library does
+        """
+        from gnmvidispine import vs_xml
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine.vs_field import VSField
+        vs_xml.set_backend("lxml")
+        doc = b"""<MetadataFieldDocument xmlns="http://xml.vidispine.com/schema/vidispine"><name>gnm_test</name>
+<type>string</type><data><key>other</key><value>1</value></data></MetadataFieldDocument>"""
+
+        f = VSField(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch('gnmvidispine.vs_field.VSField.request', return_value=vs_xml.fromstring(doc)) as mock_request:
+            f.populate("gnm_test")
+            self.assertTrue(vs_xml.is_lxml(f.dataContent))
+            f.set_string_restriction(1, 10)
+            f.set_portal_data({'readonly': True})
+            body = mock_request.call_args[1]['body']
+        root = ET.fromstring(body)
+        ns = vs_xml.xmlns
+        self.assertEqual(root.find('{0}stringRestriction/{0}maxLength'.format(ns)).text, "10")
+        self.assertEqual(root.findall('{0}data/{0}value'.format(ns))[1].text, '{"readonly": true}')
+        self.assertIn(b"gnm_test", f.as_xml())
+        self.assertIsNone(VSApi.findPortalDataNode(f, None))
+
+        parent = vs_xml.fromstring(doc)
+        vs_xml.append(parent, ET.Element("{0}extra".format(ns)))
+        self.assertTrue(vs_xml.is_lxml(parent[-1]))
+        stdlib = vs_xml.to_stdlib(parent)
+        self.assertIsInstance(stdlib, ET.Element)
+        self.assertEqual(stdlib[-1].tag, "{0}extra".format(ns))
+
+    def test_item_uses_backend(self):
+        """
+        VSItem.fromXML should parse strings with the chosen backend when it keeps the tree
+        """
+        from gnmvidispine import vs_xml
+        from gnmvidispine.vs_item import VSItem
+        i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch('gnmvidispine.vs_xml.fromstring', side_effect=ET.fromstring) as mock_parse:
+            i.fromXML(self.doc, keepTree=True)
+            mock_parse.assert_called_once_with(self.doc)
+        self.assertEqual(i.name, "VX-1234")
+        self.assertEqual(i.get("keywords"), "one|two")
+        self.assertEqual(i.get("owner"), "GNM")
+
+    def test_parse_body(self):
+        from gnmvidispine.vidispine_api import VSApi
+        from gnmvidispine import vs_xml
+        root = VSApi._parse_body(self.doc.encode('utf-8'), 'application/xml')
+        self.assertEqual(root.tag, "{http://xml.vidispine.com/schema/vidispine}MetadataListDocument")
+        with self.assertRaises(vs_xml.parse_errors):
+            VSApi._parse_body(b"<broken>", 'application/xml')
@@ -192,7 +192,7 @@ class TestVSItem(unittest2.TestCase):
             i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
             i.populate("VX-1234")
 
-            mock_request.assert_called_once_with("/item/VX-1234/metadata",method="GET")
+            mock_request.assert_called_once_with("/item/VX-1234/metadata",method="GET",parse=False)
             self.assertEqual(i.get("sometestfield"),"sometestvalue")
             self.assertEqual(i.get("someotherfield",allowArray=True),["valueone","valuetwo"])
             self.assertEqual(i.name,"VX-1234")
@@ -274,6 +274,102 @@ class TestVSItem(unittest2.TestCase):
         result3 = i.get_metadata_attributes("invalidfieldname")
         self.assertEqual(result3, None)
 
+    def test_field_index(self):
+        """
+        metadata attributes should be found inside groups, from an index that is only built once per document
+        :return:
+        """
+        fake_data = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1234">
+    <metadata>
+      <timespan start="-INF" end="+INF">
+        <field uuid="f1" user="admin" timestamp="2017-06-02T17:46:59.926+01:00" change="VX-1"><name>title</name><value uuid="v1" user="admin" timestamp="2017-06-02T17:46:59.926+01:00" change="VX-1">Top level</value></field>
+        <group>
+          <name>Asset</name>
+          <field uuid="f2" user="admin" timestamp="2017-06-02T17:46:59.926+01:00" change="VX-1"><name>owner</name><value uuid="v2" user="admin" timestamp="2017-06-02T17:46:59.926+01:00" change="VX-1">GNM</value></field>
+          <group><name>Rights</name><field uuid="f3" user="admin" timestamp="2017-06-02T17:46:59.926+01:00" change="VX-1"><name>title</name><value uuid="v3" user="admin" timestamp="2017-06-02T17:46:59.926+01:00" change="VX-1">Nested</value></field></group>
+        </group>
+      </timespan>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+        from gnmvidispine.vs_item import VSItem
+        i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        i.fromXML(fake_data)
+
+        with patch('gnmvidispine.vs_item.VSItem._index_fields', side_effect=VSItem._index_fields, autospec=True) as mock_index:
+            self.assertEqual([a.uuid for a in i.get_metadata_attributes("title")], ["f1", "f3"])
+            self.assertEqual(i.get("title", allowArray=True), ["Top level", "Nested"])
+            self.assertEqual(i.get_metadata_attributes("owner")[0].uuid, "f2")
+            self.assertEqual(i.get_metadata_attributes("owner")[0].values[0].value, "GNM")
+            #changing an attribute that was handed out should not affect the next caller
+            i.get_metadata_attributes("owner")[0].values[0].value = "Changed"
+            self.assertEqual(i.get_metadata_attributes("owner")[0].values[0].value, "GNM")
+            self.assertIsNone(i.get_metadata_attributes("invalidfieldname"))
+            self.assertEqual(len(i.get_field_nodes("title")), 2)
+            self.assertEqual(i.get_field_nodes("invalidfieldname"), [])
+            #once for the timespan and once for each group
+            self.assertEqual(mock_index.call_count, 3)
+
+        #loading a new document should throw the index away
+        i.fromXML(fake_data.replace("GNM", "Someone else").replace("VX-1234", "VX-5678"))
+        self.assertEqual(i.get_metadata_attributes("owner")[0].values[0].value, "Someone else")
+        with patch('gnmvidispine.vs_item.VSItem.request', return_value=ET.fromstring(fake_data)):
+            i.reload()
+        self.assertEqual(i.get_metadata_attributes("owner")[0].values[0].value, "GNM")
+
+    def test_lazy_populate(self):
+        """
+        with lazy_populate set, get() should fetch only the fields asked for so far, and contentDict everything
+        :return:
+        """
+        from gnmvidispine.vs_item import VSItem
+        fieldsdoc = """<?xml version="1.0" encoding="UTF-8"?>
+<MetadataListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <item id="VX-1234">
+    <metadata>
+      <group>Asset</group>
+      <timespan start="-INF" end="+INF">
+        <field><name>title</name><value>Test item</value></field>
+        <field><name>owner</name><value>GNM</value></field>
+      </timespan>
+    </metadata>
+  </item>
+</MetadataListDocument>"""
+
+        with patch('gnmvidispine.vs_item.VSItem.request', return_value=fieldsdoc) as mock_request:
+            i = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+            i.name = "VX-1234"
+            self.assertIsNone(i.get("title"))
+            mock_request.assert_not_called()
+
+            i.lazy_populate = True
+            self.assertEqual(i.get("title"), "Test item")
+            mock_request.assert_called_once_with("/item/VX-1234/metadata;field=title", method="GET", parse=False)
+            self.assertEqual(i.get("title"), "Test item")
+            self.assertEqual(i.master_group, "Asset")
+            self.assertEqual(mock_request.call_count, 1)
+
+            self.assertEqual(i.get("owner"), "GNM")
+            mock_request.assert_called_with("/item/VX-1234/metadata;field=owner,title", method="GET", parse=False)
+            self.assertIsNone(i.get("sometestfield"))
+            self.assertIsNone(i.get("sometestfield"))
+            self.assertEqual(mock_request.call_count, 3)
+
+            self.assertEqual(i.contentDict, {'title': 'Test item', 'owner': 'GNM'})
+            mock_request.assert_called_with("/item/VX-1234/metadata", method="GET", parse=False)
+            i.get("anotherfield")
+            self.assertEqual(mock_request.call_count, 4)
+
+            #a populated item, or one without an id, is never fetched
+            j = VSItem(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+            j.lazy_populate = True
+            self.assertIsNone(j.get("title"))
+            j.fromXML(fieldsdoc)
+            self.assertEqual(j.get("nonexistent", allowArray=True), None)
+            self.assertEqual(mock_request.call_count, 4)
+
     def test_add_external_id(self):
         """
         add_external_id should call to VS to set an external ID
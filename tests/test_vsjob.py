@@ -0,0 +1,49 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+import xml.etree.cElementTree as ET
+from datetime import datetime
+from dateutil.tz import tzutc
+
+
+class TestVSJobTask(unittest2.TestCase):
+    taskdoc = """<task xmlns="http://xml.vidispine.com/schema/vidispine" id="4">
+        <step>200</step>
+        <attempts>1</attempts>
+        <status>FINISHED</status>
+        <timestamp>2018-01-10T12:00:00.000Z</timestamp>
+        <description>Transcoding</description>
+        <subStep><description>Copying</description><number>1</number><status>FINISHED</status></subStep>
+        <subStep><description>Encoding</description><number>x</number><status>STARTED</status></subStep>
+    </task>"""
+
+    def test_task(self):
+        """
+        VSJobTask and VSJobStep should read their values out of the XML and not keep hold of it
+        :return:
+        """
+        from gnmvidispine.vs_job import VSJobTask
+        node = ET.fromstring(self.taskdoc)
+        task = VSJobTask(node)
+        node.clear()
+
+        self.assertFalse(hasattr(task, '__dict__'))
+        self.assertEqual(task.task_id, 4)
+        self.assertEqual(task.step, 200)
+        self.assertEqual(task.attempts, 1)
+        self.assertEqual(task.status, "FINISHED")
+        self.assertEqual(task.description, "Transcoding")
+        self.assertEqual(task.timestamp, datetime(2018, 1, 10, 12, 0, 0, tzinfo=tzutc()))
+
+        steps = list(task.sub_steps)
+        self.assertEqual([s.description for s in steps], ["Copying", "Encoding"])
+        self.assertEqual([s.number for s in steps], [1, None])
+        self.assertIsNone(steps[0].timestamp)
+        self.assertFalse(hasattr(steps[0], '__dict__'))
+
+    def test_uninitialised(self):
+        from gnmvidispine.vs_job import VSJobStep, VSJobTask
+        with self.assertRaises(ValueError):
+            VSJobStep(None).status
+        task = VSJobTask(None)
+        self.assertIsNone(task.task_id)
+        self.assertEqual(list(task.sub_steps), [])
@@ -81,6 +81,27 @@ class TestVSMetadataAttribute(unittest2.TestCase):
         self.assertEqual(str(field.references),"[VSMetadataReference a8765513-8872-48f2-8549-ac1468405e8a to collection KP-23891]")
 
 
+    def test_no_xml_kept(self):
+        """
+        the metadata value classes should be slot-based and not keep hold of the XML they were read from
+        :return:
+        """
+        from gnmvidispine.vs_metadata import VSMetadataAttribute, VSMetadataReference, VSMetadataValue
+        field = VSMetadataAttribute(ET.fromstring("""<field xmlns="http://xml.vidispine.com/schema/vidispine" uuid="f1" user="admin" timestamp="2017-11-14T11:33:30.631Z" change="KP-1">
+            <name>gnm_commission_title</name>
+            <referenced id="KP-23891" uuid="r1" type="collection"/>
+            <value uuid="v1" user="admin" timestamp="2017-02-16T16:36:21.066Z" change="KP-2">Owen Jones 2017</value>
+        </field>"""))
+        for obj in [field, field.values[0], field.references[0], VSMetadataAttribute(), VSMetadataValue(uuid="v2")]:
+            self.assertFalse(hasattr(obj, '__dict__'))
+            for name in obj.__slots__:
+                self.assertFalse(ET.iselement(getattr(obj, name)))
+
+        ref = VSMetadataReference()
+        self.assertIsNone(ref.uuid)
+        self.assertIsNone(ref.id)
+        self.assertEqual(VSMetadataReference(uuid="r2").uuid, "r2")
+
 class TestVSMetadata(unittest2.TestCase):
     def test_add_value(self):
         from gnmvidispine.vs_metadata import VSMetadata
@@ -0,0 +1,248 @@
+# -*- coding: UTF-8 -*-
+import unittest2
+from mock import MagicMock, patch
+import xml.etree.ElementTree as ET
+
+
+class TestVSSearch(unittest2.TestCase):
+    fake_host = 'localhost'
+    fake_port = 8080
+    fake_user = 'username'
+    fake_passwd = 'password'
+
+    page_with_metadata = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<ItemListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <hits>2</hits>
+  <item id="VX-1" start="-INF" end="+INF">
+    <metadata>
+      <timespan start="-INF" end="+INF">
+        <field><name>title</name><value>First item</value></field>
+      </timespan>
+    </metadata>
+  </item>
+  <item id="VX-2" start="-INF" end="+INF">
+    <metadata>
+      <timespan start="-INF" end="+INF">
+        <field><name>title</name><value>Second item</value></field>
+      </timespan>
+    </metadata>
+  </item>
+</ItemListDocument>"""
+
+    page_without_metadata = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<ItemListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <hits>2</hits>
+  <item id="VX-1" start="-INF" end="+INF"/>
+  <item id="VX-2" start="-INF" end="+INF"/>
+</ItemListDocument>"""
+
+    class MockedResponse(object):
+        def __init__(self, status_code, content, reason=""):
+            self.status = status_code
+            self.body = content
+            self.reason = reason
+            self.position = 0
+
+        def read(self, amt=None):
+            if amt is None:
+                return self.body
+            rtn = self.body[self.position:self.position+amt]
+            self.position += len(rtn)
+            return rtn
+
+    def test_results_inline_metadata(self):
+        """
+        results() should ask for metadata along with each page and populate items from it, without any extra requests
+        :return:
+        """
+        from gnmvidispine.vs_search import VSItemSearch
+        from gnmvidispine.vs_item import VSItem
+
+        s = VSItemSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', return_value=ET.fromstring(self.page_with_metadata)) as mock_request:
+            with patch('gnmvidispine.vs_item.VSItem.populate') as mock_populate:
+                result = s.execute(shouldPopulate=True, fields=['title', 'originalFilename'])
+                items = list(result.results(shouldPopulate=True))
+
+        mock_request.assert_called_once_with("/item", method="PUT",
+                                             matrix={'first': 1, 'number': 100, 'content': 'metadata',
+                                                     'field': 'title,originalFilename'},
+                                             body=s._makeXML())
+        mock_populate.assert_not_called()
+        self.assertEqual([i.name for i in items], ["VX-1", "VX-2"])
+        self.assertEqual([i.get('title') for i in items], ["First item", "Second item"])
+
+    def test_results_lazy_fields(self):
+        """
+        items from a search that was limited to some fields should fetch any other field they are asked for, if
+        lazy_populate is set
+        :return:
+        """
+        from gnmvidispine.vs_search import VSItemSearch
+        from gnmvidispine.vs_item import VSItem
+
+        s = VSItemSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', return_value=ET.fromstring(self.page_with_metadata)):
+            items = list(s.execute(fields=['title']).results())
+
+        with patch.object(VSItem, 'lazy_populate', True):
+            with patch('gnmvidispine.vs_item.VSItem.request', return_value=self.page_with_metadata) as mock_request:
+                self.assertEqual(items[0].get('title'), "First item")
+                mock_request.assert_not_called()
+                items[0].get('owner')
+                mock_request.assert_called_once_with("/item/VX-1/metadata;field=owner,title", method="GET", parse=False)
+
+    def test_results_default(self):
+        """
+        execute() followed by results() with their default arguments should fetch the first page once, with metadata
+        :return:
+        """
+        from gnmvidispine.vs_search import VSItemSearch
+
+        s = VSItemSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', return_value=ET.fromstring(self.page_with_metadata)) as mock_request:
+            with patch('gnmvidispine.vs_item.VSItem.populate') as mock_populate:
+                items = list(s.execute().results())
+
+        mock_request.assert_called_once_with("/item", method="PUT", matrix={'first': 1, 'number': 100, 'content': 'metadata'},
+                                             body=s._makeXML())
+        mock_populate.assert_not_called()
+        self.assertEqual([i.get('title') for i in items], ["First item", "Second item"])
+
+    def test_hit_count(self):
+        """
+        execute() should not fetch anything until it is needed, so just asking for the number of hits should not
+        download any metadata
+        :return:
+        """
+        from gnmvidispine.vs_search import VSItemSearch
+
+        s = VSItemSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', return_value=ET.fromstring(self.page_without_metadata)) as mock_request:
+            result = s.execute()
+            mock_request.assert_not_called()
+            self.assertEqual(result.totalItems, 2)
+            self.assertEqual([i.name for i in result.results(shouldPopulate=False)], ["VX-1", "VX-2"])
+
+        mock_request.assert_called_once_with("/item", method="PUT", matrix={'first': 1, 'number': 100}, body=s._makeXML())
+
+    def test_collection_search(self):
+        """
+        collections are populated one by one, so a collection search should not ask for inline metadata
+        :return:
+        """
+        from gnmvidispine.vs_search import VSCollectionSearch
+        page = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<CollectionListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
+  <hits>1</hits>
+  <collection id="VX-10"/>
+</CollectionListDocument>"""
+
+        s = VSCollectionSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', return_value=ET.fromstring(page)) as mock_request:
+            with patch('gnmvidispine.vs_collection.VSCollection.populate') as mock_populate:
+                items = list(s.execute(shouldPopulate=True).results())
+
+        mock_request.assert_called_once_with("/collection", method="PUT", matrix={'first': 1, 'number': 100}, body=s._makeXML())
+        mock_populate.assert_called_once_with("VX-10")
+        self.assertEqual(len(items), 1)
+
+    def test_results_refetch_cached_page(self):
+        """
+        if the first page was fetched without metadata but populated results are wanted, the page should be fetched again
+        with metadata rather than populating each item
+        :return:
+        """
+        from gnmvidispine.vs_search import VSItemSearch
+
+        s = VSItemSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', side_effect=[ET.fromstring(self.page_without_metadata),
+                                                                               ET.fromstring(self.page_with_metadata)]) as mock_request:
+            with patch('gnmvidispine.vs_item.VSItem.populate') as mock_populate:
+                result = s.execute(shouldPopulate=False)
+                items = list(result.results(shouldPopulate=True))
+
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertEqual(mock_request.call_args[1]['matrix'], {'first': 1, 'number': 100, 'content': 'metadata'})
+        mock_populate.assert_not_called()
+        self.assertEqual([i.get('title') for i in items], ["First item", "Second item"])
+
+    def test_results_unpopulated(self):
+        """
+        results(shouldPopulate=False) should not ask for metadata and should only set the item ids
+        :return:
+        """
+        from gnmvidispine.vs_search import VSItemSearch
+
+        s = VSItemSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', return_value=ET.fromstring(self.page_without_metadata)) as mock_request:
+            items = list(s.execute(shouldPopulate=False).results(shouldPopulate=False))
+
+        mock_request.assert_called_once_with("/item", method="PUT", matrix={'first': 1, 'number': 100}, body=s._makeXML())
+        self.assertEqual([i.name for i in items], ["VX-1", "VX-2"])
+        self.assertEqual([i.dataContent for i in items], [None, None])
+
+    @staticmethod
+    def make_page(start, count, total):
+        ids = "".join(['<item id="VX-{0}" start="-INF" end="+INF"/>'.format(n) for n in range(start, min(start+count, total+1))])
+        return ET.fromstring('<ItemListDocument xmlns="http://xml.vidispine.com/schema/vidispine"><hits>{0}</hits>{1}</ItemListDocument>'.format(total, ids))
+
+    def test_results_prefetch(self):
+        """
+        with prefetching enabled, all pages should be requested by their start position and results yielded in order
+        :return:
+        """
+        from gnmvidispine.vs_search import VSItemSearch
+
+        def fake_request(path, method, matrix, body):
+            return self.make_page(matrix['first'], matrix['number'], 7)
+
+        s = VSItemSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        s.pageSize = 2
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', side_effect=fake_request) as mock_request:
+            items = list(s.execute(shouldPopulate=False).results(shouldPopulate=False, prefetchPages=2))
+
+        self.assertEqual([i.name for i in items], ["VX-{0}".format(n) for n in range(1, 8)])
+        self.assertEqual(sorted([c[1]['matrix']['first'] for c in mock_request.call_args_list]), [1, 3, 5, 7])
+
+    def test_results_prefetch_error(self):
+        """
+        an error fetching a page in the background should be raised when the iteration reaches that page
+        :return:
+        """
+        from gnmvidispine.vs_search import VSItemSearch
+        from gnmvidispine.vidispine_api import VSNotFound
+
+        def fake_request(path, method, matrix, body):
+            if matrix['first'] == 5:
+                raise VSNotFound("test")
+            return self.make_page(matrix['first'], matrix['number'], 7)
+
+        s = VSItemSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        s.pageSize = 2
+        received = []
+        with patch('gnmvidispine.vs_search.VSSearchResult.request', side_effect=fake_request):
+            with self.assertRaises(VSNotFound):
+                for i in s.execute(shouldPopulate=False).results(shouldPopulate=False, prefetchPages=3):
+                    received.append(i.name)
+
+        self.assertEqual(received, ["VX-1", "VX-2", "VX-3", "VX-4"])
+
+    def test_results_streamed(self):
+        """
+        pages after the first should be streamed rather than parsed all at once
+        :return:
+        """
+        from gnmvidispine.vs_search import VSItemSearch, VSSearchResult
+
+        s = VSItemSearch(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        s.pageSize = 2
+        with patch('gnmvidispine.vs_search.VSSearchResult.sendAuthorized',
+                   side_effect=[self.MockedResponse(200, ET.tostring(self.make_page(1, 2, 3))),
+                                self.MockedResponse(200, ET.tostring(self.make_page(3, 2, 3)))]) as mock_send:
+            with patch('gnmvidispine.vs_search.VSSearchResult.stream_chunk_size', 20):
+                items = list(s.execute(shouldPopulate=False).results(shouldPopulate=False))
+
+        self.assertEqual([i.name for i in items], ["VX-1", "VX-2", "VX-3"])
+        self.assertEqual(mock_send.call_count, 2)
+        self.assertIn(";first=3;", mock_send.call_args[0][1])
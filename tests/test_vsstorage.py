@@ -2,7 +2,7 @@
 from future.standard_library import install_aliases
 install_aliases()
 import unittest2
-from mock import MagicMock, patch, call
+from mock import MagicMock, patch, call, ANY
 from urllib.parse import urlparse
 from urllib.parse import parse_qs
 
@@ -20,9 +20,14 @@ class TestVSStorage(unittest2.TestCase):
             self.status = status_code
             self.body = content
             self.reason = reason
+            self.position = 0
         
-        def read(self):
-            return self.body
+        def read(self, amt=None):
+            if amt is None:
+                return self.body
+            rtn = self.body[self.position:self.position+amt]
+            self.position += len(rtn)
+            return rtn
     
     def test_download(self):
         from gnmvidispine.vs_storage import VSFile,VSStorage
@@ -38,6 +43,33 @@ class TestVSStorage(unittest2.TestCase):
         f.download()
         f.parent.sendAuthorized.assert_called_with('GET', '/API/storage/file/VX-123/data', '', {'Accept': '*'})
 
+    def test_file_values(self):
+        """
+        VSFile should copy its values out of the document without keeping it, and only make memberOfItem when asked
+        :return:
+        """
+        from gnmvidispine.vs_storage import VSFile, VSStorage
+        from xml.etree.cElementTree import fromstring
+
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        doc = fromstring(self.file_doc.replace("<storage>KP-2</storage>", "<storage>KP-2</storage><item><id>KP-1234</id></item>"))
+        with patch('gnmvidispine.vs_storage.VSItem') as mock_item:
+            f = VSFile(parent_storage=s, parsed_data=doc)
+            doc.clear()
+            self.assertEqual(f.name, "KP-31774258")
+            self.assertEqual(f.size, "96531092")
+            self.assertEqual(f.storageName, "KP-2")
+            self.assertEqual(f.json_data()['memberOfItem'], "KP-1234")
+            mock_item.assert_not_called()
+            self.assertEqual(f.memberOfItem.name, "KP-1234")
+            self.assertEqual(f.memberOfItem, mock_item.return_value)
+            self.assertEqual(mock_item.call_count, 1)
+
+        self.assertFalse(hasattr(f, '__dict__'))
+        g = VSFile(parent_storage=s, parsed_data=fromstring(self.file_doc))
+        self.assertIsNone(g.memberOfItem)
+        self.assertNotIn('memberOfItem', g.json_data())
+
     test_list_doc = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
     <FileListDocument xmlns="http://xml.vidispine.com/schema/vidispine">
         <hits>10</hits>
@@ -526,4 +558,183 @@ class TestVSStorage(unittest2.TestCase):
         self.assertIn('number=0', parsed_url.params)
         query_dict = parse_qs(parsed_url.query)
         self.assertEqual(query_dict['path'], ['/'])
-        self.assertEqual(query_dict['state'], ['LOST'])
\ No newline at end of file
+        self.assertEqual(query_dict['state'], ['LOST'])
+
+    def test_files_streamed(self):
+        """
+        files() should parse the listing incrementally and return the connection to the pool once it has all been read
+        :return:
+        """
+        from gnmvidispine.vs_storage import VSStorage
+        from gnmvidispine.vs_connection_pool import VSConnectionPool
+
+        conn = MagicMock()
+        conn.getresponse = MagicMock(side_effect=[self.MockedResponse(200, self.test_list_doc),
+                                                  self.MockedResponse(200, self.test_list_doc_end)])
+        pool = VSConnectionPool(self.fake_host, self.fake_port, connection_factory=lambda host, port: conn)
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd, pool=pool)
+        s.stream_chunk_size = 100
+
+        files_list = []
+        for f in s.files():
+            #the listing is still being read, so the connection should not be back in the pool yet
+            self.assertEqual(pool.stats()['in_use'], 1)
+            files_list.append(f)
+        self.assertEqual(len(files_list), 10)
+        self.assertEqual(files_list[0].name, "KP-1153319")
+        self.assertEqual(files_list[0].size, "59144931")
+        self.assertEqual(pool.stats()['in_use'], 0)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def make_ranged_server(self, content, honour_range=True):
+        """
+        returns a fake sendAuthorized that serves content, honouring Range headers
+        """
+        import re
+        requests = []
+
+        def fake_send(method, url, body, headers, rawData=False):
+            requests.append(dict(headers))
+            if honour_range and 'Range' in headers:
+                start, end = re.match(r'^bytes=(\d+)-(\d*)$', headers['Range']).groups()
+                if int(start) >= len(content):
+                    response = self.MockedResponse(416, b"")
+                    response.msg = {'Content-Range': "bytes */{0}".format(len(content))}
+                    return response
+                end = int(end) if end != "" else len(content) - 1
+                return self.MockedResponse(206, content[int(start):end+1])
+            return self.MockedResponse(200, content)
+        return fake_send, requests
+
+    def test_download_to(self):
+        """
+        download_to should stream the file to disk and check it against the file hash
+        :return:
+        """
+        from gnmvidispine.vs_storage import VSStorage, VSFile
+        from gnmvidispine.vs_download import HashMismatchError
+        from xml.etree.cElementTree import fromstring
+        from hashlib import sha1
+        from os import urandom
+        import tempfile
+        import os.path
+
+        content = urandom(10000)
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        f = VSFile(parent_storage=s, parsed_data=fromstring(self.file_doc))
+        f.size = "10000"
+        f.hash = sha1(content).hexdigest()
+        s.sendAuthorized, requests = self.make_ranged_server(content)
+
+        tempdir = tempfile.mkdtemp()
+        destination = os.path.join(tempdir, "downloaded.dat")
+        f.download_to(destination, block_size=1024)
+        with open(destination, "rb") as fp:
+            self.assertEqual(fp.read(), content)
+        self.assertEqual(requests, [{'Accept': '*'}])
+
+        f.hash = "0000"
+        with self.assertRaises(HashMismatchError):
+            f.download_to(destination, resume=False)
+        self.assertFalse(os.path.exists(destination))
+        os.rmdir(tempdir)
+
+    def test_download_to_resume(self):
+        """
+        download_to should only request the part of the file that is not already on disk
+        :return:
+        """
+        from gnmvidispine.vs_storage import VSStorage, VSFile
+        from xml.etree.cElementTree import fromstring
+        from hashlib import sha1
+        from os import urandom
+        import tempfile
+        import os
+
+        content = urandom(10000)
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        f = VSFile(parent_storage=s, parsed_data=fromstring(self.file_doc))
+        f.size = "10000"
+        f.hash = sha1(content).hexdigest()
+        s.sendAuthorized, requests = self.make_ranged_server(content)
+
+        tempdir = tempfile.mkdtemp()
+        destination = os.path.join(tempdir, "downloaded.dat")
+        with open(destination, "wb") as fp:
+            fp.write(content[0:4000])
+        f.download_to(destination)
+        with open(destination, "rb") as fp:
+            self.assertEqual(fp.read(), content)
+        self.assertEqual(requests, [{'Accept': '*', 'Range': 'bytes=4000-'}])
+        os.unlink(destination)
+        os.rmdir(tempdir)
+
+    def test_download_to_complete(self):
+        """
+        if the size of the file is not known and it has already been downloaded, the server refusing the range request
+        with a 416 should not be an error
+        :return:
+        """
+        from gnmvidispine.vs_storage import VSStorage
+        from gnmvidispine.vs_download import download_file_to
+        from gnmvidispine.vidispine_api import HTTPError
+        from os import urandom
+        import tempfile
+        import os
+
+        content = urandom(10000)
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        s.metrics = MagicMock()
+        s.sendAuthorized, requests = self.make_ranged_server(content)
+
+        tempdir = tempfile.mkdtemp()
+        destination = os.path.join(tempdir, "downloaded.dat")
+        with open(destination, "wb") as fp:
+            fp.write(content)
+        download_file_to(s, "VX-123", destination)
+        with open(destination, "rb") as fp:
+            self.assertEqual(fp.read(), content)
+        self.assertEqual(requests, [{'Accept': '*', 'Range': 'bytes=10000-'}])
+
+        #a 416 for a file that we have more of than the server does is still an error
+        with open(destination, "ab") as fp:
+            fp.write(b"extra")
+        with self.assertRaises(HTTPError) as ex:
+            download_file_to(s, "VX-123", destination)
+        self.assertEqual(ex.exception.code, 416)
+
+        #the whole file is fetched through the same request path as everything else
+        os.unlink(destination)
+        download_file_to(s, "VX-123", destination)
+        s.metrics.observe.assert_called_with('GET', '/storage/file/VX-123/data', 200, ANY, 0, 10000)
+        os.unlink(destination)
+        os.rmdir(tempdir)
+
+    def test_download_to_segments(self):
+        """
+        download_to with segments should fetch byte ranges in parallel and assemble them in order
+        :return:
+        """
+        from gnmvidispine.vs_storage import VSStorage, VSFile
+        from xml.etree.cElementTree import fromstring
+        from hashlib import sha1
+        from os import urandom
+        import tempfile
+        import os
+
+        content = urandom(10000)
+        s = VSStorage(host=self.fake_host, port=self.fake_port, user=self.fake_user, passwd=self.fake_passwd)
+        f = VSFile(parent_storage=s, parsed_data=fromstring(self.file_doc))
+        f.size = "10000"
+        f.hash = sha1(content).hexdigest()
+        s.sendAuthorized, requests = self.make_ranged_server(content)
+
+        tempdir = tempfile.mkdtemp()
+        destination = os.path.join(tempdir, "downloaded.dat")
+        f.download_to(destination, segments=3, block_size=1000)
+        with open(destination, "rb") as fp:
+            self.assertEqual(fp.read(), content)
+        self.assertEqual(sorted([r['Range'] for r in requests]), ['bytes=0-3333', 'bytes=3334-6667', 'bytes=6668-9999'])
+        self.assertEqual(os.listdir(tempdir), ["downloaded.dat"])
+        os.unlink(destination)
+        os.rmdir(tempdir)